@@ -0,0 +1,86 @@
+"""Kernels run both in CPython and as compiled C++ by the benchmark."""
+
+import random
+from typing import Any, Callable, List, NamedTuple
+
+
+class Kernel(NamedTuple):
+    name: str
+    func: Callable
+    arg_types: List[Any]
+    # input size -> positional arguments
+    make_args: Callable[[int], List[Any]]
+
+
+def _random_floats(n: int) -> List[float]:
+    rng = random.Random(n)
+    return [rng.random() for _ in range(n)]
+
+
+def while_sum(a, n):
+    # the loop of sample_func in sample.py
+    out = 0.0
+    i = 0
+    while i < n:
+        out += a[i]
+        i += 1
+    return out
+
+
+def dot(a, b, n):
+    s = 0.0
+    for i in range(n):
+        s += a[i] * b[i]
+    return s
+
+
+def stencil3(a, out, n):
+    for i in range(1, n - 1):
+        out[i] = (a[i - 1] + a[i] + a[i + 1]) / 3.0
+
+
+def prefix_sum(a, n):
+    for i in range(1, n):
+        a[i] += a[i - 1]
+
+
+def count_in_range(a, n):
+    count = 0
+    for i in range(n):
+        if 0.25 <= a[i] < 0.75:
+            count += 1
+    return count
+
+
+KERNELS: List[Kernel] = [
+    Kernel(
+        "while_sum",
+        while_sum,
+        [List[float], int],
+        lambda n: [_random_floats(n), n],
+    ),
+    Kernel(
+        "dot",
+        dot,
+        [List[float], List[float], int],
+        lambda n: [_random_floats(n), _random_floats(n + 1)[1:], n],
+    ),
+    Kernel(
+        "stencil3",
+        stencil3,
+        [List[float], List[float], int],
+        lambda n: [_random_floats(n), [0.0] * n, n],
+    ),
+    Kernel(
+        "prefix_sum",
+        prefix_sum,
+        [List[float], int],
+        lambda n: [_random_floats(n), n],
+    ),
+    Kernel(
+        "count_in_range",
+        count_in_range,
+        [List[float], int],
+        lambda n: [_random_floats(n), n],
+    ),
+]
@@ -0,0 +1,244 @@
+"""Benchmarks the generated C++ against CPython and the transpiler itself.
+
+Usage:
+    python -m benchmarks.run --output bench.json
+
+Run it from the root of the repository. Lists are copied into C arrays on
+every compiled call, so the compiled timings include the marshalling.
+With NumPy installed, the kernels are also compiled for float64 ndarrays,
+which are passed without copying.
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import py2cpp
+from py2cpp.compiler import find_compiler
+
+from .kernels import KERNELS, Kernel
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+# number of statements of the synthetic long functions
+DEFAULT_STATEMENTS = [1_000, 4_000]
+# nesting depth of the synthetic deep expressions
+DEFAULT_DEPTHS = [100, 200, 300]
+
+
+def best_time(func: Callable, make_args: Callable[[], List[Any]], repeat: int) -> float:
+    """Returns the best wall time of calls with fresh arguments."""
+    best = float("inf")
+    for _ in range(repeat):
+        # kernels may modify their arguments
+        args = make_args()
+        start = time.perf_counter()
+        func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def compile_ndarray_variant(kernel: Kernel) -> Optional[Callable]:
+    """Compiles the kernel with List[float] replaced by float64 ndarrays.
+
+    Returns a function taking the list arguments, or None without NumPy.
+    """
+    try:
+        import numpy as np
+        import numpy.typing as npt
+    except ImportError:
+        return None
+    arg_types = [
+        npt.NDArray[np.float64] if arg_type == List[float] else arg_type
+        for arg_type in kernel.arg_types
+    ]
+    return py2cpp.jit(arg_types)(kernel.func).compile()
+
+
+def to_ndarrays(args: List[Any]) -> List[Any]:
+    import numpy as np
+
+    return [np.array(arg) if isinstance(arg, list) else arg for arg in args]
+
+
+def bench_kernel(kernel: Kernel, sizes: List[int], repeat: int) -> List[Dict]:
+    compiled = py2cpp.jit(kernel.arg_types)(kernel.func)
+    start = time.perf_counter()
+    compiled.compile()
+    compile_s = time.perf_counter() - start
+    compiled_ndarray = compile_ndarray_variant(kernel)
+
+    results = []
+    for n in sizes:
+        python_s = best_time(kernel.func, lambda: kernel.make_args(n), repeat)
+        compiled_s = best_time(compiled, lambda: kernel.make_args(n), repeat)
+        results.append(
+            {
+                "kernel": kernel.name,
+                "size": n,
+                "compile_s": compile_s,
+                "python_s": python_s,
+                "compiled_s": compiled_s,
+                "speedup": python_s / compiled_s,
+                "python_ns_per_element": python_s / n * 1e9,
+                "compiled_ns_per_element": compiled_s / n * 1e9,
+            }
+        )
+        if compiled_ndarray is not None:
+            ndarray_s = best_time(
+                compiled_ndarray, lambda: to_ndarrays(kernel.make_args(n)), repeat
+            )
+            results[-1].update(
+                {
+                    "compiled_ndarray_s": ndarray_s,
+                    "ndarray_speedup": python_s / ndarray_s,
+                    "compiled_ndarray_ns_per_element": ndarray_s / n * 1e9,
+                }
+            )
+    return results
+
+
+def long_function_source(num_stmts: int) -> str:
+    """A function with a straight-line body of num_stmts statements."""
+    lines = ["def long_func(n: int):", "    x = 0", "    y = 1.5"]
+    for i in range(num_stmts):
+        if i % 4 == 0:
+            lines.append(f"    x = x + {i} * n - {i % 7}")
+        elif i % 4 == 1:
+            lines.append(f"    y += x * {i}.5")
+        elif i % 4 == 2:
+            lines.append("    if x > n:")
+            lines.append(f"        x -= n // {i % 5 + 1}")
+        else:
+            lines.append(f"    y = y / {i % 3 + 1}.0 + x")
+    lines.append("    return y")
+    return "\n".join(lines) + "\n"
+
+
+def deep_function_source(depth: int) -> str:
+    """A function returning an expression nested depth levels deep."""
+    terms = "".join(f" + {i}" if i % 2 else " * n" for i in range(depth))
+    return f"def deep_func(n: int):\n    return n{terms}\n"
+
+
+def load_func(path: str, src: str, name: str) -> Callable:
+    """Writes the source to a file and imports the function, so that
+    inspect.getsource() works as for user code."""
+    with open(path, "w") as f:
+        f.write(src)
+    spec = importlib.util.spec_from_file_location(
+        os.path.splitext(os.path.basename(path))[0], path
+    )
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return getattr(module, name)
+
+
+def bench_transpile(
+    name: str, param: int, func: Callable, num_stmts: int, repeat: int
+) -> Dict:
+    result = {"case": name, "param": param}
+    try:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            cpp_src = py2cpp.transpile(func)
+            best = min(best, time.perf_counter() - start)
+    except RecursionError:
+        # recorded so that a regression in the supported depth is visible
+        result["error"] = "RecursionError"
+        return result
+    result.update(
+        {
+            "transpile_s": best,
+            "statements_per_s": num_stmts / best,
+            "output_bytes": len(cpp_src),
+        }
+    )
+    return result
+
+
+def bench_transpiler(
+    statements: List[int], depths: List[int], repeat: int
+) -> List[Dict]:
+    results = []
+    with tempfile.TemporaryDirectory(prefix="py2cpp_bench_") as tmp_dir:
+        for num_stmts in statements:
+            func = load_func(
+                os.path.join(tmp_dir, f"long_{num_stmts}.py"),
+                long_function_source(num_stmts),
+                "long_func",
+            )
+            results.append(
+                bench_transpile("statements", num_stmts, func, num_stmts, repeat)
+            )
+        for depth in depths:
+            func = load_func(
+                os.path.join(tmp_dir, f"deep_{depth}.py"),
+                deep_function_source(depth),
+                "deep_func",
+            )
+            results.append(bench_transpile("depth", depth, func, 1, repeat))
+    return results
+
+
+def main(argv: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES)
+    parser.add_argument("--statements", type=int, nargs="+", default=DEFAULT_STATEMENTS)
+    parser.add_argument("--depths", type=int, nargs="+", default=DEFAULT_DEPTHS)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument(
+        "--kernels",
+        nargs="+",
+        default=[kernel.name for kernel in KERNELS],
+        help="names of the kernels to run",
+    )
+    parser.add_argument("--output", default="bench.json")
+    args = parser.parse_args(argv)
+
+    report = {
+        "py2cpp_version": py2cpp.__version__,
+        "python": sys.version,
+        "platform": platform.platform(),
+        "compiler": find_compiler(),
+        "kernels": [],
+        "transpiler": [],
+    }
+    for kernel in KERNELS:
+        if kernel.name not in args.kernels:
+            continue
+        for result in bench_kernel(kernel, args.sizes, args.repeat):
+            print(
+                f"{result['kernel']:>16} n={result['size']:<9} "
+                f"speedup {result['speedup']:8.1f}x "
+                f"{result['compiled_ns_per_element']:8.2f} ns/element"
+                + (
+                    f", ndarray speedup {result['ndarray_speedup']:8.1f}x"
+                    if "ndarray_speedup" in result
+                    else ""
+                )
+            )
+            report["kernels"].append(result)
+    for result in bench_transpiler(args.statements, args.depths, args.repeat):
+        if "error" in result:
+            print(f"{result['case']:>16} {result['param']:<11} {result['error']}")
+        else:
+            print(
+                f"{result['case']:>16} {result['param']:<11} "
+                f"{result['transpile_s'] * 1e3:8.2f} ms"
+            )
+        report["transpiler"].append(result)
+
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Results are written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1 +1,11 @@
-from .transpile import transpile
+from .aot import build_package
+from .cache import DiskCache
+from .executor import default_executor, set_default_executor
+from .extension import build_extension, load_extension
+from .jit import Dispatcher, jit
+from .loops import prange
+from .module import TranspiledModule, transpile_module
+from .stats import Phase, Stats
+from .transpile import transpile, transpile_to
+from .type_system import float32, int8, int64, uint8
+from .version import __version__
@@ -0,0 +1,156 @@
+import importlib
+import os
+import pkgutil
+import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from types import ModuleType
+from typing import Dict, Iterator, List, Tuple
+
+from .jit import Dispatcher, JitFunction, prebuilt_prefix, prebuilt_root
+
+# statuses of the functions reported by build_package()
+BUILT = "built"
+UP_TO_DATE = "up to date"
+SKIPPED = "skipped"
+FAILED = "failed"
+
+
+class Target:
+    """A function marked for compilation with @py2cpp.jit, to be built ahead of time."""
+
+    def __init__(self, name: str, jit_func: JitFunction) -> None:
+        # qualified name, e.g. mypkg.kernels.dot
+        self.name = name
+        self.jit_func = jit_func
+        self.path = jit_func.prebuilt_path()
+
+
+def iter_modules(package_name: str) -> Iterator[ModuleType]:
+    """Imports a package and yields it and all of its submodules."""
+    package = importlib.import_module(package_name)
+    yield package
+    if hasattr(package, "__path__"):
+        for info in pkgutil.walk_packages(package.__path__, package.__name__ + "."):
+            yield importlib.import_module(info.name)
+
+
+def find_targets(modules: List[ModuleType]) -> Tuple[List[Target], Dict[str, str]]:
+    """Finds the functions decorated with @py2cpp.jit in modules.
+
+    A function specialized per call (a Dispatcher) is built for the types of
+    its annotations, and is skipped unless all of its arguments are annotated.
+
+    Returns:
+        Tuple[List[Target], Dict[str, str]]: The functions to be built, and
+            the names of the skipped functions with the reasons
+    """
+    targets: List[Target] = []
+    skipped: Dict[str, str] = dict()
+    for module in modules:
+        for obj in list(vars(module).values()):
+            if not isinstance(obj, (JitFunction, Dispatcher)):
+                continue
+            # not to build functions imported from other modules twice
+            if obj.py_func.__module__ != module.__name__:
+                continue
+            name = f"{module.__name__}.{obj.py_func.__qualname__}"
+            if isinstance(obj, Dispatcher):
+                if None in obj.annotations:
+                    skipped[name] = "arguments without annotations"
+                    continue
+                obj = obj.specialize(obj.annotations)
+            targets.append(Target(name, obj))
+    return targets, skipped
+
+
+def build_target(target: Target, force: bool = False) -> bool:
+    """Builds a function into its prebuilt directory unless it is up to date.
+
+    The directory is published with an atomic rename, so that a process
+    loading the function never sees a partially built one. The function is
+    built without NATIVE_CXXFLAGS, as it may be loaded on other CPUs.
+
+    Returns:
+        bool: Whether the function was built
+    """
+    if os.path.isdir(target.path) and not force:
+        return False
+    root = os.path.dirname(target.path)
+    os.makedirs(root, exist_ok=True)
+    tmp_path = tempfile.mkdtemp(prefix=".tmp-", dir=root)
+    try:
+        target.jit_func._build(tmp_path, portable=True)
+        if os.path.isdir(target.path):
+            shutil.rmtree(target.path)
+        os.rename(tmp_path, target.path)
+    except BaseException:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+    return True
+
+
+def remove_stale(targets: List[Target], modules: List[ModuleType]) -> List[str]:
+    """Removes the prebuilt functions of the modules that are no longer built,
+    e.g. those of removed functions or of previous sources.
+
+    Returns:
+        List[str]: The paths of the removed directories
+    """
+    paths = {target.path for target in targets}
+    # root -> prefixes of the prebuilt directories of its modules
+    prefixes: Dict[str, List[str]] = dict()
+    for module in modules:
+        root = prebuilt_root(module)
+        if root is not None:
+            prefixes.setdefault(root, []).append(prebuilt_prefix(module.__name__))
+    removed = []
+    for root, module_prefixes in prefixes.items():
+        if not os.path.isdir(root):
+            continue
+        for entry in sorted(os.listdir(root)):
+            path = os.path.join(root, entry)
+            if path in paths or not entry.startswith(tuple(module_prefixes)):
+                continue
+            shutil.rmtree(path, ignore_errors=True)
+            removed.append(path)
+    return removed
+
+
+def build_package(
+    package_name: str, jobs: int = None, force: bool = False
+) -> Dict[str, str]:
+    """Builds the functions decorated with @py2cpp.jit in a package ahead of time.
+
+    Each function is transpiled into its own C++ file and compiled into a
+    shared object in the `__py2cpp__` directory next to its module, where
+    JitFunction.compile() loads it without a compiler. Functions whose
+    sources (including the functions they call), types and flags are
+    unchanged since the last build are not rebuilt, and the functions are
+    compiled in parallel.
+
+    Args:
+        package_name (str): A package or a module to be imported
+        jobs (int, optional): The number of parallel builds. Defaults to os.cpu_count().
+        force (bool, optional): Rebuilds all the functions. Defaults to False.
+
+    Returns:
+        Dict[str, str]: The qualified name of each function -> its status
+            (BUILT, UP_TO_DATE, SKIPPED or FAILED with the reason)
+    """
+    modules = list(iter_modules(package_name))
+    targets, skipped = find_targets(modules)
+    statuses = {name: f"{SKIPPED}: {reason}" for name, reason in skipped.items()}
+
+    def run(target: Target) -> str:
+        try:
+            return BUILT if build_target(target, force) else UP_TO_DATE
+        except Exception as e:
+            return f"{FAILED}: {e}"
+
+    # compilers run in subprocesses, so threads build in parallel
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count()) as executor:
+        for target, status in zip(targets, executor.map(run, targets)):
+            statuses[target.name] = status
+    remove_stale(targets, modules)
+    return statuses
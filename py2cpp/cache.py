@@ -0,0 +1,161 @@
+import contextlib
+import hashlib
+import os
+import shutil
+import tempfile
+from typing import Callable, Iterator
+
+try:
+    import fcntl
+except ImportError:
+    # no inter-process locking on platforms without fcntl (e.g. Windows)
+    fcntl = None
+
+# 1 GiB
+DEFAULT_MAX_BYTES = 1 << 30
+
+
+def default_cache_dir() -> str:
+    """Returns the cache directory given by `PY2CPP_CACHE_DIR` or ~/.cache/py2cpp."""
+    if os.environ.get("PY2CPP_CACHE_DIR"):
+        return os.environ["PY2CPP_CACHE_DIR"]
+    xdg_cache_home = os.environ.get("XDG_CACHE_HOME") or os.path.join(
+        os.path.expanduser("~"), ".cache"
+    )
+    return os.path.join(xdg_cache_home, "py2cpp")
+
+
+@contextlib.contextmanager
+def _flock(path: str, shared: bool = False, blocking: bool = True) -> Iterator[bool]:
+    """Holds an advisory file lock while in the context.
+
+    Yields:
+        bool: Whether the lock is acquired (always True when blocking)
+    """
+    if fcntl is None:
+        yield True
+        return
+    with open(path, "a") as f:
+        flags = fcntl.LOCK_SH if shared else fcntl.LOCK_EX
+        if not blocking:
+            flags |= fcntl.LOCK_NB
+        try:
+            fcntl.flock(f, flags)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+class DiskCache:
+    """A content-addressed on-disk cache of generated sources and shared objects.
+
+    Each entry is a directory named by its key. Entries are published with an
+    atomic rename, so readers never see a partially built entry, and the least
+    recently used entries are evicted when the total size exceeds `max_bytes`.
+    Entries are shared by multiple processes through advisory file locks.
+    """
+
+    def __init__(self, cache_dir: str = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir or default_cache_dir()
+        self.max_bytes = max_bytes
+        self._lock_dir = os.path.join(self.cache_dir, ".locks")
+        # held shared while entries are used, exclusively while evicting
+        self._evict_lock_path = os.path.join(self._lock_dir, "evict.lock")
+        os.makedirs(self._lock_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Hashes the given parts into a cache key."""
+        h = hashlib.sha256()
+        for part in parts:
+            h.update(str(part).encode())
+            # separator so that ("ab", "c") and ("a", "bc") differ
+            h.update(b"\0")
+        return h.hexdigest()
+
+    def entry_dir(self, key: str) -> str:
+        return os.path.join(self.cache_dir, key)
+
+    @contextlib.contextmanager
+    def open(self, key: str, build: Callable[[str], None]) -> Iterator[str]:
+        """Looks up an entry, building it on a miss, and yields its directory.
+
+        The entry is guaranteed not to be evicted while in the context.
+
+        Args:
+            key (str): A cache key
+            build (Callable[[str], None]): A function writing the entry's files
+                into the given directory
+
+        Yields:
+            str: A path to the entry directory
+        """
+        with _flock(self._evict_lock_path, shared=True):
+            path = self.entry_dir(key)
+            # one process builds an entry while the others wait for it
+            with _flock(os.path.join(self._lock_dir, f"{key}.lock")):
+                if os.path.isdir(path):
+                    # marks as recently used
+                    os.utime(path)
+                else:
+                    tmp_path = tempfile.mkdtemp(prefix=".tmp-", dir=self.cache_dir)
+                    try:
+                        build(tmp_path)
+                        os.rename(tmp_path, path)
+                    except BaseException:
+                        shutil.rmtree(tmp_path, ignore_errors=True)
+                        raise
+            yield path
+        self.evict()
+
+    def size(self) -> int:
+        """Returns the total size of the entries in bytes."""
+        return sum(size for _, _, size in self._entries())
+
+    def evict(self) -> None:
+        """Evicts the least recently used entries until the size fits in max_bytes.
+
+        Eviction is skipped if another process is using the cache.
+        """
+        with _flock(self._evict_lock_path, blocking=False) as acquired:
+            if not acquired:
+                return
+            # from the most recently used
+            entries = sorted(self._entries(), key=lambda e: e[1], reverse=True)
+            total = 0
+            for idx, (path, _, size) in enumerate(entries):
+                total += size
+                # always keeps the most recently used entry
+                if idx > 0 and total > self.max_bytes:
+                    shutil.rmtree(path, ignore_errors=True)
+                    key = os.path.basename(path)
+                    with contextlib.suppress(FileNotFoundError):
+                        os.remove(os.path.join(self._lock_dir, f"{key}.lock"))
+
+    def clear(self) -> None:
+        """Removes all entries."""
+        with _flock(self._evict_lock_path):
+            for path, _, _ in self._entries():
+                shutil.rmtree(path, ignore_errors=True)
+
+    def _entries(self):
+        """Yields (path, last used time, size) of each entry."""
+        for name in os.listdir(self.cache_dir):
+            path = os.path.join(self.cache_dir, name)
+            if name.startswith(".") or not os.path.isdir(path):
+                continue
+            try:
+                mtime = os.stat(path).st_mtime
+                size = sum(
+                    os.path.getsize(os.path.join(root, f))
+                    for root, _, files in os.walk(path)
+                    for f in files
+                )
+            except FileNotFoundError:
+                # removed by another process
+                continue
+            yield path, mtime, size
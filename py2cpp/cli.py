@@ -0,0 +1,43 @@
+import argparse
+import os
+import sys
+from typing import List
+
+from .aot import FAILED, build_package
+
+
+def build(args: argparse.Namespace) -> int:
+    # packages in the working directory are importable as with `python -m`
+    sys.path.insert(0, os.getcwd())
+    failed = False
+    for package_name in args.packages:
+        statuses = build_package(package_name, jobs=args.jobs, force=args.force)
+        for name, status in statuses.items():
+            print(f"{name}: {status}")
+            failed = failed or status.startswith(FAILED)
+    return 1 if failed else 0
+
+
+def main(argv: List[str] = None) -> int:
+    parser = argparse.ArgumentParser(prog="py2cpp")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    build_parser = subparsers.add_parser(
+        "build",
+        help="build the functions decorated with @py2cpp.jit in packages ahead of time",
+    )
+    build_parser.add_argument(
+        "packages", nargs="+", help="packages or modules to import"
+    )
+    build_parser.add_argument(
+        "-j", "--jobs", type=int, default=None, help="number of parallel builds"
+    )
+    build_parser.add_argument(
+        "--force", action="store_true", help="rebuild up-to-date functions as well"
+    )
+    build_parser.set_defaults(func=build)
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,398 @@
+import io
+import json
+from typing import Callable, Dict, List, TextIO, Tuple
+
+from .expression import (
+    ELEMENTWISE_INDEX,
+    Array,
+    ArrayAlloc,
+    ArrayLength,
+    ArrayMap,
+    BinOp,
+    BoolOp,
+    Cast,
+    Compare,
+    Constant,
+    Expression,
+    FunctionCall,
+    Index,
+    Subscript,
+    UnaryOp,
+    VarCtxt,
+    Variable,
+)
+from .funcarg import len_arg_name
+from .intrinsics import IntrinsicCall, Reduction
+from .ops import OpType
+from .runtime import (
+    BUFFER_CLASS,
+    ERROR_VAR,
+    FLOORDIV_FUNC,
+    IFLOORDIV_FUNC,
+    IMOD_FUNC,
+    MEMO_KEY,
+    MEMO_TABLE,
+    MOD_FUNC,
+    RET_LEN_ARG,
+    SAME_LENGTH_FUNC,
+)
+from .statement import (
+    Assign,
+    AugAssign,
+    BlockStatement,
+    ForRangeStmt,
+    GeneralStatement,
+    IfStmt,
+    RaiseStmt,
+    ReturnStmt,
+    Statement,
+    WhileStmt,
+)
+from .type_system import CPP_NAMES, ELEMENT_CPP_TYPES
+
+# operator -> (helper with the semantics of Python, its in-place version),
+# unless the range analysis lowered it to a C++ operator
+DIVISION_HELPERS: Dict[OpType, Tuple[str, str]] = {
+    OpType.FLOORDIV: (FLOORDIV_FUNC, IFLOORDIV_FUNC),
+    OpType.MOD: (MOD_FUNC, IMOD_FUNC),
+}
+
+
+class CppGenerator:
+    """Generates C++ source from the intermediate representation in a single pass.
+
+    Pieces of a line are collected in a list and written to the stream once
+    per line, so the cost is linear in the size of the output.
+    """
+
+    def __init__(
+        self, stream: TextIO, error_return: str = "return {}", memoized: bool = False
+    ) -> None:
+        self.stream = stream
+        # statement leaving the function on an error
+        self.error_return = error_return
+        # whether returned values are stored into the memo table
+        self.memoized = memoized
+        self._parts: List[str] = []
+        # indents of the statement being written
+        self._depth = 0
+        # the number of OpenMP parallel loops around the statement being written
+        self._parallel_depth = 0
+        self._expr_writers: Dict[type, Callable[[Expression], None]] = {
+            Variable: self._write_variable,
+            Constant: self._write_constant,
+            Array: self._write_array,
+            ArrayAlloc: self._write_array_alloc,
+            ArrayLength: self._write_array_length,
+            ArrayMap: self._write_array_map,
+            Cast: self._write_cast,
+            Compare: self._write_compare,
+            BinOp: self._write_binop,
+            UnaryOp: self._write_unaryop,
+            BoolOp: self._write_boolop,
+            Subscript: self._write_subscript,
+            Index: self._write_index,
+            FunctionCall: self._write_function_call,
+            IntrinsicCall: self._write_intrinsic_call,
+            Reduction: self._write_reduction,
+        }
+        self._stmt_writers: Dict[type, Callable[[Statement], None]] = {
+            Assign: self._write_assign,
+            AugAssign: self._write_aug_assign,
+            ReturnStmt: self._write_return,
+            RaiseStmt: self._write_raise,
+            GeneralStatement: self._write_general_stmt,
+            IfStmt: self._write_if,
+            WhileStmt: self._write_while,
+            ForRangeStmt: self._write_for_range,
+        }
+
+    @staticmethod
+    def _lookup(writers: Dict[type, Callable], node) -> Callable:
+        for cls in type(node).__mro__:
+            if cls in writers:
+                return writers[cls]
+        raise TypeError(f"{type(node).__name__} is not supported by the generator.")
+
+    def _flush_line(self, depth: int) -> None:
+        self.stream.write("\t" * depth + "".join(self._parts) + "\n")
+        self._parts.clear()
+
+    ### statements
+    # depth is the number of indents
+    def write_stmts(self, block: List[Statement], depth: int) -> None:
+        for stmt in block:
+            self.write_stmt(stmt, depth)
+
+    def write_stmt(self, stmt: Statement, depth: int) -> None:
+        if isinstance(stmt, ForRangeStmt) and stmt.pragma is not None:
+            self._parts.append(f"#pragma {stmt.pragma}")
+            self._flush_line(depth)
+        self._depth = depth
+        self._lookup(self._stmt_writers, stmt)(stmt)
+        if isinstance(stmt, BlockStatement):
+            # header line
+            self._parts.append(" {")
+            self._flush_line(depth)
+            parallel = isinstance(stmt, ForRangeStmt) and stmt.parallel
+            self._parallel_depth += parallel
+            self.write_stmts(stmt.body, depth + 1)
+            self._parallel_depth -= parallel
+            self._parts.append("}")
+        else:
+            self._parts.append(";")
+        self._flush_line(depth)
+        if (
+            isinstance(stmt, Assign)
+            and isinstance(stmt.value, ArrayAlloc)
+            and self._parallel_depth == 0
+        ):
+            # the allocation failed, see BUFFER_CLASS. A parallel region
+            # cannot be left, where the array is empty instead
+            self._parts.append(
+                f"if ({ERROR_VAR} != nullptr) {{ {self.error_return}; }}"
+            )
+            self._flush_line(depth)
+
+    def _write_assign(self, stmt: Assign) -> None:
+        for target in stmt.targets:
+            self.write_expr(target)
+            self._parts.append(" = ")
+        self.write_expr(stmt.value)
+
+    def _write_aug_assign(self, stmt: AugAssign) -> None:
+        if stmt.op.op_type in DIVISION_HELPERS:
+            _, helper = DIVISION_HELPERS[stmt.op.op_type]
+            self._parts.append(f"{helper}(")
+            self.write_expr(stmt.target)
+            self._parts.append(", ")
+            self.write_expr(stmt.value)
+            self._parts.append(")")
+            return
+        self.write_expr(stmt.target)
+        self._parts.append(f" {stmt.op.cpp_str}= ")
+        self.write_expr(stmt.value)
+
+    def _write_return(self, stmt: ReturnStmt) -> None:
+        self._parts.append("return ")
+        if self.memoized:
+            self._parts.append(f"{MEMO_TABLE}.store({MEMO_KEY}, ")
+            self.write_expr(stmt.ret_val)
+            self._parts.append(")")
+            return
+        self.write_expr(stmt.ret_val)
+        if isinstance(stmt.ret_val, Variable) and stmt.ret_val.symbol.buffer:
+            # the caller takes over the buffer
+            self._parts.append(f".release({RET_LEN_ARG})")
+
+    def _write_raise(self, stmt: RaiseStmt) -> None:
+        # a JSON string is a valid C++ string literal for printable characters
+        self._parts.append(f"{ERROR_VAR} = {json.dumps(stmt.message)};")
+        self._flush_line(self._depth)
+        self._parts.append(self.error_return)
+
+    def _write_general_stmt(self, stmt: GeneralStatement) -> None:
+        self.write_expr(stmt.expr)
+
+    def _write_if(self, stmt: IfStmt) -> None:
+        self._parts.append("if ")
+        self._write_test(stmt.test)
+
+    def _write_while(self, stmt: WhileStmt) -> None:
+        self._parts.append("while ")
+        self._write_test(stmt.test)
+
+    def _write_for_range(self, stmt: ForRangeStmt) -> None:
+        var_id = stmt.target.id
+        self._parts.append("for (")
+        self.write_expr(stmt.target)
+        self._parts.append(" = ")
+        self.write_expr(stmt.start)
+        self._parts.append("; ")
+        if isinstance(stmt.step, Constant):
+            self._parts.append(f"{var_id} {'<' if stmt.step.value > 0 else '>'} ")
+            self.write_expr(stmt.stop)
+        else:
+            # direction is decided at run time
+            self._parts.append("(")
+            self.write_expr(stmt.step)
+            self._parts.append(f" > 0 ? {var_id} < ")
+            self.write_expr(stmt.stop)
+            self._parts.append(f" : {var_id} > ")
+            self.write_expr(stmt.stop)
+            self._parts.append(")")
+        self._parts.append(f"; {var_id} += ")
+        self.write_expr(stmt.step)
+        self._parts.append(")")
+
+    def _write_test(self, test: Expression) -> None:
+        # these are already parenthesized, except for calls of the helpers
+        if isinstance(test, (Compare, UnaryOp, BoolOp)) or (
+            isinstance(test, BinOp) and test.op.op_type not in DIVISION_HELPERS
+        ):
+            self.write_expr(test)
+            return
+        self._parts.append("(")
+        self.write_expr(test)
+        self._parts.append(")")
+
+    ### expressions
+    def write_expr(self, expr: Expression) -> None:
+        self._lookup(self._expr_writers, expr)(expr)
+
+    def _write_variable(self, expr: Variable) -> None:
+        if expr.ctx == VarCtxt.REUSE:
+            self._parts.append(expr.id)
+            return
+        if expr.cpp_type in CPP_NAMES:
+            self._parts.append(f"{CPP_NAMES[expr.cpp_type]} {expr.id}")
+        elif expr.cpp_type in ELEMENT_CPP_TYPES:
+            elem_name = CPP_NAMES[ELEMENT_CPP_TYPES[expr.cpp_type]]
+            if expr.symbol.buffer:
+                self._parts.append(f"{BUFFER_CLASS}<{elem_name}> {expr.id}")
+            else:
+                self._parts.append(f"{elem_name} {expr.id}[{expr.size}]")
+        else:
+            raise TypeError(f"C++ type {expr.cpp_type} is not supported.")
+
+    def _write_constant(self, expr: Constant) -> None:
+        # True / False in Python is equivalent to true / false in C++.
+        if isinstance(expr.value, bool):
+            self._parts.append(str(expr.value).lower())
+        else:
+            self._parts.append(str(expr.value))
+
+    def _write_array(self, expr: Array) -> None:
+        self._parts.append("{" + ", ".join(map(str, expr.value)) + "}")
+
+    def _write_array_alloc(self, expr: ArrayAlloc) -> None:
+        elem_name = CPP_NAMES[ELEMENT_CPP_TYPES[expr.cpp_type]]
+        self._parts.append(f"{BUFFER_CLASS}<{elem_name}>(")
+        self.write_expr(expr.size)
+        if expr.fill is not None:
+            self._parts.append(", ")
+            self.write_expr(expr.fill)
+        self._parts.append(")")
+
+    def _write_array_length(self, expr: ArrayLength) -> None:
+        array = expr.array
+        if array.symbol.buffer:
+            self._parts.append(f"{array.id}.size")
+        elif array.size is not None:
+            # literal
+            self._parts.append(str(array.size))
+        else:
+            self._parts.append(len_arg_name(array.id))
+
+    def _write_intrinsic_call(self, expr: IntrinsicCall) -> None:
+        self._parts.append(f"{expr.cpp_name}(")
+        for idx, arg in enumerate(expr.args):
+            if idx > 0:
+                self._parts.append(", ")
+            self.write_expr(arg)
+        self._parts.append(")")
+
+    def _write_reduction(self, expr: Reduction) -> None:
+        self._parts.append(f"{expr.func}<{CPP_NAMES[expr.cpp_type]}>(")
+        if len(expr.lengths) == 1:
+            self.write_expr(expr.lengths[0])
+        else:
+            self._parts.append(f"{SAME_LENGTH_FUNC}({{")
+            for idx, length in enumerate(expr.lengths):
+                if idx > 0:
+                    self._parts.append(", ")
+                self.write_expr(length)
+            names = ", ".join(length.array.id for length in expr.lengths)
+            self._parts.append(
+                f"}}, {json.dumps(f'Lengths of {names} do not match.')})"
+            )
+        # the element is computed in the loop of the helper
+        self._parts.append(f", [&](int64_t {ELEMENTWISE_INDEX}) {{ return ")
+        self.write_expr(expr.element)
+        self._parts.append("; })")
+
+    def _write_array_map(self, expr: ArrayMap) -> None:
+        raise TypeError(
+            "Element-wise operations on arrays can only be assigned or returned."
+        )
+
+    def _write_cast(self, expr: Cast) -> None:
+        self._parts.append(f"({CPP_NAMES[expr.cpp_type]})")
+        self.write_expr(expr.operand)
+
+    def _write_compare(self, expr: Compare) -> None:
+        # for multiple (oprator, comparator) pairs
+        self._parts.append("(")
+        left = expr.left
+        for idx, (op, comp) in enumerate(zip(expr.ops, expr.comps)):
+            if idx > 0:
+                self._parts.append(" && ")
+            self.write_expr(left)
+            self._parts.append(f" {op.cpp_str} ")
+            self.write_expr(comp)
+            left = comp
+        self._parts.append(")")
+
+    def _write_binop(self, expr: BinOp) -> None:
+        if expr.op.op_type in DIVISION_HELPERS:
+            helper, _ = DIVISION_HELPERS[expr.op.op_type]
+            self._parts.append(f"{helper}(")
+            self.write_expr(expr.left)
+            self._parts.append(", ")
+            self.write_expr(expr.right)
+            self._parts.append(")")
+            return
+        self._parts.append("(")
+        self.write_expr(expr.left)
+        self._parts.append(f" {expr.op.cpp_str} ")
+        self.write_expr(expr.right)
+        self._parts.append(")")
+
+    def _write_unaryop(self, expr: UnaryOp) -> None:
+        self._parts.append(f"({expr.op.cpp_str}")
+        self.write_expr(expr.operand)
+        self._parts.append(")")
+
+    def _write_boolop(self, expr: BoolOp) -> None:
+        self._parts.append("(")
+        # for multiple operands
+        for idx, value in enumerate(expr.values):
+            if idx > 0:
+                self._parts.append(f" {expr.op.cpp_str} ")
+            self.write_expr(value)
+        self._parts.append(")")
+
+    def _write_subscript(self, expr: Subscript) -> None:
+        self.write_expr(expr.value)
+        self._parts.append("[")
+        self.write_expr(expr.slice)
+        self._parts.append("]")
+
+    def _write_index(self, expr: Index) -> None:
+        self.write_expr(expr.value)
+
+    def _write_function_call(self, expr: FunctionCall) -> None:
+        self._parts.append(f"{expr.func_id}(")
+        for idx, arg in enumerate(expr.func_args):
+            if idx > 0:
+                self._parts.append(", ")
+            if isinstance(arg, Variable):
+                self._parts.append(arg.id)
+            else:
+                self.write_expr(arg)
+        self._parts.append(")")
+
+
+def gen_expr(expr: Expression) -> str:
+    """Generates C++ source of an expression."""
+    generator = CppGenerator(None)
+    generator.write_expr(expr)
+    return "".join(generator._parts)
+
+
+def gen_stmt(stmt: Statement) -> str:
+    """Generates C++ source of a statement, including nested blocks."""
+    buf = io.StringIO()
+    CppGenerator(buf).write_stmt(stmt, 0)
+    # without the trailing newline as with expressions
+    return buf.getvalue()[:-1]
@@ -0,0 +1,78 @@
+import os
+import shutil
+import subprocess
+from typing import List
+
+# the helpers of the generated sources use inline variables and std::aligned_alloc
+CXX_STANDARD = "-std=c++17"
+# flags used to build a loadable shared object
+# -fopenmp-simd honors `#pragma omp simd` without linking the OpenMP runtime
+DEFAULT_CXXFLAGS = [CXX_STANDARD, "-O3", "-shared", "-fPIC", "-fopenmp-simd"]
+# added when the source has OpenMP parallel regions
+OPENMP_CXXFLAGS = ["-fopenmp"]
+# added with fast_math=True, allowing reassociation of floating point math
+FAST_MATH_CXXFLAGS = ["-ffast-math"]
+# added with fast_math=True to builds at run time, allowing instructions of the
+# host CPU; never to builds ahead of time, which are shipped to other machines
+NATIVE_CXXFLAGS = ["-march=native"]
+
+
+class CompileError(RuntimeError):
+    """Raised when the C++ compiler fails to build the generated source."""
+
+
+def find_compiler() -> str:
+    """Finds a C++ compiler on the system.
+
+    The compiler given by the environment variable `CXX` takes precedence
+    over g++ and clang++ found in `PATH`.
+
+    Raises:
+        CompileError: Raised when no C++ compiler is found.
+
+    Returns:
+        str: A path to the C++ compiler
+    """
+    candidates = [os.environ.get("CXX"), "g++", "clang++"]
+    for candidate in candidates:
+        if not candidate:
+            continue
+        path = shutil.which(candidate)
+        if path is not None:
+            return path
+    raise CompileError("C++ compiler is not found. Install g++ or clang++.")
+
+
+def compile_shared(
+    src_path: str, out_path: str, cxxflags: List[str] = None, compiler: str = None
+) -> str:
+    """Compiles a C++ source file into a shared object.
+
+    CXX_STANDARD is added unless the flags choose a standard.
+
+    Args:
+        src_path (str): A path to the C++ source file
+        out_path (str): A path to the shared object to be built
+        cxxflags (List[str], optional): Compiler flags. Defaults to DEFAULT_CXXFLAGS.
+        compiler (str, optional): A path to the C++ compiler.
+            Defaults to find_compiler().
+
+    Raises:
+        CompileError: Raised when the compilation fails.
+
+    Returns:
+        str: A path to the built shared object
+    """
+    if cxxflags is None:
+        cxxflags = DEFAULT_CXXFLAGS
+    if not any(flag.startswith("-std=") for flag in cxxflags):
+        cxxflags = [CXX_STANDARD, *cxxflags]
+    if compiler is None:
+        compiler = find_compiler()
+    cmd = [compiler, *cxxflags, src_path, "-o", out_path]
+    proc = subprocess.run(cmd, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise CompileError(
+            f"Failed to compile {src_path}:\n$ {' '.join(cmd)}\n{proc.stderr}"
+        )
+    return out_path
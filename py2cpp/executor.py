@@ -0,0 +1,32 @@
+import os
+import threading
+from concurrent.futures import Executor, ThreadPoolExecutor
+
+_default_executor: Executor = None
+_lock = threading.Lock()
+
+
+def default_executor() -> Executor:
+    """Returns the executor running submit() and run_async() of the compiled
+    functions without their own executor.
+
+    A ThreadPoolExecutor of os.cpu_count() threads is created on first use.
+    Threads suffice as ctypes releases the GIL while the native code runs.
+    """
+    global _default_executor
+    with _lock:
+        if _default_executor is None:
+            _default_executor = ThreadPoolExecutor(
+                max_workers=os.cpu_count(), thread_name_prefix="py2cpp"
+            )
+        return _default_executor
+
+
+def set_default_executor(executor: Executor) -> None:
+    """Replaces the default executor, e.g. with a pool of another size.
+
+    The previous executor is not shut down, as calls may still be running on it.
+    """
+    global _default_executor
+    with _lock:
+        _default_executor = executor
@@ -1,9 +1,50 @@
 import ast
 from enum import Enum
-from typing import Dict, List, Type
+from typing import Callable, Dict, List, Type
 
 from .ops import Operator, OpType, process_operator
-from .type_system import CppType, type_py2cpp, type_typing2py
+from .symbols import Symbol, SymbolTable
+from .type_system import (
+    ARRAY_CPP_TYPES,
+    CPP2TYPING,
+    CPP_NAMES,
+    ELEMENT_CPP_TYPES,
+    ELEMENT_TYPES,
+    FLOATING_TYPES,
+    INTEGER_RANGES,
+    INTEGER_TYPES,
+    NUMERIC_TYPES,
+    PROMOTIONS,
+    WIDENINGS,
+    CppType,
+    PyType,
+    float32,
+    int8,
+    int64,
+    type_py2cpp,
+    type_typing2py,
+    uint8,
+)
+
+# loop variable of element-wise operations on arrays
+ELEMENTWISE_INDEX = "py2cpp_i"
+
+# name of a conversion function -> the type converted to
+# e.g. int(x), float32(x), np.int64(x)
+CONVERSIONS: Dict[str, Type] = {
+    "bool": bool,
+    "int": int,
+    "float": float,
+    "int8": int8,
+    "uint8": uint8,
+    "int32": int,
+    "int64": int64,
+    "float32": float32,
+    "float64": float,
+}
+
+# modules whose types convert values, e.g. np.float32(x)
+CONVERSION_MODULES = frozenset({"np", "numpy", "py2cpp"})
 
 
 class VarCtxt(Enum):
@@ -14,12 +55,31 @@ class VarCtxt(Enum):
 
 
 class Expression:
+    """Node of the typed intermediate representation.
+
+    Every expression has `type`, `py_type` and `cpp_type`.
+    C++ source is not built here but generated from the tree by codegen.
+    """
+
+    __slots__ = ()
+
+    @property
+    def cpp_str(self) -> str:
+        from .codegen import gen_expr
+
+        return gen_expr(self)
+
+
+class TypedExpression(Expression):
+    """Expression whose type is derived from its operands on construction"""
+
+    __slots__ = ("type", "py_type", "cpp_type")
+
     def __init__(self, type: Type) -> None:
         self.type = type
 
         self.py_type = None
         self.cpp_type = None
-        self.cpp_str = None
 
         if self.type is not None:
             self.py_type = type_typing2py(self.type)
@@ -27,59 +87,54 @@ class Expression:
 
 
 class Variable(Expression):
-    def __init__(self, id: str, type: Type, ctx: VarCtxt, size: int = None) -> None:
-        super().__init__(type)
-        self.id = id
-        self.ctx = ctx
-        self.size = size
-        self._reflect_ctx()
+    """Reference to a variable.
 
-    def set_type(self, type: Type) -> None:
-        """Sets the type of Variable and update cpp_str"""
-        self.type = type
-        self._reflect_ctx()
+    The types are read from the shared Symbol instead of being stored
+    in every reference.
+    """
 
-    def set_size(self, size: int) -> None:
-        """Sets the size of array and update cpp_str"""
-        self.size = size
-        self._reflect_ctx()
-
-    def _reflect_ctx(self) -> None:
-        if self.type is None:
-            return
-        self.py_type = type_typing2py(self.type)
-        self.cpp_type = type_py2cpp(self.py_type)
-        if self.ctx == VarCtxt.NEW:
-            self.cpp_str = self._gen_vardef_cpp_str()
-        elif self.ctx == VarCtxt.REUSE:
-            self.cpp_str = self.id
-        else:
+    __slots__ = ("symbol", "ctx")
+
+    def __init__(self, symbol: Symbol, ctx: VarCtxt) -> None:
+        if ctx not in (VarCtxt.NEW, VarCtxt.REUSE):
             raise ValueError("ctx must be NEW or REUSE.")
+        self.symbol = symbol
+        self.ctx = ctx
+
+    @property
+    def id(self) -> str:
+        return self.symbol.id
+
+    @property
+    def type(self) -> Type:
+        return self.symbol.type
+
+    @property
+    def py_type(self) -> PyType:
+        return self.symbol.py_type
+
+    @property
+    def cpp_type(self) -> CppType:
+        return self.symbol.cpp_type
+
+    @property
+    def size(self) -> int:
+        return self.symbol.size
+
+
+class Constant(TypedExpression):
+    __slots__ = ("value",)
 
-    def _gen_vardef_cpp_str(self) -> str:
-        if self.cpp_type == CppType.BOOL:
-            return f"bool {self.id}"
-        if self.cpp_type == CppType.INT:
-            return f"int {self.id}"
-        if self.cpp_type == CppType.DOUBLE:
-            return f"double {self.id}"
-        if self.cpp_type == CppType.ARRAY_INT:
-            return f"int {self.id}[{self.size}]"
-        if self.cpp_type == CppType.ARRAY_DOUBLE:
-            return f"double {self.id}[{self.size}]"
-        raise TypeError(f"C++ type {self.cpp_type} is not supported.")
-
-
-class Constant(Expression):
     def __init__(self, value: int or float or bool) -> None:
         if not isinstance(value, (int, float, bool)):
             raise TypeError(f"Invalid value type {type(value)}")
         super().__init__(type(value))
-        # True / False in Python is equivalent to true / false in C++.
-        self.cpp_str = str(value).lower() if isinstance(value, bool) else str(value)
+        self.value = value
+
 
+class Array(TypedExpression):
+    __slots__ = ("value", "size")
 
-class Array(Expression):
     def __init__(self, value: list) -> None:
         if not isinstance(value, list):
             raise TypeError(f"{value} is not a list.")
@@ -98,10 +153,86 @@ class Array(Expression):
         else:
             raise TypeError(f"Element type {ele_type} is not supported.")
 
-        self.cpp_str = "{" + ", ".join(map(str, value)) + "}"
+        self.value = value
+
+
+class ArrayAlloc(TypedExpression):
+    """`[fill] * size`, an array of a size known at run time
+
+    It is allocated on the heap and freed at the end of the scope unless
+    it is returned. Without fill, the elements are left uninitialized.
+    """
+
+    __slots__ = ("fill", "size")
+
+    def __init__(
+        self, fill: Expression, size: Expression, elem_type: Type = None
+    ) -> None:
+        # the type of fill, or elem_type without fill
+        elem_cpp_type = (
+            type_py2cpp(type_typing2py(elem_type)) if fill is None else fill.cpp_type
+        )
+        if elem_cpp_type not in ARRAY_CPP_TYPES:
+            raise TypeError(f"Array of {elem_cpp_type} is not supported.")
+        if size.cpp_type not in INTEGER_TYPES:
+            raise TypeError("Size of an array must be an integer.")
+        super().__init__(List[CPP2TYPING[elem_cpp_type]])
+        self.fill = fill
+        self.size = size
+
+
+class ArrayLength(TypedExpression):
+    """Length of an array variable
+
+    The size of a literal, the size of a buffer of `[x] * n`, or the length
+    argument of an array argument.
+    """
+
+    __slots__ = ("array",)
+
+    def __init__(self, array: "Variable") -> None:
+        if not isinstance(array, Variable) or array.cpp_type not in ELEMENT_CPP_TYPES:
+            raise TypeError("Only the length of an array variable is known.")
+        super().__init__(int64)
+        self.array = array
+
+
+class ArrayMap(TypedExpression):
+    """Element-wise operation on arrays as with numpy, e.g. `a * b + 1.0`
+
+    `element` computes one element of the result, where the arrays are
+    subscripted by a variable named ELEMENTWISE_INDEX. It is lowered to a
+    single loop over the arrays without temporary arrays.
+    """
+
+    __slots__ = ("element", "arrays")
+
+    def __init__(self, element: Expression, arrays: List["Variable"]) -> None:
+        if element.cpp_type not in ARRAY_CPP_TYPES:
+            raise TypeError(f"Array of {element.cpp_type} is not supported.")
+        super().__init__(List[CPP2TYPING[element.cpp_type]])
+        self.element = element
+        # arrays of the operands, which must have the same length
+        self.arrays = arrays
+
+
+class Cast(TypedExpression):
+    """Explicit conversion of the operand to the given type"""
+
+    __slots__ = ("operand",)
+
+    def __init__(self, type: Type, operand: Expression) -> None:
+        super().__init__(type)
+        if self.cpp_type not in CPP_NAMES:
+            raise TypeError(f"Cast to {self.cpp_type} is not supported.")
+        if operand.cpp_type not in CPP_NAMES:
+            raise TypeError(f"Cast from {operand.cpp_type} is not supported.")
+        self.operand = operand
+
 
+class Compare(TypedExpression):
+    __slots__ = ("left", "ops", "comps")
 
-class Compare(Expression):
     def __init__(
         self, left: Expression, ops: List[Operator], comps: List[Expression]
     ) -> None:
@@ -109,150 +240,285 @@ class Compare(Expression):
         self.left = left
         self.ops = ops
         self.comps = comps
-        # for multiple (oprator, comparator) pairs
-        conditions = [f"{left.cpp_str} {ops[0].cpp_str} {comps[0].cpp_str}"]
-        for idx in range(1, len(comps)):
-            conditions.append(
-                f"{comps[idx-1].cpp_str} {ops[idx].cpp_str} {comps[idx].cpp_str}"
-            )
-        self.cpp_str = f"({' && '.join(conditions)})"
 
 
-class BinOp(Expression):
+class BinOp(TypedExpression):
+    __slots__ = ("left", "op", "right")
+
     def __init__(self, left: Expression, op: Operator, right: Expression) -> None:
-        prefix = ""
         # check type validity and initialize evaluated type
-        # addition, subtraction, multiplication
-        if op.op_type in (OpType.ADD, OpType.SUB, OpType.MULT):
-            if left.cpp_type == CppType.INT and right.cpp_type == CppType.INT:
-                super().__init__(int)
-            elif left.cpp_type == CppType.INT and right.cpp_type == CppType.DOUBLE:
-                super().__init__(float)
-            elif left.cpp_type == CppType.DOUBLE and right.cpp_type == CppType.INT:
-                super().__init__(float)
-            elif left.cpp_type == CppType.DOUBLE and right.cpp_type == CppType.DOUBLE:
-                super().__init__(float)
-            else:
-                raise TypeError(
-                    f"Invalid operand types: {left.cpp_type} and {right.cpp_type}"
-                )
+        result = PROMOTIONS.get((left.cpp_type, right.cpp_type))
+        if result is None:
+            raise TypeError(
+                f"Invalid operand types: {left.cpp_type} and {right.cpp_type}"
+            )
         # division
-        elif op.op_type == OpType.DIV:
-            if left.cpp_type == CppType.INT and right.cpp_type == CppType.INT:
+        if op.op_type == OpType.DIV:
+            if result in INTEGER_TYPES:
                 # (INT)/(INT) in Python is equivalent to (double)(INT)/(INT) in C++
-                prefix = "(double)"
+                left = Cast(float, left)
                 # to be evaluated as float in Python, as double in C++
-                super().__init__(float)
-            elif left.cpp_type == CppType.INT and right.cpp_type == CppType.DOUBLE:
-                super().__init__(float)
-            elif left.cpp_type == CppType.DOUBLE and right.cpp_type == CppType.INT:
-                super().__init__(float)
-            elif left.cpp_type == CppType.DOUBLE and right.cpp_type == CppType.DOUBLE:
-                super().__init__(float)
-            else:
-                raise TypeError(
-                    f"Invalid operand types: {left.cpp_type} and {right.cpp_type}"
-                )
-        # floor division
-        elif op.op_type == OpType.FLOORDIV:
-            if left.cpp_type == CppType.INT and right.cpp_type == CppType.INT:
-                # (INT)//(INT) in Python is equivalent to (INT)/(INT) in C++
-                # to be evaluated as int
-                super().__init__(int)
-            elif left.cpp_type == CppType.DOUBLE or right.cpp_type == CppType.DOUBLE:
+                result = CppType.DOUBLE
+        # floor division and modulo
+        elif op.op_type in (OpType.FLOORDIV, OpType.MOD):
+            if result not in INTEGER_TYPES:
                 raise TypeError(
-                    f"FloorDiv with operands ({left.cpp_type}, {right.cpp_type}) is not supported."
-                )
-            else:
-                raise TypeError(
-                    f"Invalid operand types: {left.cpp_type} and {right.cpp_type}"
-                )
-        # modulo
-        elif op.op_type == OpType.MOD:
-            if left.cpp_type == CppType.INT and right.cpp_type == CppType.INT:
-                # (INT)%(INT) in Python is equivalent to (INT)%(INT) in C++
-                # to be evaluated as int
-                super().__init__(int)
-            elif left.cpp_type == CppType.DOUBLE or right.cpp_type == CppType.DOUBLE:
-                raise TypeError(
-                    f"Modulo with operands ({left.cpp_type}, {right.cpp_type}) is not supported."
-                )
-            else:
-                raise TypeError(
-                    f"Invalid operand types: {left.cpp_type} and {right.cpp_type}"
+                    f"{op.op_type.name} with operands "
+                    f"({left.cpp_type}, {right.cpp_type}) is not supported."
                 )
+        # a float literal does not widen float32 to double
+        if result == CppType.DOUBLE:
+            if left.cpp_type == CppType.FLOAT and _is_float_literal(right):
+                right = Cast(float32, right)
+                result = CppType.FLOAT
+            elif right.cpp_type == CppType.FLOAT and _is_float_literal(left):
+                left = Cast(float32, left)
+                result = CppType.FLOAT
+        super().__init__(CPP2TYPING[result])
 
         self.left = left
         self.op = op
         self.right = right
-        self.cpp_str = f"({prefix}{left.cpp_str} {op.cpp_str} {right.cpp_str})"
 
 
-class UnaryOp(Expression):
+class UnaryOp(TypedExpression):
+    __slots__ = ("op", "operand")
+
     def __init__(self, op: Operator, operand: Expression) -> None:
-        super().__init__(operand.type)
+        if op.op_type == OpType.NOT:
+            super().__init__(bool)
+        elif operand.cpp_type in NUMERIC_TYPES:
+            # int8_t and uint8_t are promoted to int
+            super().__init__(
+                CPP2TYPING[PROMOTIONS[(operand.cpp_type, operand.cpp_type)]]
+            )
+        else:
+            raise TypeError(f"Invalid operand type: {operand.cpp_type}")
         self.op = op
         self.operand = operand
-        self.cpp_str = f"({op.cpp_str}{operand.cpp_str})"
 
 
-class BoolOp(Expression):
+class BoolOp(TypedExpression):
+    __slots__ = ("op", "values")
+
     def __init__(self, op: Operator, values: List[Expression]) -> None:
         super().__init__(bool)
         self.op = op
         self.values = values
-        self.cpp_str = f"({values[0].cpp_str}"
-        # for multiple operands
-        for value in values[1:]:
-            self.cpp_str += f" {op.cpp_str} {value.cpp_str}"
-        self.cpp_str += ")"
 
 
-class Subscript(Expression):
+class Subscript(TypedExpression):
+    __slots__ = ("value", "slice", "ctx")
+
     def __init__(
         self, value: Expression, slice: Expression, array_type: Type, ctx: VarCtxt
     ):
-        if array_type == List[int]:
-            super().__init__(int)
-        elif array_type == List[float]:
-            super().__init__(float)
-        else:
+        array_py_type = type_typing2py(array_type)
+        if array_py_type not in ELEMENT_TYPES:
             raise TypeError(f"Array type {array_type} is not supported.")
+        super().__init__(ELEMENT_TYPES[array_py_type])
         self.value = value
         self.slice = slice
         self.ctx = ctx
-        self.cpp_str = f"{value.cpp_str}[{slice.cpp_str}]"
 
 
-class Index(Expression):
+class Index(TypedExpression):
+    __slots__ = ("value",)
+
     def __init__(self, value: Expression):
-        if value.cpp_type != CppType.INT:
+        if value.cpp_type not in INTEGER_TYPES:
             raise TypeError("Index must be an integer.")
-        super().__init__(int)
+        super().__init__(value.type)
         self.value = value
-        self.cpp_str = value.cpp_str
 
 
-class FunctionCall(Expression):
-    def __init__(self, func_id: str, func_args: List[Variable or Constant], ret_type):
+class FunctionCall(TypedExpression):
+    __slots__ = ("func_id", "func_args", "callee")
+
+    def __init__(
+        self, func_id: str, func_args: List[Expression], ret_type, callee=None
+    ):
         super().__init__(ret_type)
-        func_args_strs: List[str] = []
         for arg in func_args:
-            if isinstance(arg, Variable):
-                func_args_strs.append(arg.id)
-            elif isinstance(arg, Constant):
-                func_args_strs.append(arg.cpp_str)
-            else:
+            # arrays are passed by pointer, scalars by value
+            if arg.cpp_type in ELEMENT_CPP_TYPES and not isinstance(arg, Variable):
                 raise TypeError(f"Argument type {arg.cpp_type} is not supported.")
-        self.cpp_str = f"{func_id}({', '.join(func_args_strs)})"
+        self.func_id = func_id
+        self.func_args = func_args
+        # FunctionDef transpiled from the called Python function, if resolved
+        self.callee = callee
+
+
+# expression type -> its subexpressions
+EXPR_CHILDREN: Dict[type, Callable[[Expression], List[Expression]]] = {
+    ArrayAlloc: lambda e: [e.size] if e.fill is None else [e.fill, e.size],
+    ArrayLength: lambda e: [e.array],
+    ArrayMap: lambda e: [e.element, *e.arrays],
+    Cast: lambda e: [e.operand],
+    Compare: lambda e: [e.left, *e.comps],
+    BinOp: lambda e: [e.left, e.right],
+    UnaryOp: lambda e: [e.operand],
+    BoolOp: lambda e: e.values,
+    Subscript: lambda e: [e.value, e.slice],
+    Index: lambda e: [e.value],
+    FunctionCall: lambda e: e.func_args,
+}
+
+
+def iter_children(expr: Expression) -> List[Expression]:
+    """Returns the direct subexpressions of an expression."""
+    children = EXPR_CHILDREN.get(type(expr))
+    if children is None:
+        return []
+    return children(expr)
+
+
+def _is_float_literal(expr: Expression) -> bool:
+    return isinstance(expr, Constant) and isinstance(expr.value, float)
+
+
+def _fits_literal(expr: Expression, cpp_type: CppType) -> bool:
+    """Checks that expr is a numeric literal representable in cpp_type."""
+    if not isinstance(expr, Constant) or isinstance(expr.value, bool):
+        return False
+    if cpp_type in FLOATING_TYPES:
+        return True
+    if cpp_type in INTEGER_RANGES and isinstance(expr.value, int):
+        low, high = INTEGER_RANGES[cpp_type]
+        return low <= expr.value <= high
+    return False
+
+
+def coerce(expr: Expression, cpp_type: CppType, same_kind: bool = False) -> Expression:
+    """Converts an expression to be assigned to a variable of cpp_type.
+
+    Widening conversions and literals representable in cpp_type get an
+    explicit Cast. With same_kind, narrowing between integers or between
+    floating point types is allowed as well, as numpy does for stores into
+    array elements.
+
+    Raises:
+        TypeError: Raised when the conversion may lose information.
+
+    Returns:
+        Expression: expr itself or a Cast of it
+    """
+    if expr.cpp_type == cpp_type:
+        return expr
+    if (
+        (expr.cpp_type, cpp_type) in WIDENINGS
+        or _fits_literal(expr, cpp_type)
+        or (
+            same_kind
+            and (
+                {expr.cpp_type, cpp_type} <= INTEGER_TYPES
+                or {expr.cpp_type, cpp_type} <= FLOATING_TYPES
+            )
+        )
+    ):
+        return Cast(CPP2TYPING[cpp_type], expr)
+    raise TypeError(
+        f"Implicit cast from {expr.cpp_type} to {cpp_type} is not supported."
+    )
 
 
-def process_expr(expr: ast.expr, var_table: Dict[str, Variable]) -> Expression:
+def elementwise(
+    build: Callable[[List[Expression]], Expression], operands: List[Expression]
+) -> Expression:
+    """Applies an operation to the elements of array operands.
+
+    Args:
+        build (Callable[[List[Expression]], Expression]): Builds the operation
+            on scalar operands
+        operands (List[Expression]): Operands, scalars are broadcast
+
+    Raises:
+        TypeError: Raised when an array operand is not a variable.
+
+    Returns:
+        Expression: An ArrayMap if any operand is an array, otherwise the
+            scalar operation itself
+    """
+    if not any(operand.cpp_type in ELEMENT_CPP_TYPES for operand in operands):
+        return build(operands)
+    index = Symbol(ELEMENTWISE_INDEX, int64)
+    arrays: List[Variable] = []
+    elements: List[Expression] = []
+    for operand in operands:
+        if isinstance(operand, ArrayMap):
+            arrays += operand.arrays
+            elements.append(operand.element)
+        elif operand.cpp_type in ELEMENT_CPP_TYPES:
+            if not isinstance(operand, Variable):
+                raise TypeError("Arrays in element-wise operations must be variables.")
+            arrays.append(operand)
+            elements.append(
+                Subscript(
+                    operand, Variable(index, VarCtxt.REUSE), operand.type, VarCtxt.REUSE
+                )
+            )
+        else:
+            elements.append(operand)
+    # each array is checked and iterated once
+    unique_arrays: Dict[Symbol, Variable] = dict()
+    for array in arrays:
+        unique_arrays.setdefault(array.symbol, array)
+    return ArrayMap(build(elements), list(unique_arrays.values()))
+
+
+def _call_name(func: ast.expr, var_table: SymbolTable) -> str:
+    """e.g. "f" for f(x), "float32" for np.float32(x)
+
+    Attributes are only called on the math module and on the modules of the
+    conversions, which are not shadowed by variables.
+    """
+    if isinstance(func, ast.Name):
+        return func.id
+    module_name = _module_name(func)
+    if module_name is not None and module_name not in var_table:
+        if module_name == "math":
+            return func.attr
+        if module_name in CONVERSION_MODULES and func.attr in CONVERSIONS:
+            return func.attr
+    raise TypeError(f"Callee {ast.dump(func)} is not supported.")
+
+
+def is_array_alloc(expr: ast.expr) -> bool:
+    """Checks that expr is `[fill] * size` or `size * [fill]`."""
+    if not (isinstance(expr, ast.BinOp) and isinstance(expr.op, ast.Mult)):
+        return False
+    return isinstance(expr.left, ast.List) != isinstance(expr.right, ast.List)
+
+
+def process_array_alloc(expr: ast.BinOp, var_table: SymbolTable) -> ArrayAlloc:
+    """Processes `[fill] * size` and returns a constructed ArrayAlloc object.
+
+    Raises:
+        TypeError: Raised when the list does not have exactly one element.
+    """
+    if isinstance(expr.left, ast.List):
+        elts, size = expr.left.elts, expr.right
+    else:
+        elts, size = expr.right.elts, expr.left
+    if len(elts) != 1:
+        raise TypeError("Only a list of one element can be repeated.")
+    fill = process_expr(elts[0], var_table)
+    return ArrayAlloc(fill, process_expr(size, var_table))
+
+
+def _module_name(expr: ast.expr) -> str:
+    """e.g. "math" for math.sqrt, or None if expr is not an attribute of a name"""
+    if isinstance(expr, ast.Attribute) and isinstance(expr.value, ast.Name):
+        return expr.value.id
+    return None
+
+
+def process_expr(expr: ast.expr, var_table: SymbolTable) -> Expression:
     """Processes an expression and returns a constructed Expression object.
 
     Args:
         expr (ast.expr): An expression to be processed.
-        var_table (Dict[str, Variable]): A variable table
+        var_table (SymbolTable): A variable table
 
     Returns:
         Expression: A constructed Expression object
@@ -261,18 +527,19 @@ def process_expr(expr: ast.expr, var_table: Dict[str, Variable]) -> Expression:
     if isinstance(expr, ast.Name):
         if isinstance(expr.ctx, ast.Load):
             # when loaded, no type annotation needed
-            if expr.id not in var_table:
+            symbol = var_table.get(expr.id)
+            if symbol is None:
                 raise ValueError(
                     f"Variable {expr.id} must be defined before this expression."
                 )
-            return Variable(expr.id, var_table[expr.id].type, VarCtxt.REUSE)
+            return Variable(symbol, VarCtxt.REUSE)
         elif isinstance(expr.ctx, ast.Store):
-            if expr.id in var_table:
+            symbol = var_table.get(expr.id)
+            if symbol is not None:
                 # already defined, so no type annotation needed
-                return Variable(expr.id, var_table[expr.id].type, VarCtxt.REUSE)
-            # to define new variable, so type annotation is needed
-            var_table[expr.id] = Variable(expr.id, None, VarCtxt.NEW)
-            return Variable(expr.id, None, VarCtxt.NEW)
+                return Variable(symbol, VarCtxt.REUSE)
+            # to define new variable, the type is set by the assignment
+            return Variable(var_table.define(expr.id), VarCtxt.NEW)
         else:
             raise TypeError(f"Variable context {expr.ctx} is not supported.")
     # literals
@@ -288,19 +555,24 @@ def process_expr(expr: ast.expr, var_table: Dict[str, Variable]) -> Expression:
         target = process_expr(expr.left, var_table)
         ops = [process_operator(op) for op in expr.ops]
         comps = [process_expr(comp, var_table) for comp in expr.comparators]
-        return Compare(target, ops, comps)
+        return elementwise(
+            lambda operands: Compare(operands[0], ops, operands[1:]),
+            [target, *comps],
+        )
 
     # operations
     elif isinstance(expr, ast.BinOp):
         left = process_expr(expr.left, var_table)
         op = process_operator(expr.op)
         right = process_expr(expr.right, var_table)
-        return BinOp(left, op, right)
+        return elementwise(
+            lambda operands: BinOp(operands[0], op, operands[1]), [left, right]
+        )
 
     elif isinstance(expr, ast.UnaryOp):
         op = process_operator(expr.op)
         operand = process_expr(expr.operand, var_table)
-        return UnaryOp(op, operand)
+        return elementwise(lambda operands: UnaryOp(op, operands[0]), [operand])
 
     elif isinstance(expr, ast.BoolOp):
         op = process_operator(expr.op)
@@ -310,22 +582,48 @@ def process_expr(expr: ast.expr, var_table: Dict[str, Variable]) -> Expression:
     elif isinstance(expr, ast.Subscript):
         var: Variable = process_expr(expr.value, var_table)
         idx: Index = process_expr(expr.slice, var_table)
-        array_type = var_table[var.id].type
-        return Subscript(var, idx, array_type, VarCtxt.REUSE)
+        return Subscript(var, idx, var.type, VarCtxt.REUSE)
 
     elif isinstance(expr, ast.Index):
         var = process_expr(expr.value, var_table)
         return Index(var)
 
+    # constants of the math module
+    elif isinstance(expr, ast.Attribute):
+        from .intrinsics import MATH_CONSTANTS
+
+        if _module_name(expr) != "math" or expr.attr not in MATH_CONSTANTS:
+            raise TypeError(f"Attribute {ast.dump(expr)} is not supported.")
+        return MATH_CONSTANTS[expr.attr]()
+
     # function call
     elif isinstance(expr, ast.Call):
-        func_id = expr.func.id
+        # imported here since intrinsics build on the nodes of this module
+        from .intrinsics import INTRINSICS, MATH_INTRINSICS
+
+        func_id = _call_name(expr.func, var_table)
         func_args = [process_expr(arg, var_table) for arg in expr.args]
-        if func_id in var_table:
-            ret_type = var_table[func_id].type
-        else:
-            # cannot decide return type now
-            ret_type = None
+        module_name = _module_name(expr.func)
+        if module_name == "math":
+            if func_id not in MATH_INTRINSICS:
+                raise TypeError(f"math.{func_id}() is not supported.")
+            return MATH_INTRINSICS[func_id](func_args)
+        if func_id in CONVERSIONS and (
+            module_name is not None or func_id not in var_table
+        ):
+            if len(func_args) != 1:
+                raise TypeError(f"{func_id}() takes exactly one argument.")
+            return Cast(CONVERSIONS[func_id], func_args[0])
+        if func_id in INTRINSICS and func_id not in var_table:
+            return INTRINSICS[func_id](func_args)
+        symbol = var_table.get(func_id)
+        if symbol is None and var_table.resolve_call is not None:
+            callee = var_table.resolve_call(func_id, func_args)
+            if callee is not None:
+                ret_type = CPP2TYPING.get(callee.ret_cpp_type)
+                return FunctionCall(func_id, func_args, ret_type, callee)
+        # cannot decide return type now unless it is a known variable
+        ret_type = None if symbol is None else symbol.type
         return FunctionCall(func_id, func_args, ret_type)
 
     else:
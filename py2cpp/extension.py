@@ -0,0 +1,287 @@
+import importlib.util
+import os
+import sysconfig
+import tempfile
+from types import ModuleType
+from typing import Any, Dict, List, TextIO
+
+from .compiler import DEFAULT_CXXFLAGS, OPENMP_CXXFLAGS, compile_shared
+from .runtime import ERROR_VAR, MEMORY_ERROR_PREFIX
+from .statement import BlockStatement, ForRangeStmt, Statement, WhileStmt
+from .stats import Stats, phase
+from .type_system import (
+    CPP_NAMES,
+    ELEMENT_CPP_TYPES,
+    FLOATING_TYPES,
+    INTEGER_RANGES,
+    CppType,
+)
+
+# holds a buffer of an array argument, released at the end of the call
+VIEW_CLASS = "py2cpp_view"
+
+# C++ array type -> format characters of the struct module accepted for it
+BUFFER_FORMATS: Dict[CppType, str] = {
+    CppType.ARRAY_BOOL: "?",
+    CppType.ARRAY_INT8: "b",
+    CppType.ARRAY_UINT8: "B",
+    CppType.ARRAY_INT: "i",
+    CppType.ARRAY_INT64: "ql",
+    CppType.ARRAY_FLOAT: "f",
+    CppType.ARRAY_DOUBLE: "d",
+}
+
+VIEW_SRC = f"""struct {VIEW_CLASS} {{
+	Py_buffer view;
+	bool acquired = false;
+	~{VIEW_CLASS}() {{
+		if (acquired) {{
+			PyBuffer_Release(&view);
+		}}
+	}}
+	// gets a writable C-contiguous buffer of one of the formats
+	bool get(PyObject *obj, const char *formats, Py_ssize_t itemsize, const char *name) {{
+		if (PyObject_GetBuffer(obj, &view, PyBUF_WRITABLE | PyBUF_C_CONTIGUOUS | PyBUF_FORMAT) < 0) {{
+			return false;
+		}}
+		acquired = true;
+		const char *format = view.format == NULL ? "B" : view.format;
+		// native or little endian byte order
+		if (*format == '@' || *format == '=' || *format == '<') {{
+			format++;
+		}}
+		if (format[0] == '\\0' || format[1] != '\\0' || std::strchr(formats, format[0]) == NULL
+			|| view.itemsize != itemsize) {{
+			PyErr_Format(PyExc_TypeError, "Argument %s must be an array of format '%c', not '%s'.",
+				name, formats[0], view.format == NULL ? "B" : view.format);
+			return false;
+		}}
+		return true;
+	}}
+	int64_t size() const {{ return view.len / view.itemsize; }}
+}};
+"""
+
+
+def _has_loops(block: List[Statement]) -> bool:
+    for stmt in block:
+        if isinstance(stmt, (ForRangeStmt, WhileStmt)):
+            return True
+        if isinstance(stmt, BlockStatement) and _has_loops(stmt.body):
+            return True
+    return False
+
+
+def _write_unbox(stream: TextIO, arg, index: int) -> List[str]:
+    """Writes the conversion of an argument and returns the C++ arguments."""
+    obj = f"args[{index}]"
+    # not to shadow the parameters of the wrapper
+    local = f"py2cpp_{arg.name}"
+    if arg.cpp_type in ELEMENT_CPP_TYPES:
+        elem_name = CPP_NAMES[ELEMENT_CPP_TYPES[arg.cpp_type]]
+        stream.write(
+            f"\t{VIEW_CLASS} {local};\n"
+            f'\tif (!{local}.get({obj}, "{BUFFER_FORMATS[arg.cpp_type]}", '
+            f'sizeof({elem_name}), "{arg.name}")) {{\n'
+            "\t\treturn NULL;\n"
+            "\t}\n"
+        )
+        c_args = [f"static_cast<{elem_name} *>({local}.view.buf)"]
+        if arg.pass_len:
+            c_args.append(f"{local}.size()")
+        return c_args
+    if arg.cpp_type == CppType.BOOL:
+        # any object as with bool()
+        stream.write(
+            f"\tint {local} = PyObject_IsTrue({obj});\n"
+            f"\tif ({local} < 0) {{\n"
+            "\t\treturn NULL;\n"
+            "\t}\n"
+        )
+        return [f"{local} != 0"]
+    if arg.cpp_type in FLOATING_TYPES:
+        # ints are accepted as well
+        stream.write(
+            f"\tdouble {local} = PyFloat_AsDouble({obj});\n"
+            f"\tif ({local} == -1.0 && PyErr_Occurred()) {{\n"
+            "\t\treturn NULL;\n"
+            "\t}\n"
+        )
+        return [f"({CPP_NAMES[arg.cpp_type]}){local}"]
+    low, high = INTEGER_RANGES[arg.cpp_type]
+    stream.write(
+        f"\tlong long {local} = PyLong_AsLongLong({obj});\n"
+        f"\tif ({local} == -1 && PyErr_Occurred()) {{\n"
+        "\t\treturn NULL;\n"
+        "\t}\n"
+    )
+    if arg.cpp_type != CppType.INT64:
+        stream.write(
+            f"\tif ({local} < {low}LL || {local} > {high}LL) {{\n"
+            f'\t\tPyErr_SetString(PyExc_OverflowError, "Argument {arg.name} '
+            f'is out of the range of {CPP_NAMES[arg.cpp_type]}.");\n'
+            "\t\treturn NULL;\n"
+            "\t}\n"
+        )
+    return [f"({CPP_NAMES[arg.cpp_type]}){local}"]
+
+
+def _box(cpp_type: CppType) -> str:
+    if cpp_type == CppType.BOOL:
+        return "PyBool_FromLong(py2cpp_ret)"
+    if cpp_type in FLOATING_TYPES:
+        return "PyFloat_FromDouble(py2cpp_ret)"
+    return "PyLong_FromLongLong(py2cpp_ret)"
+
+
+def write_extension_module(stream: TextIO, func_def, module_name: str) -> None:
+    """Writes a CPython extension module exposing the function.
+
+    The function is called through METH_FASTCALL, with scalar arguments
+    unboxed directly and arrays accessed through the buffer protocol.
+    The GIL is released during the call of a function with loops.
+
+    Args:
+        stream (TextIO): A text stream
+        func_def (FunctionDef): A processed function
+        module_name (str): Name of the module, which must match the file name
+
+    Raises:
+        TypeError: Raised when the function returns an array.
+    """
+    if func_def.ret_cpp_type in ELEMENT_CPP_TYPES:
+        raise TypeError("Extension modules cannot return arrays.")
+    # Python.h must be included before the standard headers
+    stream.write("#define PY_SSIZE_T_CLEAN\n#include <Python.h>\n\n")
+    func_def.includes |= {"cstdint", "cstring"}
+    func_def.write_includes(stream)
+    func_def.write_helpers(stream)
+    # only the module initialization function is exported
+    func_def.storage = "static "
+    func_def.write(stream, with_includes=False)
+
+    name = func_def.name
+    wrapper = f"py2cpp_fastcall_{name}"
+    nargs = len(func_def.args)
+    stream.write(
+        f"\n{VIEW_SRC}\n"
+        f"static PyObject *{wrapper}(PyObject *self, PyObject *const *args, "
+        "Py_ssize_t nargs) {\n"
+        f"\tif (nargs != {nargs}) {{\n"
+        "\t\tPyErr_Format(PyExc_TypeError, "
+        f'"{name}() takes {nargs} arguments but %zd were given.", nargs);\n'
+        "\t\treturn NULL;\n"
+        "\t}\n"
+    )
+    c_args = []
+    for index, arg in enumerate(func_def.args):
+        c_args += _write_unbox(stream, arg, index)
+    call = f"{name}({', '.join(c_args)})"
+    if func_def.ret_cpp_type is not None:
+        stream.write(f"\t{func_def.ret_type_str} py2cpp_ret;\n")
+        call = f"py2cpp_ret = {call}"
+    if _has_loops(func_def.body) or func_def.callees:
+        # other threads run during the call
+        stream.write(f"\tPy_BEGIN_ALLOW_THREADS\n\t{call};\n\tPy_END_ALLOW_THREADS\n")
+    else:
+        # releasing the GIL costs more than a short function
+        stream.write(f"\t{call};\n")
+    if func_def.raises:
+        stream.write(
+            f"\tif ({ERROR_VAR} != nullptr) {{\n"
+            f"\t\tconst char *py2cpp_message = {ERROR_VAR};\n"
+            f"\t\t{ERROR_VAR} = nullptr;\n"
+            f'\t\tif (std::strncmp(py2cpp_message, "{MEMORY_ERROR_PREFIX}", '
+            f"{len(MEMORY_ERROR_PREFIX)}) == 0) {{\n"
+            "\t\t\tPyErr_SetString(PyExc_MemoryError, "
+            f"py2cpp_message + {len(MEMORY_ERROR_PREFIX)});\n"
+            "\t\t} else {\n"
+            "\t\t\tPyErr_SetString(PyExc_ValueError, py2cpp_message);\n"
+            "\t\t}\n"
+            "\t\treturn NULL;\n"
+            "\t}\n"
+        )
+    if func_def.ret_cpp_type is None:
+        stream.write("\tPy_RETURN_NONE;\n}\n\n")
+    else:
+        stream.write(f"\treturn {_box(func_def.ret_cpp_type)};\n}}\n\n")
+    stream.write(
+        "static PyMethodDef py2cpp_methods[] = {\n"
+        f'\t{{"{name}", (PyCFunction)(void (*)(void)){wrapper}, '
+        "METH_FASTCALL, NULL},\n"
+        "\t{NULL, NULL, 0, NULL},\n"
+        "};\n\n"
+        "static struct PyModuleDef py2cpp_module = {\n"
+        f'\tPyModuleDef_HEAD_INIT, "{module_name}", NULL, -1, py2cpp_methods,\n'
+        "};\n\n"
+        f"PyMODINIT_FUNC PyInit_{module_name}(void) {{\n"
+        "\treturn PyModule_Create(&py2cpp_module);\n"
+        "}\n"
+    )
+
+
+def extension_filename(module_name: str) -> str:
+    """File name of an extension module for the running interpreter,
+    e.g. kernel.cpython-311-x86_64-linux-gnu.so"""
+    return module_name + sysconfig.get_config_var("EXT_SUFFIX")
+
+
+def build_extension(
+    func,
+    arg_types: List[Any] = None,
+    module_name: str = None,
+    build_dir: str = None,
+    cxxflags: List[str] = None,
+    stats: Stats = None,
+) -> str:
+    """Transpiles a function into a CPython extension module and compiles it.
+
+    Args:
+        func: A Python function
+        arg_types (List[Any], optional): Types of the positional arguments.
+            Defaults to the annotations of the function.
+        module_name (str, optional): Name of the module. Defaults to the name
+            of the function.
+        build_dir (str, optional): A directory to put the source and the
+            module. Defaults to a new temporary directory.
+        cxxflags (List[str], optional): Compiler flags. Defaults to DEFAULT_CXXFLAGS.
+        stats (Stats, optional): Records the wall time of each phase.
+
+    Returns:
+        str: A path to the built module, which load_extension() imports
+    """
+    # imported here since transpile builds on this module
+    from .transpile import CallGraph, _resolve_arg_types, parse_func, process_func_def
+
+    module_name = module_name or func.__name__
+    build_dir = build_dir or tempfile.mkdtemp(prefix="py2cpp_")
+    os.makedirs(build_dir, exist_ok=True)
+    arg_types = _resolve_arg_types(func, arg_types)
+    call_graph = CallGraph(stats=stats)
+    func_def = process_func_def(
+        parse_func(func, stats),
+        arg_types,
+        stats=stats,
+        resolve_call=call_graph.resolver(func),
+    )
+    src_path = os.path.join(build_dir, f"{module_name}.cpp")
+    with phase(stats, "emit", func_def.name):
+        with open(src_path, "w") as f:
+            write_extension_module(f, func_def, module_name)
+    cxxflags = DEFAULT_CXXFLAGS if cxxflags is None else cxxflags
+    cxxflags = cxxflags + [f"-I{sysconfig.get_paths()['include']}"]
+    if func_def.uses_openmp:
+        cxxflags = cxxflags + OPENMP_CXXFLAGS
+    lib_path = os.path.join(build_dir, extension_filename(module_name))
+    with phase(stats, "compile", func_def.name):
+        compile_shared(src_path, lib_path, cxxflags)
+    return lib_path
+
+
+def load_extension(path: str) -> ModuleType:
+    """Imports an extension module built by build_extension()."""
+    module_name = os.path.basename(path).split(".")[0]
+    spec = importlib.util.spec_from_file_location(module_name, path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
@@ -1,26 +1,63 @@
 from typing import Type
 
-from .type_system import CppType, type_py2cpp, type_typing2py
+from .type_system import (
+    CPP_NAMES,
+    ELEMENT_CPP_TYPES,
+    ELEMENT_TYPES,
+    NDARRAY_DTYPES,
+    type_py2cpp,
+    type_typing2py,
+)
+
+
+def len_arg_name(name: str) -> str:
+    """Name of the extra argument passing the length of an array"""
+    return f"{name}_len"
 
 
 class FuncArg:
-    def __init__(self, name: str, argtype: Type):
+    def __init__(self, name: str, argtype: Type, restrict: bool = False):
         self.name = name
         self.type = argtype
         self.py_type = type_typing2py(self.type)
         self.cpp_type = type_py2cpp(self.py_type)
+        # whether the array does not alias other arrays
+        self.restrict = restrict
+        # whether the length of the array is passed, always for an ndarray and
+        # for a list only when the function uses it
+        self.pass_len = self.is_ndarray
+        self.cpp_str = self._gen_arg_cpp_str()
+
+    @property
+    def is_ndarray(self) -> bool:
+        return self.py_type in NDARRAY_DTYPES
+
+    @property
+    def len_name(self) -> str:
+        """Name of the extra argument passing the length of the array"""
+        return len_arg_name(self.name)
+
+    def set_pass_len(self) -> None:
+        """Passes the length of the array argument and update cpp_str"""
+        if self.py_type not in ELEMENT_TYPES:
+            raise TypeError("Only arrays have a length.")
+        self.pass_len = True
+        self.cpp_str = self._gen_arg_cpp_str()
+
+    def set_restrict(self) -> None:
+        """Marks the array argument as __restrict__ and update cpp_str"""
+        if self.py_type not in ELEMENT_TYPES:
+            raise TypeError("Only arrays can be __restrict__.")
+        self.restrict = True
         self.cpp_str = self._gen_arg_cpp_str()
 
     def _gen_arg_cpp_str(self) -> str:
         """Generates C++ format of function arguments"""
-        if self.cpp_type == CppType.BOOL:
-            return f"bool {self.name}"
-        if self.cpp_type == CppType.INT:
-            return f"int {self.name}"
-        if self.cpp_type == CppType.DOUBLE:
-            return f"double {self.name}"
-        if self.cpp_type == CppType.ARRAY_INT:
-            return f"int *{self.name}"
-        if self.cpp_type == CppType.ARRAY_DOUBLE:
-            return f"double *{self.name}"
-        raise TypeError(f"C++ type {self.cpp_type} is not supported.")
+        if self.cpp_type in CPP_NAMES:
+            return f"{CPP_NAMES[self.cpp_type]} {self.name}"
+        if self.cpp_type not in ELEMENT_CPP_TYPES:
+            raise TypeError(f"C++ type {self.cpp_type} is not supported.")
+        elem_name = CPP_NAMES[ELEMENT_CPP_TYPES[self.cpp_type]]
+        qualifier = "__restrict__ " if self.restrict else ""
+        suffix = f", int64_t {self.len_name}" if self.pass_len else ""
+        return f"{elem_name} *{qualifier}{self.name}{suffix}"
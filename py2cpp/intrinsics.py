@@ -0,0 +1,274 @@
+import math
+from typing import Callable, Dict, List, Tuple
+
+from .expression import (
+    EXPR_CHILDREN,
+    ArrayLength,
+    ArrayMap,
+    BinOp,
+    Cast,
+    Constant,
+    Expression,
+    TypedExpression,
+    Variable,
+    elementwise,
+)
+from .ops import Operator, OpType
+from .runtime import MAX_FUNC, MIN_FUNC, SUM_FUNC
+from .type_system import (
+    CPP2TYPING,
+    ELEMENT_CPP_TYPES,
+    FLOATING_TYPES,
+    INTEGER_TYPES,
+    NUMERIC_TYPES,
+    PROMOTIONS,
+    CppType,
+)
+
+
+class IntrinsicCall(TypedExpression):
+    """Call of a C++ standard function, e.g. std::abs(x)"""
+
+    __slots__ = ("cpp_name", "args", "headers")
+
+    def __init__(
+        self,
+        cpp_name: str,
+        args: List[Expression],
+        cpp_type: CppType,
+        headers: Tuple[str, ...],
+    ) -> None:
+        super().__init__(CPP2TYPING[cpp_type])
+        self.cpp_name = cpp_name
+        self.args = args
+        # standard headers declaring the function
+        self.headers = headers
+
+
+class Reduction(TypedExpression):
+    """Reduction of the elements of arrays, e.g. sum(a * b)
+
+    It is lowered to a call of a helper of runtime.HELPERS, which computes
+    `element` for each index through a lambda.
+    """
+
+    __slots__ = ("func", "element", "lengths")
+
+    def __init__(self, func: str, element: Expression, arrays: List[Variable]):
+        super().__init__(CPP2TYPING[REDUCTION_TYPES[func](element.cpp_type)])
+        # name of the helper
+        self.func = func
+        self.element = element
+        # lengths of the arrays, which must be the same
+        self.lengths = [ArrayLength(array) for array in arrays]
+
+
+EXPR_CHILDREN[IntrinsicCall] = lambda e: e.args
+EXPR_CHILDREN[Reduction] = lambda e: [e.element, *e.lengths]
+
+
+def _sum_type(elem_type: CppType) -> CppType:
+    # integers and bools are summed in int64_t as numpy does
+    return elem_type if elem_type in FLOATING_TYPES else CppType.INT64
+
+
+# helper name -> element type -> result type
+REDUCTION_TYPES: Dict[str, Callable[[CppType], CppType]] = {
+    SUM_FUNC: _sum_type,
+    MIN_FUNC: lambda elem_type: elem_type,
+    MAX_FUNC: lambda elem_type: elem_type,
+}
+
+
+def _check_args(name: str, args: List[Expression], count: int) -> None:
+    if len(args) != count:
+        raise TypeError(f"{name}() takes exactly {count} argument(s).")
+
+
+def _is_array(expr: Expression) -> bool:
+    return expr.cpp_type in ELEMENT_CPP_TYPES
+
+
+def _reduce(func: str, array: Expression) -> Reduction:
+    # a plain array is an element-wise operation of itself
+    mapped: ArrayMap = elementwise(lambda operands: operands[0], [array])
+    return Reduction(func, mapped.element, mapped.arrays)
+
+
+def lower_len(args: List[Expression]) -> Expression:
+    _check_args("len", args, 1)
+    return ArrayLength(args[0])
+
+
+def lower_abs(args: List[Expression]) -> Expression:
+    _check_args("abs", args, 1)
+
+    def build(operands: List[Expression]) -> Expression:
+        operand = operands[0]
+        if operand.cpp_type not in NUMERIC_TYPES:
+            raise TypeError(f"abs() of {operand.cpp_type} is not supported.")
+        # int8_t and uint8_t are promoted to int
+        cpp_type = PROMOTIONS[(operand.cpp_type, operand.cpp_type)]
+        return IntrinsicCall("std::abs", [operand], cpp_type, ("cmath", "cstdlib"))
+
+    # element-wise on arrays
+    return elementwise(build, args)
+
+
+def lower_sum(args: List[Expression]) -> Expression:
+    _check_args("sum", args, 1)
+    if not _is_array(args[0]):
+        raise TypeError("sum() of a scalar is not supported.")
+    return _reduce(SUM_FUNC, args[0])
+
+
+def _lower_extremum(name: str, func: str, cpp_name: str):
+    def lower(args: List[Expression]) -> Expression:
+        if len(args) == 1:
+            if not _is_array(args[0]):
+                raise TypeError(f"{name}() of a scalar is not supported.")
+            return _reduce(func, args[0])
+        if len(args) == 0 or any(_is_array(arg) for arg in args):
+            raise TypeError(f"{name}() takes one array or multiple scalars.")
+        # std::min and std::max take the same types
+        cpp_type = args[0].cpp_type
+        for arg in args[1:]:
+            cpp_type = PROMOTIONS.get((cpp_type, arg.cpp_type))
+            if cpp_type is None:
+                raise TypeError(f"{name}() of non-numeric values is not supported.")
+        args = [
+            arg if arg.cpp_type == cpp_type else Cast(CPP2TYPING[cpp_type], arg)
+            for arg in args
+        ]
+        result = args[0]
+        for arg in args[1:]:
+            result = IntrinsicCall(cpp_name, [result, arg], cpp_type, ("algorithm",))
+        return result
+
+    return lower
+
+
+# name of a builtin function -> lowers the call with the processed arguments
+INTRINSICS: Dict[str, Callable[[List[Expression]], Expression]] = {
+    "len": lower_len,
+    "abs": lower_abs,
+    "sum": lower_sum,
+    "min": _lower_extremum("min", MIN_FUNC, "std::min"),
+    "max": _lower_extremum("max", MAX_FUNC, "std::max"),
+}
+
+
+def _math_call(name: str, cpp_name: str, arity: int, ret_type: CppType = None):
+    """Lowers math.<name>() to std::<cpp_name>() of <cmath>, element-wise on
+    arrays.
+
+    Integer arguments are converted to double. The result is float if all
+    the arguments are float, as the overloads of <cmath> compute in single
+    precision, otherwise double, or ret_type if given.
+    """
+
+    def lower(args: List[Expression]) -> Expression:
+        _check_args(f"math.{name}", args, arity)
+
+        def build(operands: List[Expression]) -> Expression:
+            for operand in operands:
+                if operand.cpp_type not in NUMERIC_TYPES:
+                    raise TypeError(
+                        f"math.{name}() of {operand.cpp_type} is not supported."
+                    )
+            if all(operand.cpp_type == CppType.FLOAT for operand in operands):
+                float_type = CppType.FLOAT
+            else:
+                float_type = CppType.DOUBLE
+            operands = [
+                (
+                    operand
+                    if operand.cpp_type == float_type
+                    else Cast(CPP2TYPING[float_type], operand)
+                )
+                for operand in operands
+            ]
+            cpp_name_std = f"std::{cpp_name}"
+            if ret_type in INTEGER_TYPES:
+                # the C++ functions return floating point values
+                call = IntrinsicCall(cpp_name_std, operands, float_type, ("cmath",))
+                return Cast(CPP2TYPING[ret_type], call)
+            return IntrinsicCall(
+                cpp_name_std, operands, ret_type or float_type, ("cmath",)
+            )
+
+        return elementwise(build, args)
+
+    return lower
+
+
+def _lower_math_log(args: List[Expression]) -> Expression:
+    # math.log(x, base) is log(x) / log(base)
+    if len(args) == 2:
+        x, base = (MATH_INTRINSICS["log"]([arg]) for arg in args)
+        return elementwise(
+            lambda operands: BinOp(operands[0], Operator(OpType.DIV), operands[1]),
+            [x, base],
+        )
+    return _math_call("log", "log", 1)(args)
+
+
+# function of the math module -> lowers the call with the processed arguments
+MATH_INTRINSICS: Dict[str, Callable[[List[Expression]], Expression]] = {
+    **{
+        name: _math_call(name, name, 1)
+        for name in (
+            "sqrt",
+            "cbrt",
+            "exp",
+            "exp2",
+            "expm1",
+            "log2",
+            "log10",
+            "log1p",
+            "sin",
+            "cos",
+            "tan",
+            "asin",
+            "acos",
+            "atan",
+            "sinh",
+            "cosh",
+            "tanh",
+            "asinh",
+            "acosh",
+            "atanh",
+            "fabs",
+            "erf",
+            "erfc",
+            "lgamma",
+        )
+    },
+    **{
+        name: _math_call(name, name, 2)
+        for name in ("pow", "atan2", "hypot", "copysign", "fmod")
+    },
+    "gamma": _math_call("gamma", "tgamma", 1),
+    "log": _lower_math_log,
+    # Python returns int
+    "floor": _math_call("floor", "floor", 1, CppType.INT),
+    "ceil": _math_call("ceil", "ceil", 1, CppType.INT),
+    "trunc": _math_call("trunc", "trunc", 1, CppType.INT),
+    "isnan": _math_call("isnan", "isnan", 1, CppType.BOOL),
+    "isinf": _math_call("isinf", "isinf", 1, CppType.BOOL),
+    "isfinite": _math_call("isfinite", "isfinite", 1, CppType.BOOL),
+}
+
+# constant of the math module -> builds its expression
+MATH_CONSTANTS: Dict[str, Callable[[], Expression]] = {
+    "pi": lambda: Constant(math.pi),
+    "e": lambda: Constant(math.e),
+    "tau": lambda: Constant(math.tau),
+    # inf and nan have no literals in C++
+    "inf": lambda: IntrinsicCall(
+        "std::numeric_limits<double>::infinity", [], CppType.DOUBLE, ("limits",)
+    ),
+    "nan": lambda: IntrinsicCall(
+        "std::numeric_limits<double>::quiet_NaN", [], CppType.DOUBLE, ("limits",)
+    ),
+}
@@ -0,0 +1,861 @@
+import asyncio
+import ctypes
+import functools
+import inspect
+import json
+import os
+import tempfile
+import threading
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import Any, Dict, List, TextIO, Tuple
+
+from .cache import DiskCache
+from .compiler import (
+    DEFAULT_CXXFLAGS,
+    FAST_MATH_CXXFLAGS,
+    NATIVE_CXXFLAGS,
+    OPENMP_CXXFLAGS,
+    compile_shared,
+    find_compiler,
+)
+from .executor import default_executor
+from .runtime import ERROR_VAR, FREE_FUNC, MEMORY_ERROR_PREFIX, TAKE_ERROR_FUNC
+from .stats import Stats, phase
+from .transpile import (
+    CallGraph,
+    FunctionDef,
+    annotated_arg_types,
+    get_source,
+    parse_func,
+    process_func_def,
+    reachable_funcs,
+)
+from .type_system import (
+    CPP_NAMES,
+    ELEMENT_CPP_TYPES,
+    NDARRAY_DTYPES,
+    NUMPY_SCALARS,
+    SCALAR_ANNOTATIONS,
+    SCALAR_CPP_TYPES,
+    CppType,
+    PyType,
+    type_of_value,
+)
+from .version import __version__
+
+# C++ scalar type -> ctypes type
+CTYPES_SCALAR_MAP = {
+    CppType.BOOL: ctypes.c_bool,
+    CppType.INT8: ctypes.c_int8,
+    CppType.UINT8: ctypes.c_uint8,
+    CppType.INT: ctypes.c_int,
+    CppType.INT64: ctypes.c_int64,
+    CppType.FLOAT: ctypes.c_float,
+    CppType.DOUBLE: ctypes.c_double,
+}
+# C++ array type -> ctypes element type
+CTYPES_ELEMENT_MAP = {
+    array: CTYPES_SCALAR_MAP[elem] for array, elem in ELEMENT_CPP_TYPES.items()
+}
+# C++ type -> ctypes type
+CTYPES_MAP = {
+    **CTYPES_SCALAR_MAP,
+    **{array: ctypes.POINTER(elem) for array, elem in CTYPES_ELEMENT_MAP.items()},
+}
+
+# C++ scalar type -> numpy dtype name
+NUMPY_DTYPES = {
+    SCALAR_CPP_TYPES[SCALAR_ANNOTATIONS[annotation]]: dtype
+    for dtype, annotation in NUMPY_SCALARS.items()
+}
+
+# file describing the built function, stored next to the shared object
+META_FILENAME = "meta.json"
+
+# exported to control the number of OpenMP threads from Python
+SET_NUM_THREADS_FUNC = "py2cpp_set_num_threads"
+
+# suffix of the exported entry point calling the function for rows of
+# columnar arguments
+BATCH_SUFFIX = "_batch"
+
+# directory next to a module holding its functions built by `py2cpp build`
+PREBUILT_DIRNAME = "__py2cpp__"
+
+
+def prebuilt_root(func) -> str:
+    """Returns the directory of the prebuilt functions of the module defining
+    func, or None when the source file is unknown."""
+    # the source of a function wrapped by e.g. functools.lru_cache
+    src_file = inspect.getsourcefile(inspect.unwrap(func))
+    if src_file is None:
+        return None
+    return os.path.join(os.path.dirname(src_file), PREBUILT_DIRNAME)
+
+
+def prebuilt_prefix(module_name: str) -> str:
+    """Returns the prefix of the directories of the prebuilt functions of a
+    module, e.g. "mypkg.kernels-".
+
+    The full name of the module is used, since a package and its submodule of
+    the same name share the directory. "-" is in neither module names nor
+    qualified names of functions, so prefixes of different modules never
+    match each other.
+    """
+    return f"{module_name}-"
+
+
+def has_batch_entry(func_def: FunctionDef) -> bool:
+    """Whether the function takes and returns only scalars, so that it can be
+    called for columns of arguments."""
+    return all(arg.cpp_type in CPP_NAMES for arg in func_def.args) and (
+        func_def.ret_cpp_type is None or func_def.ret_cpp_type in CPP_NAMES
+    )
+
+
+def write_batch_entry(stream: TextIO, func_def: FunctionDef) -> None:
+    """Writes the entry point calling the function for the rows in
+    [py2cpp_begin, py2cpp_end) of the columns, one column per argument.
+
+    It returns py2cpp_end, or the row at which the function raised.
+    """
+    params = ["int64_t py2cpp_begin", "int64_t py2cpp_end"] + [
+        f"const {CPP_NAMES[arg.cpp_type]} *{arg.name}" for arg in func_def.args
+    ]
+    args = ", ".join(f"{arg.name}[py2cpp_row]" for arg in func_def.args)
+    call = f"{func_def.name}({args})"
+    if func_def.ret_cpp_type is None:
+        stmt = f"{call};"
+    else:
+        params.append(f"{func_def.ret_type_str} *py2cpp_out")
+        stmt = f"py2cpp_out[py2cpp_row] = {call};"
+    stream.write(
+        f'\nextern "C" int64_t {func_def.name}{BATCH_SUFFIX}({", ".join(params)}) {{\n'
+        "\tfor (int64_t py2cpp_row = py2cpp_begin; py2cpp_row < py2cpp_end; "
+        "py2cpp_row++) {\n"
+        f"\t\t{stmt}\n"
+    )
+    if func_def.raises:
+        stream.write(
+            f"\t\tif ({ERROR_VAR} != nullptr) {{\n\t\t\treturn py2cpp_row;\n\t\t}}\n"
+        )
+    stream.write("\t}\n\treturn py2cpp_end;\n}\n")
+
+
+def write_translation_unit(stream: TextIO, func_def: FunctionDef) -> None:
+    """Writes a C++ translation unit whose function has C linkage."""
+    batch = has_batch_entry(func_def)
+    if batch:
+        # int64_t of the batch entry point
+        func_def.includes.add("cstdint")
+    func_def.write_includes(stream)
+    func_def.write_helpers(stream)
+    if func_def.returns_buffer:
+        # returned buffers are freed by the allocator of this library
+        stream.write(f'extern "C" void {FREE_FUNC}(void *p) {{ std::free(p); }}\n\n')
+    if func_def.raises:
+        stream.write(
+            f'extern "C" const char *{TAKE_ERROR_FUNC}() '
+            f"{{ const char *e = {ERROR_VAR}; {ERROR_VAR} = nullptr; return e; }}\n\n"
+        )
+    if func_def.uses_openmp:
+        stream.write("#include <omp.h>\n\n")
+        stream.write(
+            f'extern "C" void {SET_NUM_THREADS_FUNC}(int n) '
+            "{ omp_set_num_threads(n); }\n\n"
+        )
+    # a definition following an extern "C" declaration has C linkage as well
+    stream.write(f'extern "C" {func_def.prototype};\n\n')
+    func_def.write(stream, with_includes=False)
+    if batch:
+        write_batch_entry(stream, func_def)
+
+
+def ndarray_c_args(name: str, value, dtype: str) -> List[int]:
+    """Returns the data pointer and the length of an ndarray without copying it.
+
+    Raises:
+        TypeError: Raised when value is not an ndarray of dtype.
+        ValueError: Raised when value is not C-contiguous.
+    """
+    # the array interface exposes the buffer of the array as is
+    interface = getattr(value, "__array_interface__", None)
+    if interface is None or not hasattr(value, "dtype"):
+        raise TypeError(f"Argument {name} must be numpy.ndarray.")
+    if value.dtype.name != dtype:
+        raise TypeError(
+            f"Argument {name} must be an array of {dtype}, not {value.dtype.name}."
+        )
+    if not value.flags.c_contiguous:
+        raise ValueError(f"Argument {name} must be C-contiguous.")
+    return [interface["data"][0], value.size]
+
+
+def column_c_array(name: str, values, cpp_type: CppType) -> Tuple[Any, int]:
+    """Converts a column of arguments into a contiguous array of cpp_type.
+
+    An ndarray of the dtype is used without copying. Other sequences are
+    converted with numpy, or with ctypes without numpy.
+
+    Raises:
+        TypeError: Raised when the values cannot be converted without changing
+            their kind, e.g. floats to integers.
+
+    Returns:
+        Tuple[Any, int]: The array, which must be kept alive during the call,
+            and the address of its data
+    """
+    try:
+        import numpy as np
+    except ImportError:
+        array = (CTYPES_SCALAR_MAP[cpp_type] * len(values))(*values)
+        return array, ctypes.addressof(array)
+    dtype = np.dtype(NUMPY_DTYPES[cpp_type])
+    array = np.asarray(values)
+    if array.size > 0 and not np.can_cast(array.dtype, dtype, "same_kind"):
+        raise TypeError(
+            f"Column {name} must be of {dtype.name}, not {array.dtype.name}."
+        )
+    array = np.ascontiguousarray(array, dtype)
+    return array, array.ctypes.data
+
+
+def empty_column(length: int, cpp_type: CppType) -> Tuple[Any, int]:
+    """Allocates a column receiving the results, see column_c_array()."""
+    try:
+        import numpy as np
+    except ImportError:
+        array = (CTYPES_SCALAR_MAP[cpp_type] * length)()
+        return array, ctypes.addressof(array)
+    array = np.empty(length, NUMPY_DTYPES[cpp_type])
+    return array, array.ctypes.data
+
+
+class OwnedBuffer:
+    """An array returned by a compiled function, freed when no longer referenced.
+
+    numpy.asarray() wraps it without a copy through the array interface and
+    keeps it alive as the base of the ndarray.
+    """
+
+    def __init__(
+        self, lib: ctypes.CDLL, address: int, length: int, cpp_type: CppType
+    ) -> None:
+        import numpy as np
+
+        # keeps the shared object loaded while the buffer is alive
+        self._lib = lib
+        self.address = address
+        self.__array_interface__ = {
+            "data": (address, False),
+            "shape": (length,),
+            "typestr": np.dtype(NUMPY_DTYPES[cpp_type]).str,
+            "version": 3,
+        }
+
+    def __del__(self) -> None:
+        getattr(self._lib, FREE_FUNC)(ctypes.c_void_p(self.address))
+
+
+def native_error(message: str) -> Exception:
+    """Returns the exception of an error raised by the native code, a
+    MemoryError for a failed allocation and a ValueError otherwise."""
+    if message.startswith(MEMORY_ERROR_PREFIX):
+        return MemoryError(message[len(MEMORY_ERROR_PREFIX) :])
+    return ValueError(message)
+
+
+def wrap_buffer(lib: ctypes.CDLL, address: int, length: int, cpp_type: CppType):
+    """Returns a buffer allocated by `[x] * n` as an ndarray owning it, or as
+    a list without numpy.
+
+    Raises:
+        MemoryError: Raised when the allocation failed.
+    """
+    if address is None:
+        raise MemoryError("Allocation of the returned array failed.")
+    try:
+        import numpy as np
+    except ImportError:
+        values = list((CTYPES_SCALAR_MAP[cpp_type] * length).from_address(address))
+        getattr(lib, FREE_FUNC)(ctypes.c_void_p(address))
+        return values
+    return np.asarray(OwnedBuffer(lib, address, length, cpp_type))
+
+
+class JitFunction:
+    """A Python function replaced with its natively compiled counterpart.
+
+    The function is transpiled and compiled on the first call (or by calling
+    `compile()` explicitly) and is invoked through ctypes afterwards.
+    When `cache` is given, the built shared object is reused across processes
+    and the transpilation is skipped entirely on a cache hit.
+    A function built ahead of time by `py2cpp build` (see py2cpp.aot) is
+    loaded from the directory of its module instead, if its sources, types
+    and flags are unchanged.
+    When `stats` is given, the wall time of each phase of the build is recorded.
+    With `fast_math`, FAST_MATH_CXXFLAGS are added to the compiler flags, and
+    NATIVE_CXXFLAGS too unless the function is built ahead of time.
+    `submit()` and `run_async()` call it on `executor`, or on the default
+    executor of py2cpp.executor.
+    """
+
+    def __init__(
+        self,
+        func,
+        arg_types: List[Any],
+        cxxflags: List[str] = None,
+        build_dir: str = None,
+        cache: DiskCache = None,
+        simd: bool = False,
+        stats: Stats = None,
+        fast_math: bool = False,
+        executor: Executor = None,
+    ) -> None:
+        functools.update_wrapper(self, func)
+        self.py_func = func
+        self.arg_types = arg_types
+        self.executor = executor
+        self.simd = simd
+        self.stats = stats
+        self.fast_math = fast_math
+        self.cxxflags = DEFAULT_CXXFLAGS if cxxflags is None else cxxflags
+        if fast_math:
+            # a part of the cache key as the other flags
+            self.cxxflags = self.cxxflags + FAST_MATH_CXXFLAGS
+        self.build_dir = build_dir
+        self.cache = cache
+
+        self.name: str = None
+        self.arg_names: List[str] = None
+        self.arg_py_types: List[PyType] = None
+        self.arg_cpp_types: List[CppType] = None
+        # whether the length of each array argument is passed
+        self.arg_pass_lens: List[bool] = None
+        self.ret_cpp_type: CppType = None
+        # whether an array of `[x] * n` is returned
+        self.ret_buffer = False
+        self.cpp_src: str = None
+        self.lib_path: str = None
+        self._lib = None
+        self._native = None
+        self._set_num_threads = None
+        self._take_error = None
+        self._batch = None
+        self._lock = threading.Lock()
+
+    def compile(self) -> "JitFunction":
+        """Transpiles and compiles the function, then loads it in-process."""
+        with self._lock:
+            if self._native is not None:
+                return self
+            prebuilt_dir = self._find_prebuilt()
+            if prebuilt_dir is not None:
+                self._load(prebuilt_dir)
+            elif self.cache is None:
+                build_dir = self.build_dir or tempfile.mkdtemp(prefix="py2cpp_")
+                os.makedirs(build_dir, exist_ok=True)
+                self._build(build_dir)
+                self._load(build_dir)
+            else:
+                with self.cache.open(self._cache_key(), self._build) as entry_dir:
+                    self._load(entry_dir)
+        return self
+
+    def _sources(self) -> Tuple[str, List[str]]:
+        """Returns the sources of the function and of the functions it calls."""
+        with phase(self.stats, "getsource", self.py_func.__name__):
+            py_src = get_source(self.py_func)
+            # the called functions are compiled into the same library
+            callee_srcs = [
+                get_source(callee) for callee in reachable_funcs(self.py_func)
+            ]
+        return py_src, callee_srcs
+
+    def prebuilt_path(self) -> str:
+        """Returns the directory of the function built ahead of time, named by
+        its module, its name and a hash of everything the build depends on.
+
+        Unlike the cache key, the hash does not depend on the compiler, which
+        may be missing where the prebuilt function is loaded.
+        """
+        py_src, callee_srcs = self._sources()
+        key = DiskCache.make_key(
+            "prebuilt",
+            py_src,
+            callee_srcs,
+            self.arg_types,
+            __version__,
+            " ".join(self.cxxflags),
+            self.simd,
+        )
+        prefix = prebuilt_prefix(self.py_func.__module__)
+        return os.path.join(
+            prebuilt_root(self.py_func),
+            f"{prefix}{self.py_func.__qualname__}-{key[:16]}",
+        )
+
+    def _find_prebuilt(self) -> str:
+        """Returns the directory of the prebuilt function if it is up to date."""
+        root = prebuilt_root(self.py_func)
+        # no sources are hashed for modules without prebuilt functions
+        if root is None or not os.path.isdir(root):
+            return None
+        path = self.prebuilt_path()
+        return path if os.path.isdir(path) else None
+
+    def _cache_key(self) -> str:
+        py_src, callee_srcs = self._sources()
+        return self.cache.make_key(
+            "jit",
+            py_src,
+            callee_srcs,
+            self.arg_types,
+            __version__,
+            find_compiler(),
+            " ".join(self._build_cxxflags(portable=False)),
+            self.simd,
+        )
+
+    def _build_cxxflags(self, portable: bool) -> List[str]:
+        """Returns the compiler flags, for other CPUs than the host if `portable`."""
+        if self.fast_math and not portable:
+            return self.cxxflags + NATIVE_CXXFLAGS
+        return self.cxxflags
+
+    def _build(self, build_dir: str, portable: bool = False) -> None:
+        """Writes the C++ source, the shared object and its description.
+
+        Args:
+            build_dir (str): A directory to write the files into
+            portable (bool, optional): Builds for other CPUs than the host, as
+                builds ahead of time do. Defaults to False.
+        """
+        call_graph = CallGraph(simd=self.simd, stats=self.stats)
+        func_def = process_func_def(
+            parse_func(self.py_func, self.stats),
+            self.arg_types,
+            simd=self.simd,
+            stats=self.stats,
+            resolve_call=call_graph.resolver(self.py_func),
+        )
+        if func_def.ret_cpp_type in CTYPES_ELEMENT_MAP and not func_def.returns_buffer:
+            # the length is unknown except for arrays of [x] * n
+            raise TypeError(f"Returning {func_def.ret_cpp_type} is not supported.")
+
+        src_path = os.path.join(build_dir, f"{func_def.name}.cpp")
+        with phase(self.stats, "emit", func_def.name) as record:
+            with open(src_path, "w") as f:
+                write_translation_unit(f, func_def)
+            if record is not None:
+                record.output_bytes = os.path.getsize(src_path)
+        cxxflags = self._build_cxxflags(portable)
+        if func_def.uses_openmp:
+            cxxflags = cxxflags + OPENMP_CXXFLAGS
+        lib_path = os.path.join(build_dir, f"{func_def.name}.so")
+        with phase(self.stats, "compile", func_def.name) as record:
+            compile_shared(src_path, lib_path, cxxflags)
+            if record is not None:
+                record.output_bytes = os.path.getsize(lib_path)
+        meta = {
+            "name": func_def.name,
+            "openmp": func_def.uses_openmp,
+            "raises": func_def.raises,
+            "args": [
+                [arg.name, arg.py_type.name, arg.cpp_type.name, arg.pass_len]
+                for arg in func_def.args
+            ],
+            "ret_cpp_type": (
+                None if func_def.ret_cpp_type is None else func_def.ret_cpp_type.name
+            ),
+            "ret_buffer": func_def.returns_buffer,
+            "batch": has_batch_entry(func_def),
+        }
+        with open(os.path.join(build_dir, META_FILENAME), "w") as f:
+            json.dump(meta, f)
+
+    def _load(self, build_dir: str) -> None:
+        """Loads the shared object built by _build()."""
+        with phase(self.stats, "load", self.py_func.__name__):
+            self._load_lib(build_dir)
+
+    def _load_lib(self, build_dir: str) -> None:
+        with open(os.path.join(build_dir, META_FILENAME)) as f:
+            meta = json.load(f)
+        name = meta["name"]
+        with open(os.path.join(build_dir, f"{name}.cpp")) as f:
+            cpp_src = f.read()
+        lib_path = os.path.join(build_dir, f"{name}.so")
+
+        lib = ctypes.CDLL(lib_path)
+        native = getattr(lib, name)
+        arg_py_types = [PyType[py_type] for _, py_type, _, _ in meta["args"]]
+        arg_cpp_types = [CppType[cpp_type] for _, _, cpp_type, _ in meta["args"]]
+        arg_pass_lens = [pass_len for _, _, _, pass_len in meta["args"]]
+        ret_cpp_type = (
+            None if meta["ret_cpp_type"] is None else CppType[meta["ret_cpp_type"]]
+        )
+        argtypes = []
+        for py_type, cpp_type, pass_len in zip(
+            arg_py_types, arg_cpp_types, arg_pass_lens
+        ):
+            if py_type in NDARRAY_DTYPES:
+                # data pointer and length
+                argtypes += [ctypes.c_void_p, ctypes.c_int64]
+            else:
+                argtypes.append(CTYPES_MAP[cpp_type])
+                if pass_len:
+                    argtypes.append(ctypes.c_int64)
+        ret_buffer = meta["ret_buffer"]
+        if ret_buffer:
+            # receives the length of the returned buffer
+            argtypes.append(ctypes.POINTER(ctypes.c_int64))
+            native.restype = ctypes.c_void_p
+            free = getattr(lib, FREE_FUNC)
+            free.argtypes = [ctypes.c_void_p]
+            free.restype = None
+        else:
+            native.restype = None if ret_cpp_type is None else CTYPES_MAP[ret_cpp_type]
+        native.argtypes = argtypes
+        set_num_threads = None
+        if meta["openmp"]:
+            set_num_threads = getattr(lib, SET_NUM_THREADS_FUNC)
+            set_num_threads.argtypes = [ctypes.c_int]
+            set_num_threads.restype = None
+        take_error = None
+        if meta["raises"]:
+            take_error = getattr(lib, TAKE_ERROR_FUNC)
+            take_error.argtypes = []
+            take_error.restype = ctypes.c_char_p
+
+        batch = None
+        if meta["batch"]:
+            batch = getattr(lib, name + BATCH_SUFFIX)
+            # the rows, the columns and the results
+            batch.argtypes = [ctypes.c_int64, ctypes.c_int64] + [ctypes.c_void_p] * (
+                len(meta["args"]) + (ret_cpp_type is not None)
+            )
+            batch.restype = ctypes.c_int64
+
+        self.name = name
+        self.arg_names = [arg_name for arg_name, _, _, _ in meta["args"]]
+        self.arg_py_types = arg_py_types
+        self.arg_cpp_types = arg_cpp_types
+        self.arg_pass_lens = arg_pass_lens
+        self.ret_cpp_type = ret_cpp_type
+        self.ret_buffer = ret_buffer
+        self.cpp_src = cpp_src
+        self.lib_path = lib_path
+        self._lib = lib
+        self._native = native
+        self._set_num_threads = set_num_threads
+        self._take_error = take_error
+        self._batch = batch
+
+    def set_num_threads(self, num_threads: int) -> None:
+        """Sets the number of OpenMP threads used by prange() loops.
+
+        The setting applies to the calls from the current thread.
+        """
+        if self._native is None:
+            self.compile()
+        if self._set_num_threads is not None:
+            self._set_num_threads(num_threads)
+
+    def __call__(self, *args, num_threads: int = None):
+        if self._native is None:
+            self.compile()
+        if num_threads is not None:
+            self.set_num_threads(num_threads)
+        if len(args) != len(self.arg_names):
+            raise TypeError(
+                f"{self.name}() takes {len(self.arg_names)} arguments "
+                f"but {len(args)} were given."
+            )
+        c_args = []
+        # (python list, ctypes buffer) pairs to be written back after the call
+        write_backs = []
+        for name, py_type, cpp_type, pass_len, value in zip(
+            self.arg_names,
+            self.arg_py_types,
+            self.arg_cpp_types,
+            self.arg_pass_lens,
+            args,
+        ):
+            if py_type in NDARRAY_DTYPES:
+                c_args += ndarray_c_args(name, value, NDARRAY_DTYPES[py_type])
+            elif cpp_type in CTYPES_ELEMENT_MAP:
+                if not isinstance(value, list):
+                    raise TypeError(f"Argument {name} must be a list.")
+                buf = (CTYPES_ELEMENT_MAP[cpp_type] * len(value))(*value)
+                write_backs.append((value, buf))
+                c_args.append(buf)
+                if pass_len:
+                    c_args.append(len(value))
+            else:
+                c_args.append(value)
+
+        if self.ret_buffer:
+            ret_len = ctypes.c_int64()
+            c_args.append(ctypes.byref(ret_len))
+        ret = self._native(*c_args)
+        # reflects in-place modifications of arrays
+        for value, buf in write_backs:
+            value[:] = list(buf)
+        if self._take_error is not None:
+            error = self._take_error()
+            if error is not None:
+                raise native_error(error.decode())
+        if self.ret_buffer:
+            return wrap_buffer(
+                self._lib, ret, ret_len.value, ELEMENT_CPP_TYPES[self.ret_cpp_type]
+            )
+        return ret
+
+    def submit(self, *args, num_threads: int = None) -> Future:
+        """Calls the function on the executor and returns a Future of the result.
+
+        The arguments are converted on a thread of the executor, which then
+        runs the native code without holding the GIL.
+        """
+        executor = self.executor or default_executor()
+        return executor.submit(self, *args, num_threads=num_threads)
+
+    async def run_async(self, *args, num_threads: int = None):
+        """Calls the function on the executor without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(*args, num_threads=num_threads))
+
+    def batch(self, *columns, workers: int = 1):
+        """Calls the function for each row of columnar arguments at once.
+
+        The i-th call takes the i-th elements of the columns, one column per
+        argument, and all the calls run in one native call instead of one
+        ctypes call each. With workers, the rows are split into as many
+        chunks running on threads, in parallel as ctypes releases the GIL.
+
+        Args:
+            columns: A sequence or an ndarray per argument, of the same length
+            workers (int, optional): The number of threads. Defaults to 1.
+
+        Raises:
+            TypeError: Raised when the function takes or returns arrays.
+            ValueError: Raised when the columns differ in length, or a call
+                raised an error, with the first such row.
+
+        Returns:
+            The results as an ndarray (a list without numpy), or None when the
+            function returns nothing
+        """
+        if self._native is None:
+            self.compile()
+        if self._batch is None:
+            raise TypeError(f"{self.name}() takes or returns arrays.")
+        if len(columns) != len(self.arg_names) or not columns:
+            raise TypeError(
+                f"{self.name}() takes {len(self.arg_names)} columns "
+                f"but {len(columns)} were given."
+            )
+        if workers < 1:
+            raise ValueError("workers must be positive.")
+        length = len(columns[0])
+        if any(len(column) != length for column in columns):
+            raise ValueError("Columns must have the same length.")
+        # arrays are kept alive until the calls return
+        arrays = []
+        addresses = []
+        for name, cpp_type, column in zip(self.arg_names, self.arg_cpp_types, columns):
+            array, address = column_c_array(name, column, cpp_type)
+            arrays.append(array)
+            addresses.append(address)
+        out = None
+        if self.ret_cpp_type is not None:
+            out, address = empty_column(length, self.ret_cpp_type)
+            addresses.append(address)
+
+        def run(begin: int, end: int) -> Tuple[int, bytes]:
+            stop = self._batch(begin, end, *addresses)
+            # the error is local to the thread
+            return stop, None if stop == end else self._take_error()
+
+        chunk = -(-length // workers) if length > 0 else 1
+        bounds = [(b, min(b + chunk, length)) for b in range(0, length, chunk)]
+        if workers > 1 and len(bounds) > 1:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(lambda bound: run(*bound), bounds))
+        else:
+            results = [run(begin, end) for begin, end in bounds]
+        for stop, error in results:
+            if error is not None:
+                raise native_error(f"{error.decode()} (row {stop})")
+        if out is not None and not hasattr(out, "dtype"):
+            return list(out)
+        return out
+
+
+class Dispatcher:
+    """A Python function compiled once per distinct signature of its arguments.
+
+    Types of annotated arguments are taken from the annotations and the others
+    are inferred from the values of each call. Every new signature is
+    transpiled and compiled into its own JitFunction, which is kept in
+    `specializations` so that later calls with the same signature dispatch
+    to it directly.
+    """
+
+    def __init__(
+        self,
+        func,
+        cxxflags: List[str] = None,
+        build_dir: str = None,
+        cache: DiskCache = None,
+        simd: bool = False,
+        stats: Stats = None,
+        fast_math: bool = False,
+        executor: Executor = None,
+    ) -> None:
+        functools.update_wrapper(self, func)
+        self.py_func = func
+        self.cxxflags = cxxflags
+        self.build_dir = build_dir
+        self.cache = cache
+        self.simd = simd
+        self.stats = stats
+        self.fast_math = fast_math
+        self.executor = executor
+        # None for arguments whose type is inferred from the values
+        self.annotations: List[Any] = annotated_arg_types(func)
+        # signature -> compiled function
+        self.specializations: Dict[Tuple[Any, ...], JitFunction] = dict()
+        self._lock = threading.Lock()
+
+    def signature_of(self, args: Tuple[Any, ...]) -> Tuple[Any, ...]:
+        """Returns the types of the arguments of a call.
+
+        Raises:
+            TypeError: Raised when the number of the arguments does not match
+                or the type of an argument cannot be inferred.
+        """
+        if len(args) != len(self.annotations):
+            raise TypeError(
+                f"{self.__name__}() takes {len(self.annotations)} arguments "
+                f"but {len(args)} were given."
+            )
+        return tuple(
+            type_of_value(value) if annotation is None else annotation
+            for annotation, value in zip(self.annotations, args)
+        )
+
+    def specialize(self, arg_types: List[Any]) -> JitFunction:
+        """Returns the specialization for the types, creating it if needed.
+
+        The specialization is compiled lazily on its first call.
+        """
+        signature = tuple(arg_types)
+        jit_func = self.specializations.get(signature)
+        if jit_func is not None:
+            return jit_func
+        with self._lock:
+            if signature not in self.specializations:
+                build_dir = None
+                if self.build_dir is not None:
+                    # sources of the specializations have the same file name
+                    build_dir = os.path.join(
+                        self.build_dir, str(len(self.specializations))
+                    )
+                self.specializations[signature] = JitFunction(
+                    self.py_func,
+                    list(signature),
+                    self.cxxflags,
+                    build_dir,
+                    self.cache,
+                    self.simd,
+                    self.stats,
+                    self.fast_math,
+                    self.executor,
+                )
+            return self.specializations[signature]
+
+    def __call__(self, *args, num_threads: int = None):
+        jit_func = self.specialize(self.signature_of(args))
+        return jit_func(*args, num_threads=num_threads)
+
+    def submit(self, *args, num_threads: int = None) -> Future:
+        """Calls the function on the executor, see JitFunction.submit()."""
+        executor = self.executor or default_executor()
+        return executor.submit(self, *args, num_threads=num_threads)
+
+    async def run_async(self, *args, num_threads: int = None):
+        """Calls the function on the executor without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(*args, num_threads=num_threads))
+
+    def batch(self, *columns, workers: int = 1):
+        """Calls the function for each row of columnar arguments at once,
+        see JitFunction.batch(). The signature is that of the first row."""
+        first_row = tuple(column[0] if len(column) else None for column in columns)
+        jit_func = self.specialize(self.signature_of(first_row))
+        return jit_func.batch(*columns, workers=workers)
+
+
+def jit(
+    arg_types: List[Any] = None,
+    cxxflags: List[str] = None,
+    build_dir: str = None,
+    cache: bool or DiskCache = False,
+    simd: bool = False,
+    stats: Stats = None,
+    fast_math: bool = False,
+    executor: Executor = None,
+):
+    """Decorator that replaces a Python function with its compiled C++ version.
+
+    Without arg_types, the function is specialized for each signature of
+    its calls, see Dispatcher. `@jit` can be used without parentheses then.
+
+    Args:
+        arg_types (List[Any], optional): Types of the positional arguments.
+            Defaults to the annotations and the types of the passed values.
+        cxxflags (List[str], optional): Compiler flags. Defaults to DEFAULT_CXXFLAGS.
+        build_dir (str, optional): A directory to put the generated source and
+            shared object. Defaults to a new temporary directory.
+        cache (bool or DiskCache, optional): A persistent cache of built shared
+            objects. True uses the default DiskCache. Defaults to False.
+        simd (bool, optional): Whether to add SIMD hints to elementwise loops.
+            Array arguments of those loops must not alias. Defaults to False.
+        stats (Stats, optional): Records the wall time of each phase of builds.
+        fast_math (bool, optional): Whether to compile with -ffast-math and
+            -march=native. Floating point math may be reassociated and NaN and
+            infinity are assumed not to occur. Defaults to False.
+        executor (Executor, optional): Runs submit() and run_async().
+            Defaults to py2cpp.executor.default_executor().
+
+    Returns:
+        A decorator that returns a JitFunction, or a Dispatcher without arg_types
+    """
+    if callable(arg_types):
+        # used as @jit, or called as jit(func, ...)
+        return jit(None, cxxflags, build_dir, cache, simd, stats, fast_math, executor)(
+            arg_types
+        )
+    if cache is True:
+        cache = DiskCache()
+    elif cache is False:
+        cache = None
+
+    def decorator(func) -> JitFunction or Dispatcher:
+        if arg_types is None:
+            return Dispatcher(
+                func, cxxflags, build_dir, cache, simd, stats, fast_math, executor
+            )
+        return JitFunction(
+            func,
+            arg_types,
+            cxxflags,
+            build_dir,
+            cache,
+            simd,
+            stats,
+            fast_math,
+            executor,
+        )
+
+    return decorator
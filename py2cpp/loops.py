@@ -0,0 +1,287 @@
+from typing import Dict, List, Set
+
+from .expression import (
+    BinOp,
+    Constant,
+    Expression,
+    FunctionCall,
+    Subscript,
+    VarCtxt,
+    Variable,
+    iter_children,
+)
+from .funcarg import FuncArg
+from .ops import OpType
+from .statement import Assign, AugAssign, BlockStatement, ForRangeStmt, Statement
+
+# AugAssign operator -> OpenMP reduction identifier
+REDUCTION_OPS: Dict[OpType, str] = {
+    OpType.ADD: "+",
+    # partial results of -= are combined by addition
+    OpType.SUB: "+",
+    OpType.MULT: "*",
+}
+
+
+class LoopInfo:
+    """Result of analyzing the body of a for loop.
+
+    Attributes:
+        elementwise (bool): Whether iterations are independent except for
+            the reductions, i.e. arrays are only accessed at the loop variable.
+        reductions (Dict[str, str]): Variable id -> OpenMP reduction identifier
+        arrays (Set[str]): Ids of the arrays accessed in the loop
+    """
+
+    def __init__(self) -> None:
+        self.elementwise = True
+        self.reductions: Dict[str, str] = dict()
+        self.arrays: Set[str] = set()
+
+
+def analyze_loop(stmt: ForRangeStmt) -> LoopInfo:
+    """Analyzes whether the iterations of a loop can run in any order.
+
+    Args:
+        stmt (ForRangeStmt): A loop to be analyzed
+
+    Returns:
+        LoopInfo: The result of the analysis
+    """
+    info = LoopInfo()
+    var_id = stmt.target.id
+    # variables defined in the body are private to each iteration
+    local_ids: Set[str] = set()
+    # variables read in the body
+    read_ids: Set[str] = set()
+
+    def check_expr(expr: Expression) -> bool:
+        if isinstance(expr, FunctionCall):
+            return False
+        if isinstance(expr, Subscript):
+            if not (
+                isinstance(expr.value, Variable)
+                and isinstance(expr.slice, Variable)
+                and expr.slice.id == var_id
+            ):
+                return False
+            info.arrays.add(expr.value.id)
+            return True
+        if isinstance(expr, Variable):
+            read_ids.add(expr.id)
+            return True
+        return all(check_expr(child) for child in iter_children(expr))
+
+    def check_target(target: Expression) -> bool:
+        if isinstance(target, Subscript):
+            return check_expr(target)
+        if isinstance(target, Variable):
+            if target.ctx == VarCtxt.NEW:
+                local_ids.add(target.id)
+                return True
+            return target.id in local_ids
+        return False
+
+    for child_stmt in stmt.body:
+        if child_stmt is stmt.last:
+            # lastprivate
+            continue
+        if isinstance(child_stmt, Assign):
+            if not check_expr(child_stmt.value):
+                info.elementwise = False
+            if not all(check_target(target) for target in child_stmt.targets):
+                info.elementwise = False
+        elif isinstance(child_stmt, AugAssign):
+            if not check_expr(child_stmt.value):
+                info.elementwise = False
+            target = child_stmt.target
+            if (
+                isinstance(target, Variable)
+                and target.id not in local_ids
+                and child_stmt.op.op_type in REDUCTION_OPS
+            ):
+                op = REDUCTION_OPS[child_stmt.op.op_type]
+                if info.reductions.setdefault(target.id, op) != op:
+                    # mixed reduction operators
+                    info.elementwise = False
+            elif not check_target(target):
+                info.elementwise = False
+        else:
+            # control flow, calls and returns in the body
+            info.elementwise = False
+        if not info.elementwise:
+            return info
+
+    # reduction variables must not be read except for their own update
+    if read_ids & set(info.reductions):
+        info.elementwise = False
+    return info
+
+
+def _reads(expr: Expression, var_id: str) -> bool:
+    """Checks whether an expression reads a variable."""
+    if isinstance(expr, Variable):
+        return expr.id == var_id
+    return any(_reads(child, var_id) for child in iter_children(expr))
+
+
+def _reduction_of_assign(stmt: Assign) -> str:
+    """Returns the id of the variable accumulated by `s = s <op> x` (or
+    `s = x <op> s` for + and *), or None for other assignments."""
+    if len(stmt.targets) != 1 or not isinstance(stmt.targets[0], Variable):
+        return None
+    var_id = stmt.targets[0].id
+    value = stmt.value
+    if not isinstance(value, BinOp) or value.op.op_type not in REDUCTION_OPS:
+        return None
+
+    def is_target(expr: Expression) -> bool:
+        return isinstance(expr, Variable) and expr.id == var_id
+
+    if is_target(value.left) and not _reads(value.right, var_id):
+        return var_id
+    # x - s is not an accumulation
+    if (
+        value.op.op_type != OpType.SUB
+        and is_target(value.right)
+        and not _reads(value.left, var_id)
+    ):
+        return var_id
+    return None
+
+
+def find_reductions(block: List[Statement], last: Statement = None) -> Dict[str, str]:
+    """Finds scalar accumulations in the body of a parallel loop to be reduced
+    across threads.
+
+    Variables defined in the body are private and are not reductions. The
+    other variables are shared by the threads, so they may only be updated
+    by `+=`, `-=` and `*=`, or by `s = s + x` and the like.
+
+    Args:
+        block (List[Statement]): The body of a loop
+        last (Statement, optional): The assignment of the loop variable,
+            which is lastprivate. Defaults to None.
+
+    Returns:
+        Dict[str, str]: Variable id -> OpenMP reduction identifier
+
+    Raises:
+        TypeError: Raised when a shared variable is written otherwise, or
+            reduced with different operators.
+    """
+    local_ids: Set[str] = set()
+    reductions: Dict[str, str] = dict()
+
+    def reduce(var_id: str, op_type: OpType) -> None:
+        op = REDUCTION_OPS[op_type]
+        if reductions.setdefault(var_id, op) != op:
+            raise TypeError(f"Variable {var_id} is reduced with different operators.")
+
+    def check_shared_write(var_id: str) -> None:
+        if var_id not in local_ids:
+            raise TypeError(
+                f"Variable {var_id} is shared by the threads of prange() and "
+                f"can only be accumulated, e.g. by {var_id} += x "
+                f"or {var_id} = {var_id} + x."
+            )
+
+    def walk(block: List[Statement]) -> None:
+        for stmt in block:
+            if stmt is last:
+                continue
+            if isinstance(stmt, Assign):
+                reduced_id = _reduction_of_assign(stmt)
+                if reduced_id is not None and reduced_id not in local_ids:
+                    reduce(reduced_id, stmt.value.op.op_type)
+                    continue
+                for target in stmt.targets:
+                    if isinstance(target, Variable):
+                        if target.ctx == VarCtxt.NEW:
+                            local_ids.add(target.id)
+                        else:
+                            check_shared_write(target.id)
+            elif isinstance(stmt, AugAssign):
+                target = stmt.target
+                if not isinstance(target, Variable):
+                    continue
+                if target.id not in local_ids and stmt.op.op_type in REDUCTION_OPS:
+                    reduce(target.id, stmt.op.op_type)
+                else:
+                    check_shared_write(target.id)
+            elif isinstance(stmt, ForRangeStmt):
+                local_ids.add(stmt.target.id)
+                walk(stmt.body)
+            elif isinstance(stmt, BlockStatement):
+                walk(stmt.body)
+
+    walk(block)
+    return reductions
+
+
+def _reduction_clauses(reductions: Dict[str, str]) -> str:
+    """e.g. " reduction(+:s,t) reduction(*:p)" """
+    var_ids_by_op: Dict[str, List[str]] = dict()
+    for var_id, op in reductions.items():
+        var_ids_by_op.setdefault(op, []).append(var_id)
+    return "".join(
+        f" reduction({op}:{','.join(var_ids)})" for op, var_ids in var_ids_by_op.items()
+    )
+
+
+def _lastprivate_clause(stmt: ForRangeStmt) -> str:
+    """e.g. " lastprivate(i)" for the variable taking the value of the last
+    iteration, see bind_loop_variables()"""
+    if stmt.last is None:
+        return ""
+    return f" lastprivate({stmt.last.targets[0].id})"
+
+
+def annotate_loops(
+    block: List[Statement], func_args: List[FuncArg], simd: bool = False
+) -> None:
+    """Adds OpenMP pragmas to the loops in a block.
+
+    Loops over prange() get `#pragma omp parallel for` with reduction clauses.
+    With simd, elementwise loops get `#pragma omp simd` (or `parallel for simd`)
+    and array arguments accessed in those loops are marked as __restrict__,
+    which promises that they do not alias each other.
+
+    Args:
+        block (List[Statement]): Statements to be processed in place
+        func_args (List[FuncArg]): Arguments of the function
+        simd (bool, optional): Whether to add SIMD hints. Defaults to False.
+    """
+    args = {arg.name: arg for arg in func_args}
+    for stmt in block:
+        if isinstance(stmt, ForRangeStmt):
+            info = None
+            # OpenMP requires the direction of the loop to be known
+            if simd and isinstance(stmt.step, Constant):
+                info = analyze_loop(stmt)
+            vectorize = info is not None and info.elementwise
+            if stmt.parallel:
+                stmt.pragma = "omp parallel for"
+                if vectorize:
+                    stmt.pragma += " simd"
+                stmt.pragma += _reduction_clauses(find_reductions(stmt.body, stmt.last))
+                stmt.pragma += _lastprivate_clause(stmt)
+            elif vectorize:
+                stmt.pragma = "omp simd" + _reduction_clauses(info.reductions)
+                stmt.pragma += _lastprivate_clause(stmt)
+            if vectorize:
+                for array_id in info.arrays:
+                    if array_id in args and not args[array_id].restrict:
+                        args[array_id].set_restrict()
+                # nothing to do in an elementwise body
+                continue
+        if isinstance(stmt, BlockStatement):
+            annotate_loops(stmt.body, func_args, simd)
+
+
+def prange(*args) -> range:
+    """Marks a for loop to be parallelized with OpenMP.
+
+    It behaves as range() when the function runs in Python.
+    """
+    return range(*args)
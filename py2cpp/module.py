@@ -0,0 +1,288 @@
+import ast
+import inspect
+import io
+import os
+from concurrent.futures import ProcessPoolExecutor
+from types import ModuleType
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+from .expression import Expression
+from .transpile import FunctionDef, process_func_def
+from .type_system import PROMOTIONS
+
+
+class TranspiledModule:
+    """Functions of a Python module transpiled into C++.
+
+    Functions which failed to be transpiled are recorded in `errors` and
+    do not abort the others.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        # function name -> C++ source / prototype, in the order of definition
+        self.sources: Dict[str, str] = dict()
+        self.prototypes: Dict[str, str] = dict()
+        # standard headers required by the functions
+        self.includes: Set[str] = set()
+        # helper name -> C++ source, defined before the functions
+        self.helpers: Dict[str, str] = dict()
+        # function name -> raised exception
+        self.errors: Dict[str, Exception] = dict()
+
+    @property
+    def forward_decls(self) -> str:
+        includes = "".join(f"#include <{header}>\n" for header in sorted(self.includes))
+        if includes:
+            includes += "\n"
+        helpers = "".join(f"{helper_src}\n" for helper_src in self.helpers.values())
+        return (
+            includes
+            + helpers
+            + "".join(f"{prototype};\n" for prototype in self.prototypes.values())
+        )
+
+    @property
+    def cpp_str(self) -> str:
+        """A single translation unit containing all the transpiled functions."""
+        return self.forward_decls + "\n" + "\n".join(self.sources.values())
+
+    def write(self, path: str) -> str:
+        """Writes all the functions into one translation unit."""
+        with open(path, "w") as f:
+            f.write(self.cpp_str)
+        return path
+
+    def write_split(self, out_dir: str) -> List[str]:
+        """Writes one translation unit per function into the directory.
+
+        Every file starts with the forward declarations of all the functions
+        so that they can call each other.
+        """
+        os.makedirs(out_dir, exist_ok=True)
+        paths = []
+        for func_name, cpp_src in self.sources.items():
+            path = os.path.join(out_dir, f"{func_name}.cpp")
+            with open(path, "w") as f:
+                f.write(self.forward_decls + "\n" + cpp_src)
+            paths.append(path)
+        return paths
+
+
+def read_source(module_or_path: ModuleType or str) -> str:
+    """Returns the source of a module object or of a path to a Python file."""
+    if isinstance(module_or_path, ModuleType):
+        return inspect.getsource(module_or_path)
+    with open(module_or_path) as f:
+        return f.read()
+
+
+def parse_func_defs(py_src: str) -> List[ast.FunctionDef]:
+    """Parses the top-level function definitions of the source of a module,
+    in the order of definition."""
+    tree = ast.parse(py_src)
+    return [stmt for stmt in tree.body if isinstance(stmt, ast.FunctionDef)]
+
+
+def find_func_defs(module_or_path: ModuleType or str) -> List[ast.FunctionDef]:
+    """Finds the top-level function definitions in a module.
+
+    Args:
+        module_or_path (ModuleType or str): A module object or a path to a Python file
+
+    Returns:
+        List[ast.FunctionDef]: Function definitions in the order of definition
+    """
+    return parse_func_defs(read_source(module_or_path))
+
+
+class ModuleCallGraph:
+    """Functions of a module calling each other.
+
+    A call of a function of the module is typed by the function transpiled
+    for its signature. Unlike CallGraph, the called function is not written
+    with the caller, since every function is defined once in the translation
+    unit of the module and declared before all of them.
+    """
+
+    def __init__(
+        self, func_defs: Dict[str, ast.FunctionDef], signatures: Dict[str, List[Any]]
+    ) -> None:
+        self.func_defs = func_defs
+        self.signatures = signatures
+        # function name -> FunctionDef, or None while processed
+        self.processed: Dict[str, FunctionDef] = dict()
+
+    def resolver(self, caller_name: str) -> Callable:
+        """Returns resolve_call of process_func_def() for a function of the module."""
+
+        def resolve_call(func_id: str, func_args: List[Expression]) -> FunctionDef:
+            if func_id == caller_name or func_id not in self.func_defs:
+                # recursion is typed by the caller itself
+                return None
+            callee = self.process(func_id)
+            self._check_args(callee, func_args)
+            return callee
+
+        return resolve_call
+
+    def process(self, func_name: str) -> FunctionDef:
+        """Transpiles a function of the module once for its signature.
+
+        Raises:
+            TypeError: Raised when the functions call each other.
+        """
+        if func_name in self.processed:
+            if self.processed[func_name] is None:
+                raise TypeError(
+                    f"Mutually recursive function {func_name} is not supported."
+                )
+            return self.processed[func_name]
+        self.processed[func_name] = None
+        try:
+            func_def = process_func_def(
+                self.func_defs[func_name],
+                self.signatures[func_name],
+                resolve_call=self.resolver(func_name),
+            )
+        except BaseException:
+            del self.processed[func_name]
+            raise
+        self.processed[func_name] = func_def
+        return func_def
+
+    @staticmethod
+    def _check_args(callee: FunctionDef, func_args: List[Expression]) -> None:
+        """Checks that the arguments of a call convert to the signature of the
+        callee without narrowing.
+
+        Raises:
+            TypeError: Raised when the number or a type of the arguments differs.
+        """
+        if len(func_args) != len(callee.args):
+            raise TypeError(
+                f"{callee.name}() takes {len(callee.args)} argument(s) "
+                f"but {len(func_args)} were given."
+            )
+        for value, arg in zip(func_args, callee.args):
+            promoted = PROMOTIONS.get((value.cpp_type, arg.cpp_type))
+            if value.cpp_type != arg.cpp_type and promoted != arg.cpp_type:
+                raise TypeError(
+                    f"Argument {arg.name} of {callee.name}() is {arg.cpp_type}, "
+                    f"got {value.cpp_type}."
+                )
+
+
+def _transpile_func_def(
+    call_graph: ModuleCallGraph, func_name: str
+) -> Tuple[str, str, Set[str], Dict[str, str]]:
+    """Transpiles a function of a module and returns its source, prototype,
+    required headers and helpers.
+
+    The callees are transpiled once per call graph, and reused by the
+    functions calling them and by their own transpilation.
+    """
+    processed = call_graph.process(func_name)
+    buf = io.StringIO()
+    # the called functions of the module are defined separately
+    processed.write_definition(buf)
+    return (
+        buf.getvalue(),
+        processed.prototype,
+        processed.includes,
+        processed.helpers,
+    )
+
+
+# call graph of the module in a worker process, set by _init_worker()
+_worker_call_graph: ModuleCallGraph = None
+
+
+def _init_worker(py_src: str, signatures: Dict[str, List[Any]]) -> None:
+    """Parses the module once per worker process."""
+    global _worker_call_graph
+    func_defs = {
+        func_def.name: func_def
+        for func_def in parse_func_defs(py_src)
+        if func_def.name in signatures
+    }
+    _worker_call_graph = ModuleCallGraph(func_defs, signatures)
+
+
+def _transpile_in_worker(func_name: str) -> Tuple[str, str, Set[str], Dict[str, str]]:
+    """Runs _transpile_func_def() in a worker process, so only the name of the
+    function is sent and only picklable values are returned."""
+    return _transpile_func_def(_worker_call_graph, func_name)
+
+
+def transpile_module(
+    module_or_path: ModuleType or str,
+    signatures: Dict[str, List[Any]],
+    workers: int = None,
+) -> TranspiledModule:
+    """Transpiles the functions of a module in parallel.
+
+    Args:
+        module_or_path (ModuleType or str): A module object or a path to a Python file
+        signatures (Dict[str, List[Any]]): Function name -> types of its arguments.
+            Only the functions found here are transpiled.
+        workers (int, optional): The number of worker processes.
+            Defaults to the number of CPUs. 1 transpiles in this process.
+
+    Returns:
+        TranspiledModule: Transpiled functions and per-function errors
+    """
+    if isinstance(module_or_path, ModuleType):
+        name = module_or_path.__name__
+    else:
+        name = os.path.splitext(os.path.basename(module_or_path))[0]
+    result = TranspiledModule(name)
+
+    py_src = read_source(module_or_path)
+    func_defs = [
+        func_def for func_def in parse_func_defs(py_src) if func_def.name in signatures
+    ]
+    for func_name in signatures:
+        if func_name not in {func_def.name for func_def in func_defs}:
+            result.errors[func_name] = ValueError(
+                f"Function {func_name} is not found in {name}."
+            )
+
+    outputs: Dict[str, Tuple[str, str, Set[str], Dict[str, str]]] = dict()
+    if workers == 1:
+        # the functions of the module which may be called by each other
+        call_graph = ModuleCallGraph(
+            {func_def.name: func_def for func_def in func_defs}, signatures
+        )
+        for func_def in func_defs:
+            try:
+                outputs[func_def.name] = _transpile_func_def(call_graph, func_def.name)
+            except Exception as e:
+                result.errors[func_def.name] = e
+    else:
+        # each worker parses the source once instead of receiving the
+        # definitions with every function
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_worker,
+            initargs=(py_src, signatures),
+        ) as executor:
+            futures = {
+                func_def.name: executor.submit(_transpile_in_worker, func_def.name)
+                for func_def in func_defs
+            }
+            for func_name, future in futures.items():
+                try:
+                    outputs[func_name] = future.result()
+                except Exception as e:
+                    result.errors[func_name] = e
+
+    # keeps the order of definition
+    for func_def in func_defs:
+        if func_def.name in outputs:
+            cpp_src, prototype, includes, helpers = outputs[func_def.name]
+            result.sources[func_def.name] = cpp_src
+            result.prototypes[func_def.name] = prototype
+            result.includes |= includes
+            result.helpers.update(helpers)
+    return result
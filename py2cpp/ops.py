@@ -1,5 +1,6 @@
 import ast
 from enum import Enum
+from typing import Dict
 
 
 class OpType(Enum):
@@ -26,51 +27,71 @@ class OpType(Enum):
     # Unary Operators
     UADD = 15
     USUB = 16
+    # FLOORDIV and MOD lowered by the range analysis, see ranges.py
+    TRUNCDIV = 17
+    TRUNCMOD = 18
+    RSHIFT = 19
+    BITAND = 20
+
+
+# operator type -> C++ operator
+CPP_OPERATORS: Dict[OpType, str] = {
+    OpType.ADD: "+",
+    OpType.SUB: "-",
+    OpType.MULT: "*",
+    OpType.DIV: "/",
+    OpType.FLOORDIV: "/",
+    OpType.MOD: "%",
+    OpType.EQ: "==",
+    OpType.NOTEQ: "!=",
+    OpType.LT: "<",
+    OpType.LTEQ: "<=",
+    OpType.GT: ">",
+    OpType.GTEQ: ">=",
+    OpType.NOT: "!",
+    OpType.AND: "&&",
+    OpType.OR: "||",
+    OpType.UADD: "+",
+    OpType.USUB: "-",
+    OpType.TRUNCDIV: "/",
+    OpType.TRUNCMOD: "%",
+    OpType.RSHIFT: ">>",
+    OpType.BITAND: "&",
+}
+
+# AST operator class -> operator type
+AST_OPERATORS: Dict[type, OpType] = {
+    ast.Add: OpType.ADD,
+    ast.Sub: OpType.SUB,
+    ast.Mult: OpType.MULT,
+    ast.Div: OpType.DIV,
+    ast.FloorDiv: OpType.FLOORDIV,
+    ast.Mod: OpType.MOD,
+    ast.Eq: OpType.EQ,
+    ast.NotEq: OpType.NOTEQ,
+    ast.Lt: OpType.LT,
+    ast.LtE: OpType.LTEQ,
+    ast.Gt: OpType.GT,
+    ast.GtE: OpType.GTEQ,
+    ast.Not: OpType.NOT,
+    ast.And: OpType.AND,
+    ast.Or: OpType.OR,
+    ast.UAdd: OpType.UADD,
+    ast.USub: OpType.USUB,
+}
 
 
 class Operator:
-    def __init__(self, op_type: OpType) -> None:
-        self.op_type = op_type
-        self.cpp_str = self._generate_cpp_str()
+    __slots__ = ("op_type", "cpp_str")
 
-    def _generate_cpp_str(self) -> str:
-        if self.op_type is None:
+    def __init__(self, op_type: OpType) -> None:
+        if op_type is None:
             raise ValueError("op_type is not set.")
-        if self.op_type == OpType.ADD:
-            return "+"
-        if self.op_type == OpType.SUB:
-            return "-"
-        if self.op_type == OpType.MULT:
-            return "*"
-        if self.op_type == OpType.DIV:
-            return "/"
-        if self.op_type == OpType.FLOORDIV:
-            return "/"
-        if self.op_type == OpType.MOD:
-            return "%"
-        if self.op_type == OpType.EQ:
-            return "=="
-        if self.op_type == OpType.NOTEQ:
-            return "!="
-        if self.op_type == OpType.LT:
-            return "<"
-        if self.op_type == OpType.LTEQ:
-            return "<="
-        if self.op_type == OpType.GT:
-            return ">"
-        if self.op_type == OpType.GTEQ:
-            return ">="
-        if self.op_type == OpType.NOT:
-            return "!"
-        if self.op_type == OpType.AND:
-            return "&&"
-        if self.op_type == OpType.OR:
-            return "||"
-        if self.op_type == OpType.UADD:
-            return "+"
-        if self.op_type == OpType.USUB:
-            return "-"
-        raise TypeError(f"Operator {self.op_type} is not supported")
+        cpp_str = CPP_OPERATORS.get(op_type)
+        if cpp_str is None:
+            raise TypeError(f"Operator {op_type} is not supported")
+        self.op_type = op_type
+        self.cpp_str = cpp_str
 
 
 def process_operator(op: ast.operator) -> Operator:
@@ -85,38 +106,7 @@ def process_operator(op: ast.operator) -> Operator:
     Returns:
         Operator: A constructed Operator object
     """
-    if isinstance(op, ast.Add):
-        return Operator(OpType.ADD)
-    if isinstance(op, ast.Sub):
-        return Operator(OpType.SUB)
-    if isinstance(op, ast.Mult):
-        return Operator(OpType.MULT)
-    if isinstance(op, ast.Div):
-        return Operator(OpType.DIV)
-    if isinstance(op, ast.FloorDiv):
-        return Operator(OpType.FLOORDIV)
-    if isinstance(op, ast.Mod):
-        return Operator(OpType.MOD)
-    if isinstance(op, ast.Eq):
-        return Operator(OpType.EQ)
-    if isinstance(op, ast.NotEq):
-        return Operator(OpType.NOTEQ)
-    if isinstance(op, ast.Lt):
-        return Operator(OpType.LT)
-    if isinstance(op, ast.LtE):
-        return Operator(OpType.LTEQ)
-    if isinstance(op, ast.Gt):
-        return Operator(OpType.GT)
-    if isinstance(op, ast.GtE):
-        return Operator(OpType.GTEQ)
-    if isinstance(op, ast.Not):
-        return Operator(OpType.NOT)
-    if isinstance(op, ast.And):
-        return Operator(OpType.AND)
-    if isinstance(op, ast.Or):
-        return Operator(OpType.OR)
-    if isinstance(op, ast.UAdd):
-        return Operator(OpType.UADD)
-    if isinstance(op, ast.USub):
-        return Operator(OpType.USUB)
-    raise TypeError(f"Operator {op} is not supported")
+    op_type = AST_OPERATORS.get(type(op))
+    if op_type is None:
+        raise TypeError(f"Operator {op} is not supported")
+    return Operator(op_type)
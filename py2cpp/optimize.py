@@ -0,0 +1,313 @@
+import math
+import operator
+from typing import Callable, Dict, List
+
+from .expression import (
+    ArrayAlloc,
+    BinOp,
+    BoolOp,
+    Cast,
+    Compare,
+    Constant,
+    Expression,
+    FunctionCall,
+    Index,
+    Subscript,
+    UnaryOp,
+    iter_children,
+)
+from .intrinsics import IntrinsicCall, Reduction
+from .ops import Operator, OpType
+from .statement import (
+    Assign,
+    AugAssign,
+    ForRangeStmt,
+    GeneralStatement,
+    IfStmt,
+    ReturnStmt,
+    Statement,
+    WhileStmt,
+)
+from .type_system import INTEGER_TYPES, CppType
+
+# evaluates operators with Python semantics
+BINOP_FUNCS: Dict[OpType, Callable] = {
+    OpType.ADD: operator.add,
+    OpType.SUB: operator.sub,
+    OpType.MULT: operator.mul,
+    OpType.DIV: operator.truediv,
+    OpType.FLOORDIV: operator.floordiv,
+    OpType.MOD: operator.mod,
+}
+COMPARE_FUNCS: Dict[OpType, Callable] = {
+    OpType.EQ: operator.eq,
+    OpType.NOTEQ: operator.ne,
+    OpType.LT: operator.lt,
+    OpType.LTEQ: operator.le,
+    OpType.GT: operator.gt,
+    OpType.GTEQ: operator.ge,
+}
+CAST_FUNCS: Dict[CppType, Callable] = {
+    CppType.BOOL: bool,
+    CppType.INT: int,
+    CppType.DOUBLE: float,
+}
+
+# range of C++ int
+INT_MIN = -(2**31)
+INT_MAX = 2**31 - 1
+
+
+def _fits(value: int or float or bool) -> bool:
+    """Checks that a folded value is representable as a C++ literal of its type."""
+    if isinstance(value, bool):
+        return True
+    if isinstance(value, int):
+        return INT_MIN <= value <= INT_MAX
+    return math.isfinite(value)
+
+
+def _is_const(expr: Expression, value=None) -> bool:
+    """Checks that expr is a non-bool constant (equal to value if given)."""
+    if not isinstance(expr, Constant) or isinstance(expr.value, bool):
+        return False
+    return value is None or expr.value == value
+
+
+def _is_pure(expr: Expression) -> bool:
+    """Checks that evaluating expr has no side effects."""
+    if isinstance(expr, FunctionCall):
+        return False
+    return all(_is_pure(child) for child in iter_children(expr))
+
+
+def fold_expr(expr: Expression) -> Expression:
+    """Folds constant subtrees and simplifies an expression.
+
+    Args:
+        expr (Expression): An expression to be optimized
+
+    Returns:
+        Expression: An equivalent expression, which may be expr itself
+    """
+    folder = EXPR_FOLDERS.get(type(expr))
+    if folder is None:
+        return expr
+    return folder(expr)
+
+
+def _fold_array_alloc(expr: ArrayAlloc) -> Expression:
+    expr.fill = fold_expr(expr.fill)
+    expr.size = fold_expr(expr.size)
+    return expr
+
+
+def _fold_intrinsic_call(expr: IntrinsicCall) -> Expression:
+    expr.args = [fold_expr(arg) for arg in expr.args]
+    return expr
+
+
+def _fold_reduction(expr: Reduction) -> Expression:
+    expr.element = fold_expr(expr.element)
+    return expr
+
+
+def _fold_cast(expr: Cast) -> Expression:
+    expr.operand = fold_expr(expr.operand)
+    # literals of the other types are kept as casts
+    if isinstance(expr.operand, Constant) and expr.cpp_type in CAST_FUNCS:
+        try:
+            value = CAST_FUNCS[expr.cpp_type](expr.operand.value)
+        except (OverflowError, ValueError):
+            # int() of inf or nan
+            return expr
+        if _fits(value):
+            return Constant(value)
+    return expr
+
+
+def _fold_binop(expr: BinOp) -> Expression:
+    expr.left = fold_expr(expr.left)
+    expr.right = fold_expr(expr.right)
+    left, right, op_type = expr.left, expr.right, expr.op.op_type
+
+    if _is_const(left) and _is_const(right):
+        try:
+            value = BINOP_FUNCS[op_type](left.value, right.value)
+        except ZeroDivisionError:
+            # left as is to fail at run time
+            return expr
+        if _fits(value):
+            return Constant(value)
+        return expr
+
+    # identities, only when the type of the result is kept
+    if op_type == OpType.ADD:
+        # x + 0 is not exact for x = -0.0
+        if expr.cpp_type in INTEGER_TYPES:
+            if _is_const(right, 0) and left.cpp_type == expr.cpp_type:
+                return left
+            if _is_const(left, 0) and right.cpp_type == expr.cpp_type:
+                return right
+    elif op_type == OpType.SUB:
+        if _is_const(right, 0) and left.cpp_type == expr.cpp_type:
+            return left
+    elif op_type == OpType.MULT:
+        if _is_const(right, 1) and left.cpp_type == expr.cpp_type:
+            return left
+        if _is_const(left, 1) and right.cpp_type == expr.cpp_type:
+            return right
+    elif op_type in (OpType.DIV, OpType.FLOORDIV):
+        if _is_const(right, 1) and left.cpp_type == expr.cpp_type:
+            return left
+    return expr
+
+
+def _fold_unaryop(expr: UnaryOp) -> Expression:
+    expr.operand = fold_expr(expr.operand)
+    operand, op_type = expr.operand, expr.op.op_type
+
+    if op_type == OpType.NOT:
+        if isinstance(operand, Constant):
+            return Constant(not operand.value)
+        # not not b -> b
+        if (
+            isinstance(operand, UnaryOp)
+            and operand.op.op_type == OpType.NOT
+            and operand.operand.cpp_type == CppType.BOOL
+        ):
+            return operand.operand
+    elif op_type == OpType.USUB:
+        if _is_const(operand):
+            return Constant(-operand.value)
+        # -(-x) -> x
+        if isinstance(operand, UnaryOp) and operand.op.op_type == OpType.USUB:
+            return operand.operand
+    elif op_type == OpType.UADD:
+        # +x promotes int8_t and uint8_t to int
+        if operand.cpp_type == expr.cpp_type:
+            return operand
+    return expr
+
+
+def _fold_compare(expr: Compare) -> Expression:
+    expr.left = fold_expr(expr.left)
+    expr.comps = [fold_expr(comp) for comp in expr.comps]
+
+    # (left, op, right) pairs of the chain
+    pairs = []
+    left = expr.left
+    for op, comp in zip(expr.ops, expr.comps):
+        pairs.append((left, op, comp))
+        left = comp
+
+    remaining = []
+    for left, op, right in pairs:
+        if _is_const(left) and _is_const(right):
+            if not COMPARE_FUNCS[op.op_type](left.value, right.value):
+                if not _is_pure(expr):
+                    return expr
+                # always false
+                return Constant(False)
+            # always true, so pruned
+            continue
+        remaining.append((left, op, right))
+
+    if len(remaining) == len(pairs):
+        return expr
+    if len(remaining) == 0:
+        return Constant(True)
+
+    # contiguous pairs make a chain again
+    segments: List[Compare] = []
+    for left, op, right in remaining:
+        if segments and segments[-1].comps[-1] is left:
+            segments[-1].ops.append(op)
+            segments[-1].comps.append(right)
+        else:
+            segments.append(Compare(left, [op], [right]))
+    if len(segments) == 1:
+        return segments[0]
+    return BoolOp(Operator(OpType.AND), segments)
+
+
+def _fold_boolop(expr: BoolOp) -> Expression:
+    expr.values = [fold_expr(value) for value in expr.values]
+    is_and = expr.op.op_type == OpType.AND
+
+    values: List[Expression] = []
+    for value in expr.values:
+        if isinstance(value, Constant):
+            if bool(value.value) == is_and:
+                # True in And, False in Or does not affect the result
+                continue
+            # False in And, True in Or decides the result and the rest is skipped
+            if all(_is_pure(v) for v in values):
+                return Constant(not is_and)
+            values.append(value)
+            break
+        values.append(value)
+
+    if len(values) == 0:
+        return Constant(is_and)
+    if len(values) == 1 and values[0].cpp_type == CppType.BOOL:
+        return values[0]
+    expr.values = values
+    return expr
+
+
+def _fold_subscript(expr: Subscript) -> Expression:
+    expr.slice = fold_expr(expr.slice)
+    return expr
+
+
+def _fold_index(expr: Index) -> Expression:
+    expr.value = fold_expr(expr.value)
+    return expr
+
+
+def _fold_function_call(expr: FunctionCall) -> Expression:
+    expr.func_args = [fold_expr(arg) for arg in expr.func_args]
+    return expr
+
+
+EXPR_FOLDERS: Dict[type, Callable[[Expression], Expression]] = {
+    ArrayAlloc: _fold_array_alloc,
+    Cast: _fold_cast,
+    BinOp: _fold_binop,
+    UnaryOp: _fold_unaryop,
+    Compare: _fold_compare,
+    BoolOp: _fold_boolop,
+    Subscript: _fold_subscript,
+    Index: _fold_index,
+    FunctionCall: _fold_function_call,
+    IntrinsicCall: _fold_intrinsic_call,
+    Reduction: _fold_reduction,
+}
+
+
+def optimize_stmts(block: List[Statement]) -> None:
+    """Optimizes the expressions in a block of statements in place.
+
+    Args:
+        block (List[Statement]): Statements to be optimized
+    """
+    for stmt in block:
+        if isinstance(stmt, Assign):
+            stmt.targets = [fold_expr(target) for target in stmt.targets]
+            stmt.value = fold_expr(stmt.value)
+        elif isinstance(stmt, AugAssign):
+            stmt.target = fold_expr(stmt.target)
+            stmt.value = fold_expr(stmt.value)
+        elif isinstance(stmt, (IfStmt, WhileStmt)):
+            stmt.test = fold_expr(stmt.test)
+            optimize_stmts(stmt.body)
+        elif isinstance(stmt, ForRangeStmt):
+            stmt.start = fold_expr(stmt.start)
+            stmt.stop = fold_expr(stmt.stop)
+            stmt.step = fold_expr(stmt.step)
+            optimize_stmts(stmt.body)
+        elif isinstance(stmt, ReturnStmt):
+            stmt.ret_val = fold_expr(stmt.ret_val)
+        elif isinstance(stmt, GeneralStatement):
+            stmt.expr = fold_expr(stmt.expr)
@@ -0,0 +1,368 @@
+import math
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from .expression import (
+    ArrayLength,
+    BinOp,
+    BoolOp,
+    Cast,
+    Compare,
+    Constant,
+    Expression,
+    Index,
+    UnaryOp,
+    VarCtxt,
+    Variable,
+    iter_children,
+)
+from .intrinsics import IntrinsicCall
+from .ops import Operator, OpType
+from .statement import (
+    Assign,
+    AugAssign,
+    BlockStatement,
+    ForRangeStmt,
+    Statement,
+    iter_exprs,
+)
+from .symbols import Symbol
+from .type_system import INTEGER_RANGES, PROMOTIONS, CppType
+
+# closed interval [low, high] of the values of an integer expression, with
+# infinite bounds when unknown
+Range = Tuple[float, float]
+
+UNKNOWN: Range = (-math.inf, math.inf)
+NON_NEGATIVE: Range = (0, math.inf)
+BOOL_RANGE: Range = (0, 1)
+
+# types converted back to by assignments, where values wrap around instead of
+# overflowing (which is undefined and assumed not to happen for int and int64_t)
+WRAPPING_TYPES = frozenset({CppType.INT8, CppType.UINT8})
+
+# operators whose results differ between C++ and Python for negative operands
+DIVISION_OPS = frozenset({OpType.FLOORDIV, OpType.MOD})
+
+# passes over the function before the changing bounds are widened to infinity
+WIDENING_PASSES = 3
+
+
+def type_range(cpp_type: CppType) -> Range:
+    """Returns the range of all the values of a type."""
+    if cpp_type == CppType.BOOL:
+        return BOOL_RANGE
+    return INTEGER_RANGES.get(cpp_type, UNKNOWN)
+
+
+def _is_integral(cpp_type: CppType) -> bool:
+    return cpp_type in INTEGER_RANGES or cpp_type == CppType.BOOL
+
+
+def _clamp(value_range: Range, cpp_type: CppType) -> Range:
+    """Restricts a range to the values of a variable of cpp_type."""
+    low, high = type_range(cpp_type)
+    if cpp_type in WRAPPING_TYPES or cpp_type == CppType.BOOL:
+        inside = low <= value_range[0] and value_range[1] <= high
+        return value_range if inside else (low, high)
+    return max(value_range[0], low), min(value_range[1], high)
+
+
+def _join(a: Optional[Range], b: Optional[Range]) -> Optional[Range]:
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return min(a[0], b[0]), max(a[1], b[1])
+
+
+def _mul(x: float, y: float) -> float:
+    # 0 * inf is 0 for bounds
+    if x == 0 or y == 0:
+        return 0
+    return x * y
+
+
+def _add(a: Range, b: Range) -> Range:
+    return a[0] + b[0], a[1] + b[1]
+
+
+def _sub(a: Range, b: Range) -> Range:
+    return a[0] - b[1], a[1] - b[0]
+
+
+def _mult(a: Range, b: Range) -> Range:
+    corners = [_mul(x, y) for x in a for y in b]
+    return min(corners), max(corners)
+
+
+def _floordiv(a: Range, b: Range) -> Range:
+    if a[0] >= 0 and b[0] > 0:
+        return 0, a[1] if math.isinf(a[1]) else a[1] // b[0]
+    return UNKNOWN
+
+
+def _mod(a: Range, b: Range) -> Range:
+    # the remainder has the sign of the divisor
+    if b[0] > 0:
+        high = b[1] - 1
+        if a[0] >= 0:
+            high = min(high, a[1])
+        return 0, high
+    if b[1] < 0:
+        return b[0] + 1, 0
+    return UNKNOWN
+
+
+# operator -> range of the result of integers
+BINOP_RANGES: Dict[OpType, Callable[[Range, Range], Range]] = {
+    OpType.ADD: _add,
+    OpType.SUB: _sub,
+    OpType.MULT: _mult,
+    OpType.FLOORDIV: _floordiv,
+    OpType.MOD: _mod,
+}
+
+
+def _same_sign(a: Range, b: Range) -> bool:
+    """Whether the dividend is zero or of the sign of the divisor, where
+    division truncating toward zero is floor division as well."""
+    return (a[0] >= 0 and b[0] > 0) or (a[1] <= 0 and b[1] < 0)
+
+
+def _power_of_two(expr: Expression) -> Optional[int]:
+    """Returns k of a constant divisor 2**k."""
+    if not isinstance(expr, Constant) or type(expr.value) is not int:
+        return None
+    value = expr.value
+    if value <= 0 or value & (value - 1):
+        return None
+    return value.bit_length() - 1
+
+
+def _loop_range(start: Range, stop: Range, step: Expression) -> Range:
+    """Returns the range of the variable of a loop over range(start, stop, step)."""
+    # no iteration runs unless start is before stop
+    if isinstance(step, Constant) and step.value > 0:
+        return start[0], max(start[0], stop[1] - 1)
+    if isinstance(step, Constant) and step.value < 0:
+        return min(start[1], stop[0] + 1), start[1]
+    # between start and stop, which is excluded
+    return min(start[0], stop[0] + 1), max(start[1], stop[1] - 1)
+
+
+class RangeAnalysis:
+    """Value ranges of the integer variables of a function.
+
+    The analysis is flow-insensitive: the range of a variable covers all the
+    values assigned to it anywhere in the function. Loop variables are bounded
+    by the arguments of range(), lengths of arrays are non-negative and
+    arguments take any value of their types. The assignments are evaluated
+    repeatedly until no range changes, widening bounds that keep changing
+    (e.g. of counters) to infinity.
+    """
+
+    def __init__(self, block: List[Statement]) -> None:
+        # symbol -> range, absent while no assignment is evaluated
+        self.ranges: Dict[Symbol, Range] = dict()
+        # variables defined in the function, unlike the arguments
+        self._defined: Set[Symbol] = set()
+        self._widen = False
+        self._collect_defined(block)
+        passes = 0
+        while self._walk(block):
+            passes += 1
+            self._widen = passes >= WIDENING_PASSES
+
+    def _collect_defined(self, block: List[Statement]) -> None:
+        for stmt in block:
+            if isinstance(stmt, Assign):
+                for target in stmt.targets:
+                    if isinstance(target, Variable) and target.ctx == VarCtxt.NEW:
+                        self._defined.add(target.symbol)
+            elif isinstance(stmt, ForRangeStmt):
+                self._defined.add(stmt.target.symbol)
+            if isinstance(stmt, BlockStatement):
+                self._collect_defined(stmt.body)
+
+    def _current(self, symbol: Symbol) -> Optional[Range]:
+        if symbol in self.ranges:
+            return self.ranges[symbol]
+        if symbol in self._defined:
+            # not assigned yet
+            return None
+        return type_range(symbol.cpp_type)
+
+    def _update(self, symbol: Symbol, value_range: Optional[Range]) -> bool:
+        """Joins a range of an assigned value and returns whether it changed."""
+        if value_range is None or not _is_integral(symbol.cpp_type):
+            return False
+        current = self._current(symbol)
+        joined = _clamp(_join(current, value_range), symbol.cpp_type)
+        if joined == current:
+            return False
+        if self._widen and current is not None:
+            joined = (
+                -math.inf if joined[0] < current[0] else joined[0],
+                math.inf if joined[1] > current[1] else joined[1],
+            )
+            joined = _clamp(joined, symbol.cpp_type)
+        self.ranges[symbol] = joined
+        return True
+
+    def _walk(self, block: List[Statement]) -> bool:
+        changed = False
+        for stmt in block:
+            if isinstance(stmt, Assign):
+                value_range = self.range_of(stmt.value)
+                for target in stmt.targets:
+                    if isinstance(target, Variable):
+                        changed |= self._update(target.symbol, value_range)
+            elif isinstance(stmt, AugAssign) and isinstance(stmt.target, Variable):
+                op_range = BINOP_RANGES.get(stmt.op.op_type)
+                current = self._current(stmt.target.symbol)
+                value_range = self.range_of(stmt.value)
+                if op_range is None:
+                    changed |= self._update(stmt.target.symbol, UNKNOWN)
+                elif None not in (current, value_range):
+                    changed |= self._update(
+                        stmt.target.symbol, op_range(current, value_range)
+                    )
+            elif isinstance(stmt, ForRangeStmt):
+                start, stop = self.range_of(stmt.start), self.range_of(stmt.stop)
+                if None not in (start, stop):
+                    changed |= self._update(
+                        stmt.target.symbol, _loop_range(start, stop, stmt.step)
+                    )
+            if isinstance(stmt, BlockStatement):
+                changed |= self._walk(stmt.body)
+        return changed
+
+    def range_of(self, expr: Expression) -> Optional[Range]:
+        """Returns the range of the values of an expression, or None when it
+        depends on a variable which is not assigned yet."""
+        if isinstance(expr, Constant):
+            if isinstance(expr.value, (bool, int)):
+                return expr.value, expr.value
+            return UNKNOWN
+        if isinstance(expr, Variable):
+            return self._current(expr.symbol)
+        if isinstance(expr, ArrayLength):
+            return NON_NEGATIVE
+        if isinstance(expr, (Compare, BoolOp)):
+            children = [self.range_of(child) for child in iter_children(expr)]
+            if None in children:
+                return None
+            # C++ && and || give bools
+            return BOOL_RANGE
+        if isinstance(expr, Index):
+            return self.range_of(expr.value)
+        if isinstance(expr, BinOp):
+            op_range = BINOP_RANGES.get(expr.op.op_type)
+            left, right = self.range_of(expr.left), self.range_of(expr.right)
+            if None in (left, right):
+                return None
+            if op_range is None or expr.cpp_type not in INTEGER_RANGES:
+                return type_range(expr.cpp_type)
+            return _clamp(op_range(left, right), expr.cpp_type)
+        if isinstance(expr, UnaryOp):
+            operand = self.range_of(expr.operand)
+            if operand is None:
+                return None
+            if expr.op.op_type == OpType.USUB:
+                return _clamp((-operand[1], -operand[0]), expr.cpp_type)
+            if expr.op.op_type == OpType.UADD:
+                return operand
+            return type_range(expr.cpp_type)
+        if isinstance(expr, Cast):
+            operand = self.range_of(expr.operand)
+            if operand is None:
+                return None
+            low, high = type_range(expr.cpp_type)
+            # the value is kept unless it is out of the type
+            if low <= operand[0] and operand[1] <= high:
+                return operand
+            return low, high
+        if isinstance(expr, IntrinsicCall):
+            args = [self.range_of(arg) for arg in expr.args]
+            if None in args:
+                return None
+            if expr.cpp_type not in INTEGER_RANGES:
+                return type_range(expr.cpp_type)
+            if expr.cpp_name == "std::abs":
+                ((low, high),) = args
+                if low >= 0:
+                    return low, high
+                return max(0, -high, low), max(-low, high)
+            if expr.cpp_name in ("std::min", "std::max"):
+                func = min if expr.cpp_name == "std::min" else max
+                return func(a[0] for a in args), func(a[1] for a in args)
+            return type_range(expr.cpp_type)
+        # elements of arrays, calls and reductions
+        return type_range(expr.cpp_type)
+
+
+def _shift_width(cpp_type: CppType) -> int:
+    """Returns the number of bits of an integer operand of a shift, which is
+    promoted but not converted to the type of the other operand."""
+    promoted = PROMOTIONS.get((cpp_type, cpp_type))
+    if promoted not in INTEGER_RANGES:
+        return 0
+    low, high = INTEGER_RANGES[promoted]
+    return (high - low).bit_length()
+
+
+def _lower(
+    op: Operator, left: Expression, right: Expression, analysis: RangeAnalysis
+) -> Optional[Tuple[Operator, Expression]]:
+    """Returns the operator and the right operand lowering floor division or
+    modulo, or None if the helper with the semantics of Python is needed."""
+    shift = _power_of_two(right)
+    if shift is not None and shift < _shift_width(left.cpp_type):
+        # an arithmetic shift and a mask of two's complement round toward
+        # negative infinity, for negative dividends as well
+        if op.op_type == OpType.FLOORDIV:
+            return Operator(OpType.RSHIFT), Constant(shift)
+        return Operator(OpType.BITAND), Constant(right.value - 1)
+    left_range, right_range = analysis.range_of(left), analysis.range_of(right)
+    if None in (left_range, right_range) or not _same_sign(left_range, right_range):
+        return None
+    if op.op_type == OpType.FLOORDIV:
+        return Operator(OpType.TRUNCDIV), right
+    return Operator(OpType.TRUNCMOD), right
+
+
+def _lower_expr(expr: Expression, analysis: RangeAnalysis) -> None:
+    for child in iter_children(expr):
+        _lower_expr(child, analysis)
+    if isinstance(expr, BinOp) and expr.op.op_type in DIVISION_OPS:
+        lowered = _lower(expr.op, expr.left, expr.right, analysis)
+        if lowered is not None:
+            expr.op, expr.right = lowered
+
+
+def _lower_block(block: List[Statement], analysis: RangeAnalysis) -> None:
+    for stmt in block:
+        for expr in iter_exprs(stmt):
+            _lower_expr(expr, analysis)
+        if isinstance(stmt, AugAssign) and stmt.op.op_type in DIVISION_OPS:
+            lowered = _lower(stmt.op, stmt.target, stmt.value, analysis)
+            if lowered is not None:
+                stmt.op, stmt.value = lowered
+        if isinstance(stmt, BlockStatement):
+            _lower_block(stmt.body, analysis)
+
+
+def lower_divisions(block: List[Statement]) -> None:
+    """Lowers floor division and modulo of integers to C++ operators in place
+    where their results are proven to be those of Python.
+
+    C++ `/` and `%` truncate toward zero, which agrees with Python when the
+    dividend is zero or has the sign of the divisor, as proven by
+    RangeAnalysis. Division by a constant power of two becomes a shift and a
+    mask, which are correct for any sign. The others are left to the helpers
+    of runtime.HELPERS, see codegen.DIVISION_HELPERS.
+
+    Args:
+        block (List[Statement]): The body of a function
+    """
+    _lower_block(block, RangeAnalysis(block))
@@ -0,0 +1,252 @@
+from typing import Dict, Tuple
+
+# heap allocated array of `[x] * n`
+BUFFER_CLASS = "py2cpp_buffer"
+# extra argument receiving the length of a returned buffer
+RET_LEN_ARG = "py2cpp_ret_len"
+# exported to free returned buffers from Python
+FREE_FUNC = "py2cpp_free"
+# message of the error raised in the last call on the thread, or nullptr
+ERROR_VAR = "py2cpp_error"
+# exported to take the error from Python
+TAKE_ERROR_FUNC = "py2cpp_take_error"
+# prefix of the errors raised as MemoryError instead of ValueError
+MEMORY_ERROR_PREFIX = "MemoryError: "
+# reductions of sum(), min() and max()
+SUM_FUNC = "py2cpp_sum"
+MIN_FUNC = "py2cpp_min"
+MAX_FUNC = "py2cpp_max"
+# common length of the arrays of a reduction
+SAME_LENGTH_FUNC = "py2cpp_same_length"
+# memo table of a function decorated with functools.cache or lru_cache,
+# keyed by the arguments of the call
+MEMO_CLASS = "py2cpp_memo"
+MEMO_TABLE = "py2cpp_memo_table"
+MEMO_KEY = "py2cpp_key"
+# floor division and modulo with the semantics of Python, and their in-place
+# versions for `//=` and `%=`
+FLOORDIV_FUNC = "py2cpp_floordiv"
+MOD_FUNC = "py2cpp_mod"
+IFLOORDIV_FUNC = "py2cpp_ifloordiv"
+IMOD_FUNC = "py2cpp_imod"
+
+# alignment of buffers in bytes, a cache line and the width of AVX-512
+BUFFER_ALIGNMENT = 64
+
+
+def _extremum_helper(name: str, builtin: str, op: str) -> str:
+    return f"""template <typename T, typename F>
+inline T {name}(int64_t n, F f) {{
+	if (n <= 0) {{
+		{ERROR_VAR} = "{builtin}() arg is an empty sequence";
+		return T();
+	}}
+	T m0 = f(0), m1 = m0, m2 = m0, m3 = m0;
+	int64_t i = 1;
+	// independent accumulators, compiled to packed compares
+	for (; i + 4 <= n; i += 4) {{
+		T v0 = f(i), v1 = f(i + 1), v2 = f(i + 2), v3 = f(i + 3);
+		m0 = v0 {op} m0 ? v0 : m0;
+		m1 = v1 {op} m1 ? v1 : m1;
+		m2 = v2 {op} m2 ? v2 : m2;
+		m3 = v3 {op} m3 ? v3 : m3;
+	}}
+	for (; i < n; i++) {{
+		T v = f(i);
+		m0 = v {op} m0 ? v : m0;
+	}}
+	m0 = m1 {op} m0 ? m1 : m0;
+	m2 = m3 {op} m2 ? m3 : m2;
+	return m2 {op} m0 ? m2 : m0;
+}}
+"""
+
+
+# helper name -> (required headers, C++ source)
+# emitted once per translation unit before the functions using them
+HELPERS: Dict[str, Tuple[Tuple[str, ...], str]] = {
+    BUFFER_CLASS: (
+        ("algorithm", "cstdint", "cstdlib"),
+        f"""template <typename T>
+struct {BUFFER_CLASS} {{
+	T *data;
+	int64_t size;
+	// a negative n makes an empty array as in Python
+	explicit {BUFFER_CLASS}(int64_t n) : data(allocate(n > 0 ? n : 0)), size(n > 0 ? n : 0) {{
+		if (data == nullptr) {{
+			// an empty array, and the caller returns the error
+			size = 0;
+			{ERROR_VAR} = "{MEMORY_ERROR_PREFIX}Allocation of an array of [x] * n failed.";
+		}}
+	}}
+	{BUFFER_CLASS}(int64_t n, T value) : {BUFFER_CLASS}(n) {{
+		if (data != nullptr) {{
+			std::fill_n(data, size, value);
+		}}
+	}}
+	{BUFFER_CLASS}({BUFFER_CLASS} &&other) : data(other.data), size(other.size) {{
+		other.data = nullptr;
+	}}
+	{BUFFER_CLASS} &operator=({BUFFER_CLASS} &&other) {{
+		std::swap(data, other.data);
+		std::swap(size, other.size);
+		return *this;
+	}}
+	{BUFFER_CLASS}(const {BUFFER_CLASS} &) = delete;
+	{BUFFER_CLASS} &operator=(const {BUFFER_CLASS} &) = delete;
+	~{BUFFER_CLASS}() {{ std::free(data); }}
+	operator T *() const {{ return data; }}
+	// hands the ownership over to the caller, who frees it with std::free
+	T *release(int64_t *len) {{
+		*len = size;
+		T *p = data;
+		data = nullptr;
+		return p;
+	}}
+	static T *allocate(int64_t n) {{
+		// the size rounded up below must not overflow
+		const size_t max_n = (SIZE_MAX - {BUFFER_ALIGNMENT - 1}) / sizeof(T);
+		if (static_cast<uint64_t>(n) > max_n) {{
+			return nullptr;
+		}}
+		// aligned_alloc requires a multiple of the alignment
+		size_t bytes = (n * sizeof(T) + {BUFFER_ALIGNMENT - 1}) / {BUFFER_ALIGNMENT} * {BUFFER_ALIGNMENT};
+		return static_cast<T *>(std::aligned_alloc({BUFFER_ALIGNMENT}, bytes > 0 ? bytes : {BUFFER_ALIGNMENT}));
+	}}
+}};
+""",
+    ),
+    ERROR_VAR: (
+        (),
+        f"""// an inline variable is shared by all the translation units
+inline thread_local const char *{ERROR_VAR} = nullptr;
+""",
+    ),
+    SUM_FUNC: (
+        ("cstdint",),
+        f"""template <typename R, typename F>
+inline R {SUM_FUNC}(int64_t n, F f) {{
+	// independent accumulators break the dependency chain of additions,
+	// so that they are vectorized without -ffast-math. This reassociates the
+	// sum, so floats may differ from Python's sequential sum in rounding
+	R s0 = 0, s1 = 0, s2 = 0, s3 = 0;
+	int64_t i = 0;
+	for (; i + 4 <= n; i += 4) {{
+		s0 += f(i);
+		s1 += f(i + 1);
+		s2 += f(i + 2);
+		s3 += f(i + 3);
+	}}
+	for (; i < n; i++) {{
+		s0 += f(i);
+	}}
+	return (s0 + s1) + (s2 + s3);
+}}
+""",
+    ),
+    MIN_FUNC: (("cstdint",), _extremum_helper(MIN_FUNC, "min", "<")),
+    MAX_FUNC: (("cstdint",), _extremum_helper(MAX_FUNC, "max", ">")),
+    SAME_LENGTH_FUNC: (
+        ("cstdint", "initializer_list"),
+        f"""// the length of the first array, or 0 with an error if the others differ
+inline int64_t {SAME_LENGTH_FUNC}(std::initializer_list<int64_t> lens, const char *message) {{
+	for (int64_t len : lens) {{
+		if (len != *lens.begin()) {{
+			{ERROR_VAR} = message;
+			return 0;
+		}}
+	}}
+	return *lens.begin();
+}}
+""",
+    ),
+    MEMO_CLASS: (
+        ("algorithm", "cstdint", "cstdlib"),
+        f"""// a direct-mapped table of a bounded number of slots, in which a key
+// evicts the other key hashed to the same slot
+template <typename R, int N>
+struct {MEMO_CLASS} {{
+	struct entry {{
+		int64_t key[N];
+		R value;
+		bool used;
+	}};
+	entry *entries;
+	uint64_t mask;
+	// slots must be a power of two, zeroed lazily by the OS
+	explicit {MEMO_CLASS}(uint64_t slots)
+		: entries(static_cast<entry *>(std::calloc(slots, sizeof(entry)))), mask(slots - 1) {{}}
+	{MEMO_CLASS}(const {MEMO_CLASS} &) = delete;
+	{MEMO_CLASS} &operator=(const {MEMO_CLASS} &) = delete;
+	~{MEMO_CLASS}() {{ std::free(entries); }}
+	entry &slot(const int64_t (&key)[N]) const {{
+		// consecutive integers of the first key fall into distinct slots
+		uint64_t h = 0;
+		for (int i = 0; i < N; i++) {{
+			h = h * 0x9E3779B97F4A7C15ull + (uint64_t)key[i];
+		}}
+		return entries[(h ^ (h >> 32)) & mask];
+	}}
+	const R *find(const int64_t (&key)[N]) const {{
+		if (entries == nullptr) {{
+			return nullptr;
+		}}
+		const entry &e = slot(key);
+		return e.used && std::equal(key, key + N, e.key) ? &e.value : nullptr;
+	}}
+	R store(const int64_t (&key)[N], R value) {{
+		// a value computed after an error is not reused
+		if (entries != nullptr && {ERROR_VAR} == nullptr) {{
+			entry &e = slot(key);
+			std::copy(key, key + N, e.key);
+			e.value = value;
+			e.used = true;
+		}}
+		return value;
+	}}
+}};
+""",
+    ),
+    # / and % of C++ truncate toward zero, so the quotient is one less and the
+    # divisor is added to the remainder when the signs differ. The operands are
+    # promoted as with / and %.
+    FLOORDIV_FUNC: (
+        (),
+        f"""template <typename A, typename B>
+inline auto {FLOORDIV_FUNC}(A a, B b) -> decltype(a / b) {{
+	auto q = a / b, r = a % b;
+	// comparisons instead of branches, computed with a single division
+	return q - (decltype(q))((r != 0) & ((r < 0) != (b < 0)));
+}}
+
+template <typename V, typename B>
+inline void {IFLOORDIV_FUNC}(V &a, B b) {{
+	a = (V){FLOORDIV_FUNC}(a, b);
+}}
+""",
+    ),
+    MOD_FUNC: (
+        (),
+        f"""template <typename A, typename B>
+inline auto {MOD_FUNC}(A a, B b) -> decltype(a % b) {{
+	auto r = a % b;
+	// the remainder has the sign of the divisor as in Python
+	return r + (decltype(r))b * ((r != 0) & ((r < 0) != (b < 0)));
+}}
+
+template <typename V, typename B>
+inline void {IMOD_FUNC}(V &a, B b) {{
+	a = (V){MOD_FUNC}(a, b);
+}}
+""",
+    ),
+}
+
+# helper name -> helpers it uses, which are emitted before it
+HELPER_DEPS: Dict[str, Tuple[str, ...]] = {
+    BUFFER_CLASS: (ERROR_VAR,),
+    MIN_FUNC: (ERROR_VAR,),
+    MAX_FUNC: (ERROR_VAR,),
+    SAME_LENGTH_FUNC: (ERROR_VAR,),
+    MEMO_CLASS: (ERROR_VAR,),
+}
@@ -1,110 +1,216 @@
 import ast
-from typing import Dict, List
-
-from .expression import Array, Expression, VarCtxt, Variable, process_expr
+from typing import Callable, Dict, List, Set
+
+from .expression import (
+    ELEMENTWISE_INDEX,
+    Array,
+    ArrayAlloc,
+    ArrayLength,
+    ArrayMap,
+    BoolOp,
+    Compare,
+    Constant,
+    Expression,
+    Subscript,
+    VarCtxt,
+    Variable,
+    coerce,
+    is_array_alloc,
+    iter_children,
+    process_array_alloc,
+    process_expr,
+)
 from .ops import Operator, OpType, process_operator
-from .type_system import CppType, type_py2cpp, type_typing2py
+from .symbols import Symbol, SymbolTable
+from .type_system import (
+    CPP2TYPING,
+    CPP_NAMES,
+    ELEMENT_CPP_TYPES,
+    FLOATING_TYPES,
+    INTEGER_TYPES,
+    PROMOTIONS,
+    cpp_type_str,
+    int64,
+    type_py2cpp,
+    type_typing2py,
+)
+
+# buffer holding the result of an element-wise operation to be returned
+RETURN_ARRAY = "py2cpp_ret"
+# prefix of the counter of a loop whose variable is read outside the loop
+LOOP_COUNTER_PREFIX = "py2cpp_loop_"
 
 
 class Statement:
-    def __init__(self) -> None:
-        self.cpp_str = None
+    """Statement node of the intermediate representation.
+
+    C++ source is not built here but generated from the tree by codegen.
+    """
+
+    __slots__ = ()
+
+    @property
+    def cpp_str(self) -> str:
+        from .codegen import gen_stmt
+
+        return gen_stmt(self)
 
 
 class Assign(Statement):
+    __slots__ = ("targets", "value")
+
     def __init__(self, targets: List[Expression], value: Expression) -> None:
         super().__init__()
         self.targets = targets
         self.value = value
-        self.cpp_str = ""
-        for target in targets:
-            self.cpp_str += f"{target.cpp_str} = "
-        self.cpp_str += f"{value.cpp_str};"
 
 
 class AugAssign(Statement):
+    __slots__ = ("target", "op", "value")
+
     def __init__(self, target: Expression, op: Operator, value: Expression) -> None:
         super().__init__()
         # check type validity and detect implicit cast
         if op.op_type in (OpType.ADD, OpType.SUB, OpType.MULT):
-            if target.cpp_type != value.cpp_type:
-                raise TypeError(
-                    f"Implicit cast from {value.cpp_type} to {target.cpp_type} is not supported."
-                )
+            # the result is converted back to the type of an array element
+            # as numpy does, otherwise the value must be widened
+            value = coerce(value, target.cpp_type, isinstance(target, Subscript))
         elif op.op_type == OpType.DIV:
-            if target.cpp_type == CppType.INT:
+            if target.cpp_type not in FLOATING_TYPES:
                 raise TypeError(f"'/=' operation for int variable is not supported.")
-        elif op.op_type == OpType.FLOORDIV:
-            if not (target.cpp_type == value.cpp_type == CppType.INT):
+        elif op.op_type in (OpType.FLOORDIV, OpType.MOD):
+            if not {target.cpp_type, value.cpp_type} <= INTEGER_TYPES:
                 raise TypeError(
-                    f"'//=' operation except for {target.cpp_type} target and {value.cpp_type} value is not supported."
-                )
-        elif op.op_type == OpType.MOD:
-            if not (target.cpp_type == value.cpp_type == CppType.INT):
-                raise TypeError(
-                    f"'%=' operation except for {target.cpp_type} target and {value.cpp_type} value is not supported."
+                    f"'{op.cpp_str}=' operation except for integer target and value "
+                    f"is not supported, got {target.cpp_type} and {value.cpp_type}."
                 )
         self.target = target
         self.op = op
         self.value = value
-        self.cpp_str = f"{target.cpp_str} {op.cpp_str}= {value.cpp_str};"
 
 
-class IfStmt(Statement):
-    def __init__(self, test: Expression, body: List[Statement], orelse) -> None:
+class BlockStatement(Statement):
+    """Statement with a nested block of statements"""
+
+    __slots__ = ("body",)
+
+    def __init__(self, body: List[Statement]) -> None:
         super().__init__()
-        self.test = test
         self.body = body
+
+
+class IfStmt(BlockStatement):
+    __slots__ = ("test", "orelse")
+
+    def __init__(self, test: Expression, body: List[Statement], orelse) -> None:
+        super().__init__(body)
+        self.test = test
         self.orelse = orelse  # TODO: to support elif, else
-        header = f"if {self.test.cpp_str} " + "{"
-        lines = list(map(lambda x: x.cpp_str, body))
-        tail = "}"
-        self.cpp_str = [header] + lines + [tail]
 
 
-class WhileStmt(Statement):
+class WhileStmt(BlockStatement):
+    __slots__ = ("test", "orelse")
+
     def __init__(self, test: Expression, body: List[Statement], orelse) -> None:
-        super().__init__()
+        super().__init__(body)
         self.test = test
-        self.body = body
         self.orelse = orelse
-        header = f"while {self.test.cpp_str} " + "{"
-        lines = list(map(lambda x: x.cpp_str, body))
-        tail = "}"
-        self.cpp_str = [header] + lines + [tail]
+
+
+class ForRangeStmt(BlockStatement):
+    """`for var in range(start, stop, step)` lowered to a counted C++ for loop
+
+    A loop over `prange()` is marked as parallel.
+    """
+
+    __slots__ = ("target", "start", "stop", "step", "parallel", "pragma", "last")
+
+    def __init__(
+        self,
+        target: Variable,
+        start: Expression,
+        stop: Expression,
+        step: Expression,
+        body: List[Statement],
+        parallel: bool = False,
+    ) -> None:
+        super().__init__(body)
+        for bound in (start, stop, step):
+            if bound.cpp_type not in INTEGER_TYPES:
+                raise TypeError("Arguments of range() must be int.")
+        self.target = target
+        self.start = start
+        self.stop = stop
+        self.step = step
+        self.parallel = parallel
+        # e.g. "omp simd", emitted as #pragma before the loop
+        self.pragma: str = None
+        # assignment of the counter to the variable of the enclosing scope at
+        # the start of each iteration, see bind_loop_variables()
+        self.last: Assign = None
 
 
 class ReturnStmt(Statement):
+    __slots__ = ("ret_val", "cpp_type", "cpp_type_str")
+
     def __init__(self, ret_val: Expression) -> None:
         super().__init__()
         type = ret_val.type
         py_type = type_typing2py(type)
+        self.ret_val = ret_val
         self.cpp_type = type_py2cpp(py_type)
-        self.cpp_type_str = self._gen_ret_type_str()
-        self.cpp_str = f"return {ret_val.cpp_str};"
-
-    def _gen_ret_type_str(self) -> str:
-        if self.cpp_type == CppType.BOOL:
-            return "bool"
-        if self.cpp_type == CppType.INT:
-            return "int"
-        if self.cpp_type == CppType.DOUBLE:
-            return "double"
-        if self.cpp_type == CppType.ARRAY_INT:
-            return "int *"
-        if self.cpp_type == CppType.ARRAY_DOUBLE:
-            return "double *"
+        self.cpp_type_str = cpp_type_str(self.cpp_type)
+
+
+class RaiseStmt(Statement):
+    """Stops the function with an error, which jit raises as ValueError"""
+
+    __slots__ = ("message",)
+
+    def __init__(self, message: str) -> None:
+        super().__init__()
+        self.message = message
 
 
 class GeneralStatement(Statement):
+    __slots__ = ("expr",)
+
     def __init__(self, expr: Expression) -> None:
         super().__init__()
-        self.cpp_str = f"{expr.cpp_str};"
+        self.expr = expr
 
 
-def process_assign(stmt: ast.Assign, var_table: Dict[str, Variable]) -> Assign:
+# statement type -> its direct expressions
+STMT_EXPRS: Dict[type, Callable[[Statement], List[Expression]]] = {
+    Assign: lambda s: [*s.targets, s.value],
+    AugAssign: lambda s: [s.target, s.value],
+    IfStmt: lambda s: [s.test],
+    WhileStmt: lambda s: [s.test],
+    ForRangeStmt: lambda s: [s.target, s.start, s.stop, s.step],
+    ReturnStmt: lambda s: [s.ret_val],
+    GeneralStatement: lambda s: [s.expr],
+}
+
+
+def iter_exprs(stmt: Statement) -> List[Expression]:
+    """Returns the expressions of a statement, excluding its nested block."""
+    exprs = STMT_EXPRS.get(type(stmt))
+    if exprs is None:
+        return []
+    return exprs(stmt)
+
+
+def process_assign(
+    stmt: ast.Assign, var_table: SymbolTable
+) -> Assign or List[Statement]:
     # right value
-    rv = process_expr(stmt.value, var_table)
+    if is_array_alloc(stmt.value):
+        rv = process_array_alloc(stmt.value, var_table)
+    else:
+        rv = process_expr(stmt.value, var_table)
+    if rv.cpp_type is None:
+        # e.g. a call of a function which is not transpiled
+        raise TypeError(f"Cannot infer the type of {ast.unparse(stmt.value)}.")
     # left value
     targets = [process_expr(target, var_table) for target in stmt.targets]
     # TODO: to support Multiple targets assignment
@@ -115,31 +221,104 @@ def process_assign(stmt: ast.Assign, var_table: Dict[str, Variable]) -> Assign:
                 f"Multiple targets are only supported when all variables are already defined."
             )
         # raise ValueError(f"More than 1 target is not supported.")
-        if rv.cpp_type not in {CppType.BOOL, CppType.INT, CppType.DOUBLE}:
+        if rv.cpp_type not in CPP_NAMES:
             raise TypeError(
                 f"Multiple targets are only supported for Number-like types."
             )
 
     # for array type variable, set size
     if isinstance(rv, Array):
-        targets[0].set_size(rv.size)
+        targets[0].symbol.set_size(rv.size)
     for target in targets:
+        if isinstance(target, Variable) and rv.cpp_type in ELEMENT_CPP_TYPES:
+            _check_array_assign(target, rv)
         if target.ctx == VarCtxt.NEW:
-            target.set_type(rv.type)
-            var_table[target.id].set_type(rv.type)
+            target.symbol.set_type(rv.type)
+            if isinstance(rv, (ArrayAlloc, ArrayMap)):
+                target.symbol.set_buffer()
         else:
-            # detects implicit cast
-            if rv.cpp_type != target.cpp_type:
-                raise TypeError(
-                    f"Implicit cast from {rv.cpp_type} to {target.cpp_type} is not supported."
-                )
+            # detects implicit cast, converted explicitly if widening
+            rv = coerce(rv, target.cpp_type, isinstance(target, Subscript))
+    if any(target.cpp_type != rv.cpp_type for target in targets):
+        raise TypeError("Multiple targets must have the same type.")
 
+    if isinstance(rv, ArrayMap):
+        return lower_array_map(targets[0], rv)
     return Assign(targets, rv)
 
 
-def process_aug_assign(
-    stmt: ast.AugAssign, var_table: Dict[str, Variable]
-) -> AugAssign:
+def _check_array_assign(target: Variable, rv: Expression) -> None:
+    """Checks an assignment of an array to a variable.
+
+    Raises:
+        TypeError: Raised when the array would be aliased, or when a buffer
+            of `[x] * n` and another array would be mixed.
+    """
+    if target.ctx == VarCtxt.NEW:
+        if not isinstance(rv, (Array, ArrayAlloc, ArrayMap)):
+            raise TypeError(f"Array cannot be aliased as {target.id}.")
+    elif target.symbol.buffer != isinstance(rv, (ArrayAlloc, ArrayMap)):
+        raise TypeError(
+            f"Only an array of [x] * n or an element-wise operation can be "
+            f"assigned to {target.id}, and vice versa."
+        )
+
+
+def lower_array_map(target: Variable, rv: ArrayMap) -> List[Statement]:
+    """Lowers `target = <element-wise operation>` into a single loop.
+
+    The lengths of the arrays are checked once before the loop. The result
+    is stored into a new buffer, or in place when target is an operand.
+
+    Args:
+        target (Variable): A variable of a buffer, whose type is already set
+        rv (ArrayMap): An element-wise operation
+
+    Returns:
+        List[Statement]: The check, the allocation and the loop
+    """
+    stmts: List[Statement] = []
+    first, *others = rv.arrays
+    if others:
+        mismatches = [
+            Compare(ArrayLength(first), [Operator(OpType.NOTEQ)], [ArrayLength(other)])
+            for other in others
+        ]
+        names = ", ".join(array.id for array in rv.arrays)
+        stmts.append(
+            IfStmt(
+                (
+                    mismatches[0]
+                    if len(mismatches) == 1
+                    else BoolOp(Operator(OpType.OR), mismatches)
+                ),
+                [RaiseStmt(f"Lengths of {names} do not match.")],
+                [],
+            )
+        )
+    if target.symbol not in {array.symbol for array in rv.arrays}:
+        elem_type = CPP2TYPING[rv.element.cpp_type]
+        stmts.append(Assign([target], ArrayAlloc(None, ArrayLength(first), elem_type)))
+    index = Symbol(ELEMENTWISE_INDEX, int64)
+    element = Subscript(
+        Variable(target.symbol, VarCtxt.REUSE),
+        Variable(index, VarCtxt.REUSE),
+        target.type,
+        VarCtxt.REUSE,
+    )
+    stmts.append(
+        ForRangeStmt(
+            Variable(index, VarCtxt.NEW),
+            Constant(0),
+            ArrayLength(first),
+            Constant(1),
+            [Assign([element], rv.element)],
+        )
+    )
+    return stmts
+
+
+def process_aug_assign(stmt: ast.AugAssign, var_table: SymbolTable) -> AugAssign:
     # right value
     rv = process_expr(stmt.value, var_table)
     # operator
@@ -149,46 +328,210 @@ def process_aug_assign(
     return AugAssign(target, op, rv)
 
 
-def process_if(stmt: ast.If, var_table: Dict[str, Variable]) -> IfStmt:
+def process_if(stmt: ast.If, var_table: SymbolTable) -> IfStmt:
     condition = process_expr(stmt.test, var_table)
-    body = []
-    for child_stmt in stmt.body:
-        processed_child_stmt = process_stmt(child_stmt, var_table)
-        body.append(processed_child_stmt)
+    with var_table.scope():
+        body = process_block(stmt.body, var_table)
     orelse = stmt.orelse
     return IfStmt(condition, body, orelse)
 
 
-def process_while(stmt: ast.While, var_table: Dict[str, Variable]) -> WhileStmt:
+def process_while(stmt: ast.While, var_table: SymbolTable) -> WhileStmt:
     condition = process_expr(stmt.test, var_table)
-    body: List[Statement] = []
-    for child_stmt in stmt.body:
-        processed_child_stmt = process_stmt(child_stmt, var_table)
-        body.append(processed_child_stmt)
+    with var_table.scope():
+        body = process_block(stmt.body, var_table)
     orelse = stmt.orelse
     return WhileStmt(condition, body, orelse)
 
 
-def process_return(stmt: ast.Return, var_table: Dict[str, Variable]) -> ReturnStmt:
+def process_for(stmt: ast.For, var_table: SymbolTable) -> ForRangeStmt:
+    if not isinstance(stmt.target, ast.Name):
+        raise TypeError("Loop variable must be a single variable.")
+    if not isinstance(stmt.iter, ast.Call):
+        raise TypeError("Only for loops over range() are supported.")
+    # range, prange or py2cpp.prange
+    func = stmt.iter.func
+    if isinstance(func, ast.Attribute):
+        func_id = func.attr
+    else:
+        func_id = getattr(func, "id", None)
+    if func_id not in ("range", "prange"):
+        raise TypeError("Only for loops over range() are supported.")
+    parallel = func_id == "prange"
+    if stmt.orelse:
+        raise TypeError("for-else is not supported.")
+    var_id = stmt.target.id
+    # names assigned in the body
+    stored_ids = {
+        node.id
+        for child_stmt in stmt.body
+        for node in ast.walk(child_stmt)
+        if isinstance(node, ast.Name) and isinstance(node.ctx, ast.Store)
+    }
+    if var_id in stored_ids:
+        raise ValueError(f"Assignment to loop variable {var_id} is not supported.")
+    # range() is evaluated once in Python, but the bounds are evaluated
+    # in every iteration in C++
+    for arg in stmt.iter.args:
+        for node in ast.walk(arg):
+            if isinstance(node, ast.Name) and node.id in stored_ids | {var_id}:
+                raise ValueError(
+                    f"Arguments of range() must not depend on {node.id}, "
+                    "which is modified in the loop."
+                )
+
+    range_args = [process_expr(arg, var_table) for arg in stmt.iter.args]
+    if len(range_args) == 1:
+        start, stop, step = Constant(0), range_args[0], Constant(1)
+    elif len(range_args) == 2:
+        start, stop, step = range_args[0], range_args[1], Constant(1)
+    elif len(range_args) == 3:
+        start, stop, step = range_args
+    else:
+        raise TypeError("range() takes 1 to 3 arguments.")
+    if isinstance(step, Constant) and step.value == 0:
+        raise ValueError("range() step must not be zero.")
+    if parallel and not isinstance(step, Constant):
+        raise TypeError("prange() step must be a constant.")
+    for bound in (start, stop, step):
+        if bound.cpp_type not in INTEGER_TYPES:
+            raise TypeError("Arguments of range() must be int.")
+    # int64_t if any bound is int64_t, otherwise int
+    index_type = PROMOTIONS[
+        (PROMOTIONS[(start.cpp_type, stop.cpp_type)], step.cpp_type)
+    ]
+
+    # Python has no loop scope, so the variable of the enclosing scope takes
+    # the value of each iteration
+    outer = var_table.get(var_id)
+    if outer is None:
+        outer = var_table.define(var_id, CPP2TYPING[index_type])
+        outer_ctx = VarCtxt.NEW
+    elif (
+        outer.cpp_type not in INTEGER_TYPES
+        or PROMOTIONS[(outer.cpp_type, index_type)] != outer.cpp_type
+    ):
+        raise TypeError(
+            f"Loop variable {var_id} of {outer.cpp_type} cannot hold "
+            f"the values of range() of {index_type}."
+        )
+    else:
+        outer_ctx = VarCtxt.REUSE
+
+    with var_table.scope():
+        # the counter is local to the C++ loop and shadows the outer variable
+        target = Variable(var_table.define(var_id, CPP2TYPING[index_type]), VarCtxt.NEW)
+        body = process_block(stmt.body, var_table)
+    if parallel and _contains_return(body):
+        raise ValueError("Return in a prange() loop is not supported.")
+    loop = ForRangeStmt(target, start, stop, step, body, parallel)
+    loop.last = Assign(
+        [Variable(outer, outer_ctx)], Variable(target.symbol, VarCtxt.REUSE)
+    )
+    return loop
+
+
+def bind_loop_variables(block: List[Statement]) -> None:
+    """Keeps the values of the loop variables read outside their loops.
+
+    The counter of such a loop is renamed apart from the variable and
+    assigned to it at the start of each iteration, and the variable is
+    declared before the loop unless it is already defined. The other loops
+    are left as they are.
+
+    Args:
+        block (List[Statement]): The body of a function, processed in place
+    """
+    read: Set[Symbol] = set()
+    _collect_reads(block, read)
+    _bind_loops(block, read)
+
+
+def _collect_reads(block: List[Statement], read: Set[Symbol]) -> None:
+    def walk(expr: Expression) -> None:
+        if isinstance(expr, Variable) and expr.ctx == VarCtxt.REUSE:
+            read.add(expr.symbol)
+        for child in iter_children(expr):
+            walk(child)
+
+    for stmt in block:
+        for expr in iter_exprs(stmt):
+            walk(expr)
+        if isinstance(stmt, BlockStatement):
+            _collect_reads(stmt.body, read)
+
+
+def _bind_loops(block: List[Statement], read: Set[Symbol]) -> None:
+    bound: List[Statement] = []
+    for stmt in block:
+        if isinstance(stmt, ForRangeStmt) and stmt.last is not None:
+            outer = stmt.last.targets[0]
+            if outer.symbol in read:
+                if outer.ctx == VarCtxt.NEW:
+                    # the loop may not run at all
+                    bound.append(Assign([outer], Constant(0)))
+                    stmt.last.targets = [Variable(outer.symbol, VarCtxt.REUSE)]
+                stmt.target.symbol.id = LOOP_COUNTER_PREFIX + stmt.target.id
+                stmt.body.insert(0, stmt.last)
+            else:
+                stmt.last = None
+        if isinstance(stmt, BlockStatement):
+            _bind_loops(stmt.body, read)
+        bound.append(stmt)
+    block[:] = bound
+
+
+def _contains_return(block: List[Statement]) -> bool:
+    for stmt in block:
+        # an error returns early as well
+        if isinstance(stmt, (ReturnStmt, RaiseStmt)):
+            return True
+        if isinstance(stmt, BlockStatement) and _contains_return(stmt.body):
+            return True
+    return False
+
+
+def process_return(
+    stmt: ast.Return, var_table: SymbolTable
+) -> ReturnStmt or List[Statement]:
     ret_val = process_expr(stmt.value, var_table)
+    if isinstance(ret_val, ArrayMap):
+        # the result is stored into a buffer to be returned
+        target = Variable(var_table.define(RETURN_ARRAY), VarCtxt.NEW)
+        target.symbol.set_type(ret_val.type)
+        target.symbol.set_buffer()
+        stmts = lower_array_map(target, ret_val)
+        stmts.append(ReturnStmt(Variable(target.symbol, VarCtxt.REUSE)))
+        return stmts
     return ReturnStmt(ret_val)
 
 
-def process_general_stmt(
-    stmt: ast.Expr, var_table: Dict[str, Variable]
-) -> GeneralStatement:
+def process_general_stmt(stmt: ast.Expr, var_table: SymbolTable) -> GeneralStatement:
     processed_expr = process_expr(stmt.value, var_table)
     return GeneralStatement(processed_expr)
 
 
+def process_block(stmts: List[ast.stmt], var_table: SymbolTable) -> List[Statement]:
+    """Processes a block of statements, flattening the statements lowered
+    into multiple ones."""
+    block: List[Statement] = []
+    for stmt in stmts:
+        processed = process_stmt(stmt, var_table)
+        if isinstance(processed, list):
+            block += processed
+        else:
+            block.append(processed)
+    return block
+
+
 def process_stmt(
-    stmt: ast.stmt, var_table: Dict[str, Variable]
+    stmt: ast.stmt, var_table: SymbolTable
 ) -> Statement or List[Statement]:
     """Processes a statement according to its type and meta information and return constructed object(s)
 
     Args:
         stmt (ast.stmt): A statement to be processed
-        var_table (Dict[str, Variable]): A variable table
+        var_table (SymbolTable): A variable table
 
     Raises:
         TypeError: Raised when the statement is not supported.
@@ -208,6 +551,9 @@ def process_stmt(
     elif isinstance(stmt, ast.While):
         processed_stmts = process_while(stmt, var_table)
         return processed_stmts
+    elif isinstance(stmt, ast.For):
+        processed_stmts = process_for(stmt, var_table)
+        return processed_stmts
     elif isinstance(stmt, ast.Return):
         processed_stmt = process_return(stmt, var_table)
         return processed_stmt
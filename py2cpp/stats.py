@@ -0,0 +1,133 @@
+import ast
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import Counter
+from typing import Callable, Dict, Iterator, List, Optional
+
+
+class Phase:
+    """A record of one phase of the pipeline.
+
+    Attributes:
+        name (str): e.g. "getsource", "parse", "process", "emit", "compile"
+        func_name (str): Name of the function being processed
+        start (float): Start time in seconds since the Stats object was created
+        duration (float): Wall time in seconds
+        node_counts (Dict[str, int]): AST node type name -> count, if counted
+        output_bytes (int): Size of the output of the phase, if any
+    """
+
+    __slots__ = (
+        "name",
+        "func_name",
+        "start",
+        "duration",
+        "node_counts",
+        "output_bytes",
+        "thread_id",
+    )
+
+    def __init__(self, name: str, func_name: str, start: float) -> None:
+        self.name = name
+        self.func_name = func_name
+        self.start = start
+        self.duration = 0.0
+        self.node_counts: Dict[str, int] = dict()
+        self.output_bytes: int = None
+        self.thread_id = threading.get_ident()
+
+    def count_nodes(self, tree: ast.AST) -> None:
+        self.node_counts = dict(Counter(type(node).__name__ for node in ast.walk(tree)))
+
+
+class Stats:
+    """Collects the wall time, node counts and output size of each phase of
+    transpilation and compilation.
+
+    Pass it as `stats` to transpile(), transpile_to() or jit(). A callback,
+    if given, is called with each Phase as soon as it ends.
+    """
+
+    def __init__(self, callback: Optional[Callable[[Phase], None]] = None) -> None:
+        self.callback = callback
+        self.phases: List[Phase] = []
+        self._origin = time.perf_counter()
+
+    @contextlib.contextmanager
+    def phase(self, name: str, func_name: str = None) -> Iterator[Phase]:
+        """Measures the wall time of the block as a phase."""
+        record = Phase(name, func_name, time.perf_counter() - self._origin)
+        try:
+            yield record
+        finally:
+            record.duration = time.perf_counter() - self._origin - record.start
+            self.phases.append(record)
+            if self.callback is not None:
+                self.callback(record)
+
+    @property
+    def times(self) -> Dict[str, float]:
+        """Phase name -> total wall time in seconds"""
+        totals: Dict[str, float] = dict()
+        for record in self.phases:
+            totals[record.name] = totals.get(record.name, 0.0) + record.duration
+        return totals
+
+    @property
+    def node_counts(self) -> Dict[str, int]:
+        """AST node type name -> total count"""
+        totals: Counter = Counter()
+        for record in self.phases:
+            totals.update(record.node_counts)
+        return dict(totals)
+
+    @property
+    def output_bytes(self) -> int:
+        """Total size of the generated C++ sources"""
+        return sum(
+            record.output_bytes
+            for record in self.phases
+            if record.name == "emit" and record.output_bytes is not None
+        )
+
+    def to_chrome_trace(self) -> Dict:
+        """Converts the phases into the Chrome trace event format, which can be
+        opened in chrome://tracing or Perfetto."""
+        events = []
+        for record in self.phases:
+            args = dict()
+            if record.func_name is not None:
+                args["func"] = record.func_name
+            if record.node_counts:
+                args["node_counts"] = record.node_counts
+            if record.output_bytes is not None:
+                args["output_bytes"] = record.output_bytes
+            events.append(
+                {
+                    "name": record.name,
+                    "cat": "py2cpp",
+                    # complete event
+                    "ph": "X",
+                    "ts": record.start * 1e6,
+                    "dur": record.duration * 1e6,
+                    "pid": os.getpid(),
+                    "tid": record.thread_id,
+                    "args": args,
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path: str) -> str:
+        with open(path, "w") as f:
+            json.dump(self.to_chrome_trace(), f)
+        return path
+
+
+def phase(stats: Optional[Stats], name: str, func_name: str = None):
+    """Returns stats.phase(), or a no-op context manager without stats."""
+    if stats is None:
+        return contextlib.nullcontext()
+    return stats.phase(name, func_name)
@@ -0,0 +1,92 @@
+import contextlib
+import sys
+from typing import Callable, Dict, Iterator, List, Type
+
+from .type_system import CppType, PyType, type_py2cpp, type_typing2py
+
+
+class Symbol:
+    """A variable of a function.
+
+    One Symbol is shared by all the references to the variable, so its types
+    are derived only once, when the type becomes known.
+    """
+
+    __slots__ = ("id", "type", "py_type", "cpp_type", "size", "buffer")
+
+    def __init__(self, id: str, type: Type = None, size: int = None) -> None:
+        self.id = id
+        self.type: Type = None
+        self.py_type: PyType = None
+        self.cpp_type: CppType = None
+        self.size = size
+        # whether the array is allocated on the heap by `[x] * n`
+        self.buffer = False
+        if type is not None:
+            self.set_type(type)
+
+    def set_type(self, type: Type) -> None:
+        """Sets the type of the variable"""
+        self.type = type
+        self.py_type = type_typing2py(type)
+        self.cpp_type = type_py2cpp(self.py_type)
+
+    def set_size(self, size: int) -> None:
+        """Sets the size of array"""
+        self.size = size
+
+    def set_buffer(self) -> None:
+        """Marks the array as allocated on the heap"""
+        self.buffer = True
+
+
+class SymbolTable:
+    """Variables of a function in nested scopes.
+
+    The function body is the outermost scope, and the bodies of if, while and
+    for statements open inner scopes. As with blocks in C++, a variable
+    defined in an inner scope is not visible after the block.
+    """
+
+    def __init__(self, resolve_call: Callable = None) -> None:
+        self._scopes: List[Dict[str, Symbol]] = [dict()]
+        # resolves a call of a function which is not a variable into the
+        # transpiled callee, or None, see CallGraph
+        self.resolve_call = resolve_call
+
+    def __contains__(self, id: str) -> bool:
+        return self.get(id) is not None
+
+    def __getitem__(self, id: str) -> Symbol:
+        symbol = self.get(id)
+        if symbol is None:
+            raise KeyError(id)
+        return symbol
+
+    def get(self, id: str) -> Symbol:
+        """Looks up a variable from the innermost scope, or returns None."""
+        for scope in reversed(self._scopes):
+            symbol = scope.get(id)
+            if symbol is not None:
+                return symbol
+        return None
+
+    def define(self, id: str, type: Type = None) -> Symbol:
+        """Defines a variable in the innermost scope.
+
+        It shadows the variable of the same name in the outer scopes.
+        """
+        # ids are compared and hashed on every lookup
+        id = sys.intern(id)
+        symbol = Symbol(id, type)
+        self._scopes[-1][id] = symbol
+        return symbol
+
+    @contextlib.contextmanager
+    def scope(self) -> Iterator[None]:
+        """Opens a nested scope during the block."""
+        self._scopes.append(dict())
+        try:
+            yield
+        finally:
+            self._scopes.pop()
@@ -1,65 +1,738 @@
 import ast
 import inspect
-from typing import Any, Dict, List
+import io
+import os
+import textwrap
+import typing
+from typing import Any, Callable, Dict, List, Set, TextIO, Tuple
 
-from .expression import VarCtxt, Variable
+from .cache import DiskCache
+from .codegen import DIVISION_HELPERS, CppGenerator
+from .expression import (
+    ArrayAlloc,
+    ArrayLength,
+    BinOp,
+    Expression,
+    FunctionCall,
+    Variable,
+    iter_children,
+)
+from .extension import write_extension_module
 from .funcarg import FuncArg
-from .statement import ReturnStmt, process_stmt
+from .intrinsics import IntrinsicCall, Reduction
+from .loops import annotate_loops
+from .optimize import optimize_stmts
+from .ranges import lower_divisions
+from .runtime import (
+    BUFFER_CLASS,
+    ERROR_VAR,
+    HELPER_DEPS,
+    HELPERS,
+    MEMO_CLASS,
+    MEMO_KEY,
+    MEMO_TABLE,
+    RET_LEN_ARG,
+    SAME_LENGTH_FUNC,
+)
+from .statement import (
+    AugAssign,
+    BlockStatement,
+    ForRangeStmt,
+    RaiseStmt,
+    ReturnStmt,
+    Statement,
+    bind_loop_variables,
+    iter_exprs,
+    process_block,
+)
+from .stats import Stats, phase
+from .symbols import SymbolTable
+from .type_system import (
+    CPP2TYPING,
+    CPP_NAMES,
+    INTEGER_TYPES,
+    PROMOTIONS,
+    TYPE_HEADERS,
+    CppType,
+)
+from .version import __version__
 
+# decorators of functools memoizing a function
+MEMO_DECORATORS = ("cache", "lru_cache")
+# maxsize of lru_cache without arguments
+LRU_CACHE_MAXSIZE = 128
+# slots of the memo table of an unbounded cache
+MEMO_DEFAULT_SLOTS = 1 << 20
+# passes inferring the return type of a recursive function, more than the
+# height of the promotion lattice
+MAX_RET_TYPE_PASSES = 4
+# called functions without calls of at most this many statements are
+# defined as inline
+INLINE_MAX_STMTS = 16
+
+
+class FunctionDef:
+    def __init__(
+        self,
+        name: str,
+        args: List[FuncArg],
+        body: List[Statement],
+        memo_slots: int = None,
+    ) -> None:
+        self.name = name
+        self.args = args
+        self.body = body
+        # slots of the memo table, or None when the function is not memoized
+        self.memo_slots = memo_slots
+        self.ret_cpp_type: CppType = None
+        self.ret_type_str: str = None
+        # whether the body has OpenMP parallel regions
+        self.uses_openmp = False
+        # whether the function may stop with an error, see RaiseStmt
+        self.raises = False
+        # whether an array of `[x] * n` is returned, whose length is written
+        # to the extra argument
+        self.returns_buffer = False
+        # standard headers to be included
+        self.includes: Set[str] = set()
+        # helper name -> C++ source, see runtime.HELPERS
+        self.helpers: Dict[str, str] = dict()
+        # functions called by this function, see CallGraph
+        self.callees: List[FunctionDef] = []
+        # storage class specifiers of the definition
+        self.storage = ""
+        if any(arg.is_ndarray for arg in self.args):
+            # int64_t, uint8_t
+            self.includes.add("cstdint")
+
+        # return type must be known before the header is emitted
+        self._args_by_name = {arg.name: arg for arg in self.args}
+        # calls and the arguments of the called functions
+        self._calls: List[Tuple[FunctionCall, List[FuncArg]]] = []
+        self._scan(self.body)
+        self._pass_lens_to_calls()
+        if self.returns_buffer and any(call.callee is None for call, _ in self._calls):
+            raise TypeError(
+                "Recursive calls of a function returning an array are not supported."
+            )
+        for callee in self.callees:
+            # callees are written into the same translation unit
+            self.includes |= callee.includes
+            self.helpers = {**callee.helpers, **self.helpers}
+            self.raises |= callee.raises
+            self.uses_openmp |= callee.uses_openmp
+        if self.memo_slots is not None:
+            if self.ret_cpp_type not in CPP_NAMES:
+                raise TypeError("Memoized functions must return a scalar.")
+            self._add_helper(MEMO_CLASS)
+        for arg in self.args:
+            self._add_header(arg.cpp_type)
+        if self.ret_type_str is None:
+            # no return statement
+            self.ret_type_str = "void"
+        arg_strs = [arg.cpp_str for arg in self.args]
+        if self.returns_buffer:
+            arg_strs.append(f"int64_t *{RET_LEN_ARG}")
+        self.prototype = f"{self.ret_type_str} {self.name}({', '.join(arg_strs)})"
+
+    @property
+    def cpp_str(self) -> str:
+        buf = io.StringIO()
+        self.write(buf)
+        return buf.getvalue()
+
+    def write_includes(self, stream: TextIO) -> None:
+        for header in sorted(self.includes):
+            stream.write(f"#include <{header}>\n")
+        if self.includes:
+            stream.write("\n")
+
+    def write_helpers(self, stream: TextIO) -> None:
+        for helper_src in self.helpers.values():
+            stream.write(helper_src + "\n")
+
+    @property
+    def is_leaf(self) -> bool:
+        """Whether the function calls no other function nor itself"""
+        return not self._calls
+
+    def call_graph(self) -> List["FunctionDef"]:
+        """Returns the functions called directly or indirectly, each after the
+        functions it calls."""
+        func_defs: List[FunctionDef] = []
+
+        def visit(func_def: FunctionDef) -> None:
+            for callee in func_def.callees:
+                if callee not in func_defs:
+                    visit(callee)
+                    func_defs.append(callee)
+
+        visit(self)
+        return func_defs
+
+    def write(self, stream: TextIO, with_includes: bool = True) -> None:
+        """Writes the C++ function definition, preceded by the definitions of
+        the functions it calls, to a text stream line by line."""
+        if with_includes:
+            self.write_includes(stream)
+            self.write_helpers(stream)
+        for callee in self.call_graph():
+            callee.write_definition(stream)
+            stream.write("\n")
+        self.write_definition(stream)
+
+    def write_definition(self, stream: TextIO) -> None:
+        """Writes only the definition of this function."""
+        stream.write(self.storage + self.prototype + " {\n")
+        if self.memo_slots is not None:
+            self._write_memo_lookup(stream)
+        # an error returns the default value of the return type
+        error_return = "return" if self.ret_type_str == "void" else "return {}"
+        generator = CppGenerator(stream, error_return, self.memo_slots is not None)
+        generator.write_stmts(self.body, 1)
+        stream.write("}\n")
+
+    def _write_memo_lookup(self, stream: TextIO) -> None:
+        """Writes the memo table and returns the value memoized for the arguments."""
+        # a function without arguments has a single key
+        keys = ", ".join(arg.name for arg in self.args) or "0"
+        key_count = max(len(self.args), 1)
+        # a table per thread needs no lock
+        stream.write(
+            f"\tstatic thread_local {MEMO_CLASS}<{self.ret_type_str}, {key_count}> "
+            f"{MEMO_TABLE}({self.memo_slots});\n"
+            f"\tconst int64_t {MEMO_KEY}[{key_count}] = {{{keys}}};\n"
+            f"\tif (const {self.ret_type_str} *py2cpp_hit = "
+            f"{MEMO_TABLE}.find({MEMO_KEY})) {{\n"
+            "\t\treturn *py2cpp_hit;\n"
+            "\t}\n"
+        )
+
+    def _add_header(self, cpp_type: CppType) -> None:
+        if cpp_type in TYPE_HEADERS:
+            self.includes.add(TYPE_HEADERS[cpp_type])
+
+    def _add_helper(self, name: str) -> None:
+        for dep in HELPER_DEPS.get(name, ()):
+            self._add_helper(dep)
+        if name == ERROR_VAR:
+            self.raises = True
+        headers, helper_src = HELPERS[name]
+        self.includes.update(headers)
+        self.helpers[name] = helper_src
+
+    def _scan_expr(self, expr: Expression) -> None:
+        self._add_header(expr.cpp_type)
+        if isinstance(expr, ArrayAlloc):
+            self._add_helper(BUFFER_CLASS)
+        elif isinstance(expr, IntrinsicCall):
+            self.includes.update(expr.headers)
+        elif isinstance(expr, BinOp) and expr.op.op_type in DIVISION_HELPERS:
+            self._add_helper(DIVISION_HELPERS[expr.op.op_type][0])
+        elif isinstance(expr, Reduction):
+            self._add_helper(expr.func)
+            if len(expr.lengths) > 1:
+                self._add_helper(SAME_LENGTH_FUNC)
+        elif isinstance(expr, FunctionCall) and expr.callee is not None:
+            if expr.callee.returns_buffer:
+                raise TypeError(
+                    f"Calls of {expr.func_id} returning an array are not supported."
+                )
+            if expr.callee not in self.callees:
+                self.callees.append(expr.callee)
+            self._calls.append((expr, expr.callee.args))
+        elif isinstance(expr, FunctionCall) and expr.func_id == self.name:
+            if len(expr.func_args) != len(self.args):
+                raise TypeError(
+                    f"{self.name}() takes {len(self.args)} argument(s) "
+                    f"but {len(expr.func_args)} were given."
+                )
+            self._calls.append((expr, self.args))
+        elif isinstance(expr, ArrayLength):
+            symbol = expr.array.symbol
+            if not symbol.buffer and symbol.size is None:
+                # the length of an array argument is passed on demand
+                self._args_by_name[symbol.id].set_pass_len()
+        for child in iter_children(expr):
+            self._scan_expr(child)
+
+    def _pass_lens_to_calls(self) -> None:
+        """Adds the lengths of arrays to the calls for the arguments of the
+        called functions passing them.
+
+        Passing a length of an array argument makes the argument pass its
+        length as well, so this is repeated until no more argument does.
+        """
+        call_args = [call.func_args for call, _ in self._calls]
+        while True:
+            pass_lens = [arg.pass_len for arg in self.args]
+            for (call, callee_args), func_args in zip(self._calls, call_args):
+                call.func_args = []
+                for value, arg in zip(func_args, callee_args):
+                    call.func_args.append(value)
+                    if arg.pass_len:
+                        length = ArrayLength(value)
+                        self._scan_expr(length)
+                        call.func_args.append(length)
+            if pass_lens == [arg.pass_len for arg in self.args]:
+                return
+
+    def _scan(self, block: List[Statement]) -> None:
+        """Detects the return type, the use of OpenMP and the required headers."""
+        for stmt in block:
+            for expr in iter_exprs(stmt):
+                self._scan_expr(expr)
+            if isinstance(stmt, ReturnStmt):
+                returns_buffer = (
+                    isinstance(stmt.ret_val, Variable) and stmt.ret_val.symbol.buffer
+                )
+                if self.ret_type_str is None:
+                    self.ret_cpp_type = stmt.cpp_type
+                    self.ret_type_str = stmt.cpp_type_str
+                    self.returns_buffer = returns_buffer
+                elif (
+                    self.ret_type_str != stmt.cpp_type_str
+                    or self.returns_buffer != returns_buffer
+                ):
+                    raise TypeError("Multiple return types are not supported.")
+            elif isinstance(stmt, AugAssign) and stmt.op.op_type in DIVISION_HELPERS:
+                # the in-place version is emitted with the helper
+                self._add_helper(DIVISION_HELPERS[stmt.op.op_type][0])
+            elif isinstance(stmt, RaiseStmt):
+                self._add_helper(ERROR_VAR)
+            elif isinstance(stmt, BlockStatement):
+                if isinstance(stmt, ForRangeStmt) and stmt.parallel:
+                    self.uses_openmp = True
+                self._scan(stmt.body)
+
+
+def get_source(func) -> str:
+    """Returns the source of a Python function."""
+    # dedent so that nested functions and methods can be parsed as well
+    return textwrap.dedent(inspect.getsource(func))
+
+
+def parse_func(func, stats: Stats = None) -> ast.FunctionDef:
+    """Retrieves the source of a Python function and parses it into an AST.
+
+    Args:
+        func: A Python function to be parsed
+        stats (Stats, optional): Records the "getsource" and "parse" phases.
+
+    Returns:
+        ast.FunctionDef: The AST node of the function definition
+    """
+    with phase(stats, "getsource", func.__name__) as record:
+        py_src = get_source(func)
+        if record is not None:
+            record.output_bytes = len(py_src)
+    with phase(stats, "parse", func.__name__) as record:
+        tree = ast.parse(py_src)
+        if record is not None:
+            record.count_nodes(tree.body[0])
+    return tree.body[0]
+
+
+def annotated_arg_types(func) -> List[Any]:
+    """Reads the types of the positional arguments from PEP 484 annotations.
+
+    Args:
+        func: A Python function
+
+    Raises:
+        TypeError: Raised when the function takes arguments other than
+            positional ones.
+
+    Returns:
+        List[Any]: Annotated types, or None for arguments without an annotation
+    """
+    hints = typing.get_type_hints(func)
+    arg_types = []
+    for param in inspect.signature(func).parameters.values():
+        if param.kind not in (param.POSITIONAL_ONLY, param.POSITIONAL_OR_KEYWORD):
+            raise TypeError(f"Argument {param.name} must be a positional argument.")
+        arg_types.append(hints.get(param.name))
+    return arg_types
+
+
+def _resolve_arg_types(func, arg_types: List[Any]) -> List[Any]:
+    """Returns arg_types, or the annotated types when it is None."""
+    if arg_types is not None:
+        return arg_types
+    arg_types = annotated_arg_types(func)
+    for param_name, arg_type in zip(inspect.signature(func).parameters, arg_types):
+        if arg_type is None:
+            raise TypeError(f"Argument {param_name} has no type annotation.")
+    return arg_types
+
+
+def memo_slots(func_def: ast.FunctionDef) -> int:
+    """Returns the number of slots of the memo table for a function decorated
+    with functools.cache or functools.lru_cache.
+
+    A bounded cache gets a power of two of at least twice maxsize slots, so
+    that keys rarely evict each other, and an unbounded one MEMO_DEFAULT_SLOTS.
+
+    Raises:
+        TypeError: Raised when maxsize is not a constant.
+
+    Returns:
+        int: The number of slots, or None when the function is not memoized
+    """
+    for decorator in func_def.decorator_list:
+        call = decorator if isinstance(decorator, ast.Call) else None
+        func = decorator if call is None else call.func
+        if isinstance(func, ast.Attribute):
+            name = func.attr
+        else:
+            name = getattr(func, "id", None)
+        if name not in MEMO_DECORATORS:
+            continue
+        maxsize = LRU_CACHE_MAXSIZE if name == "lru_cache" else None
+        if call is not None:
+            values = call.args + [
+                kw.value for kw in call.keywords if kw.arg == "maxsize"
+            ]
+            if values:
+                if not isinstance(values[0], ast.Constant) or not isinstance(
+                    values[0].value, (int, type(None))
+                ):
+                    raise TypeError("maxsize of lru_cache must be a constant.")
+                maxsize = values[0].value
+        if maxsize is None:
+            return MEMO_DEFAULT_SLOTS
+        if maxsize <= 0:
+            # nothing is cached
+            return None
+        return 1 << (2 * maxsize - 1).bit_length()
+    return None
+
+
+def _calls_itself(func_def: ast.FunctionDef) -> bool:
+    return any(
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Name)
+        and node.func.id == func_def.name
+        for node in ast.walk(func_def)
+    )
 
-def transpile(func, arg_types: List[Any]):
-    ### Construct AST
-    py_src = inspect.getsource(func)
-    tree = ast.parse(py_src)
-    func_def = tree.body[0]
 
+def _ret_types(block: List[Statement]) -> List[CppType]:
+    """Collects the types of the return statements in a block."""
+    ret_types = []
+    for stmt in block:
+        if isinstance(stmt, ReturnStmt):
+            ret_types.append(stmt.cpp_type)
+        elif isinstance(stmt, BlockStatement):
+            ret_types += _ret_types(stmt.body)
+    return ret_types
+
+
+def _join_types(cpp_types: List[CppType]) -> CppType:
+    """Returns the type all the types are promoted to, or the first type if
+    they are not numeric. FunctionDef rejects the differing types later."""
+    if not cpp_types:
+        return None
+    joined = cpp_types[0]
+    for cpp_type in cpp_types[1:]:
+        joined = PROMOTIONS.get((joined, cpp_type), joined)
+    return joined
+
+
+def _process_body(
+    func_def: ast.FunctionDef,
+    func_args: List[FuncArg],
+    ret_type: CppType,
+    resolve_call: Callable,
+) -> List[Statement]:
+    var_table = SymbolTable(resolve_call)
+    # register args to var_table
+    for func_arg in func_args:
+        var_table.define(func_arg.name, func_arg.type)
+    if ret_type is not None:
+        # recursive calls are typed as the function is registered as a variable
+        var_table.define(func_def.name, CPP2TYPING[ret_type])
+    body = process_block(func_def.body, var_table)
+    bind_loop_variables(body)
+    return body
+
+
+def _process_recursive_body(
+    func_def: ast.FunctionDef, func_args: List[FuncArg], resolve_call: Callable
+) -> List[Statement]:
+    """Processes the body of a recursive function, inferring its return type
+    by a fixpoint iteration.
+
+    The recursive calls are first assumed to return int. The body is
+    processed again with the joined type of the return statements until it
+    agrees with the assumed type.
+
+    Raises:
+        TypeError: Raised when the return type does not converge.
+    """
+    ret_type = CppType.INT
+    for _ in range(MAX_RET_TYPE_PASSES):
+        body = _process_body(func_def, func_args, ret_type, resolve_call)
+        inferred = _join_types(_ret_types(body))
+        if inferred == ret_type:
+            return body
+        ret_type = inferred
+    raise TypeError(f"Return type of {func_def.name} cannot be inferred.")
+
+
+def process_func_def(
+    func_def: ast.FunctionDef,
+    arg_types: List[Any],
+    optimize: bool = True,
+    simd: bool = False,
+    stats: Stats = None,
+    resolve_call: Callable = None,
+) -> FunctionDef:
+    """Processes a function definition and returns a constructed FunctionDef object.
+
+    Args:
+        func_def (ast.FunctionDef): A function definition to be processed
+        arg_types (List[Any]): Types of the positional arguments
+        optimize (bool, optional): Whether to fold constants and lower floor
+            division and modulo to C++ operators where possible. Defaults to True.
+        simd (bool, optional): Whether to add `#pragma omp simd` to elementwise
+            loops and __restrict__ to their array arguments. Defaults to False.
+        stats (Stats, optional): Records the "process", "optimize" and
+            "annotate" phases.
+        resolve_call (Callable, optional): Resolves calls of other functions,
+            see CallGraph.resolver(). Calls are left untyped without it.
+
+    Returns:
+        FunctionDef: A constructed FunctionDef object
+    """
     ### FUNC NAME
     func_name: str = func_def.name
     ### ARGS
     func_args = [
         FuncArg(arg.arg, arg_types[i]) for i, arg in enumerate(func_def.args.args)
     ]
+    ### MEMOIZATION
+    slots = memo_slots(func_def)
+    if slots is not None:
+        for func_arg in func_args:
+            if func_arg.cpp_type not in INTEGER_TYPES | {CppType.BOOL}:
+                raise TypeError(
+                    f"Argument {func_arg.name} of memoized {func_name} "
+                    "must be an integer."
+                )
     ### BODY
-    cpp_body: List[Any] = []
-    var_table: Dict[str, Variable] = dict()
-    # register args to var_table
-    for func_arg in func_args:
-        var_table[func_arg.name] = Variable(func_arg.name, func_arg.type, VarCtxt.REUSE)
+    with phase(stats, "process", func_name):
+        if _calls_itself(func_def):
+            cpp_body = _process_recursive_body(func_def, func_args, resolve_call)
+        else:
+            cpp_body = _process_body(func_def, func_args, None, resolve_call)
+    if optimize:
+        with phase(stats, "optimize", func_name):
+            optimize_stmts(cpp_body)
+            lower_divisions(cpp_body)
+    with phase(stats, "annotate", func_name):
+        annotate_loops(cpp_body, func_args, simd)
 
-    for stmt in func_def.body:
-        processed_stmt = process_stmt(stmt, var_table)
-        cpp_body.append(processed_stmt)
+    return FunctionDef(func_name, func_args, cpp_body, slots)
 
-    ### construct cpp_src
-    cpp_body_str: str = ""
-    ret_type_str: str = None
 
-    # depth is 0-indexed
-    def convert_stmts_to_strs(block: List, depth: int) -> None:
-        nonlocal cpp_body_str, ret_type_str
-        for stmt in block:
-            if isinstance(stmt, ReturnStmt):
-                # detect return statement
-                if ret_type_str is None:
-                    ret_type_str = stmt.cpp_type_str
-                elif ret_type_str != stmt.cpp_type_str:
-                    raise TypeError("Multiple return types are not supported.")
-            if isinstance(stmt.cpp_str, str):
-                cpp_body_str += "\t" * (depth + 1) + stmt.cpp_str + "\n"
-            elif isinstance(stmt.cpp_str, list):
-                cpp_body_str += "\t" * (depth + 1) + stmt.cpp_str[0] + "\n"
-                convert_stmts_to_strs(stmt.body, depth + 1)
-                cpp_body_str += "\t" * (depth + 1) + stmt.cpp_str[-1] + "\n"
-            else:
-                raise TypeError("stmt.cpp_str must be str or list[str].")
-
-    convert_stmts_to_strs(cpp_body, 0)
-    header = (
-        f"{ret_type_str} {func_name}({', '.join(map(lambda x: x.cpp_str, func_args))}) "
-        + "{\n"
-    )
-    tail = "}\n"
-    # concatenates all
-    cpp_src = header + cpp_body_str + tail
+def _count_stmts(block: List[Statement]) -> int:
+    count = 0
+    for stmt in block:
+        count += 1
+        if isinstance(stmt, BlockStatement):
+            count += _count_stmts(stmt.body)
+    return count
+
+
+def reachable_funcs(func) -> List[Any]:
+    """Finds the Python functions called directly or indirectly by a function,
+    looking up the names of the calls in the globals of each caller.
 
+    Decorated functions are unwrapped. Their sources key caches together
+    with the source of func.
+
+    Returns:
+        List[Any]: The functions in the order of discovery, without func
+    """
+    found = [inspect.unwrap(func)]
+    for caller in found:
+        for node in ast.walk(parse_func(caller)):
+            if not isinstance(node, ast.Call) or not isinstance(node.func, ast.Name):
+                continue
+            callee = inspect.unwrap(caller.__globals__.get(node.func.id, None))
+            if inspect.isfunction(callee) and callee not in found:
+                found.append(callee)
+    return found[1:]
+
+
+class CallGraph:
+    """Python functions called by transpiled functions.
+
+    A call of a name which is not a variable is looked up in the globals of
+    the caller, and the Python function found there is transpiled for the
+    types of the arguments of the call. Each function is transpiled once per
+    argument types, and different argument types make overloads in C++.
+    """
+
+    def __init__(
+        self, optimize: bool = True, simd: bool = False, stats: Stats = None
+    ) -> None:
+        self.optimize = optimize
+        self.simd = simd
+        self.stats = stats
+        # (function, argument types) -> FunctionDef, or None while processed
+        self.func_defs: Dict[Tuple[Any, Tuple[Any, ...]], FunctionDef] = dict()
+
+    def resolver(self, caller) -> Callable:
+        """Returns resolve_call of process_func_def() for a Python function."""
+        caller = inspect.unwrap(caller)
+
+        def resolve_call(func_id: str, func_args: List[Expression]) -> FunctionDef:
+            if func_id == caller.__name__:
+                # recursion is typed by the caller itself
+                return None
+            func = inspect.unwrap(caller.__globals__.get(func_id, None))
+            if not inspect.isfunction(func):
+                return None
+            return self.transpile_callee(func, func_args)
+
+        return resolve_call
+
+    def transpile_callee(self, func, func_args: List[Expression]) -> FunctionDef:
+        """Transpiles a called function for the types of the arguments.
+
+        Raises:
+            TypeError: Raised when the number of the arguments does not match,
+                or the functions call each other.
+        """
+        arg_types = [arg.type for arg in func_args]
+        key = (func, tuple(arg_types))
+        if key in self.func_defs:
+            if self.func_defs[key] is None:
+                raise TypeError(
+                    f"Mutually recursive function {func.__name__} is not supported."
+                )
+            return self.func_defs[key]
+        params = inspect.signature(func).parameters
+        if len(params) != len(func_args):
+            raise TypeError(
+                f"{func.__name__}() takes {len(params)} argument(s) "
+                f"but {len(func_args)} were given."
+            )
+        self.func_defs[key] = None
+        func_def = process_func_def(
+            parse_func(func, self.stats),
+            arg_types,
+            self.optimize,
+            self.simd,
+            self.stats,
+            self.resolver(func),
+        )
+        # the entry point alone has external linkage
+        if func_def.is_leaf and _count_stmts(func_def.body) <= INLINE_MAX_STMTS:
+            func_def.storage = "static inline "
+        else:
+            func_def.storage = "static "
+        self.func_defs[key] = func_def
+        return func_def
+
+
+def transpile(
+    func,
+    arg_types: List[Any] = None,
+    cache: DiskCache = None,
+    optimize: bool = True,
+    simd: bool = False,
+    stats: Stats = None,
+    module_name: str = None,
+):
+    """Transpiles a function into C++ source.
+
+    With module_name, the source is a CPython extension module of the name
+    exposing the function, see extension.write_extension_module().
+    """
+    arg_types = _resolve_arg_types(func, arg_types)
+    if cache is not None:
+        # the generated source is looked up by the hash of the Python source
+        with phase(stats, "getsource", func.__name__):
+            py_src = get_source(func)
+            # the sources of the called functions are transpiled together
+            callee_srcs = [get_source(callee) for callee in reachable_funcs(func)]
+        key = cache.make_key(
+            "transpile",
+            py_src,
+            callee_srcs,
+            arg_types,
+            __version__,
+            optimize,
+            simd,
+            module_name,
+        )
+
+        def build(entry_dir: str) -> None:
+            cpp_src = transpile(
+                func,
+                arg_types,
+                optimize=optimize,
+                simd=simd,
+                stats=stats,
+                module_name=module_name,
+            )
+            with open(os.path.join(entry_dir, "source.cpp"), "w") as f:
+                f.write(cpp_src)
+
+        with cache.open(key, build) as entry_dir:
+            with open(os.path.join(entry_dir, "source.cpp")) as f:
+                return f.read()
+
+    ### Construct AST
+    func_def = parse_func(func, stats)
+    ### Construct cpp_src
+    call_graph = CallGraph(optimize, simd, stats)
+    processed = process_func_def(
+        func_def, arg_types, optimize, simd, stats, call_graph.resolver(func)
+    )
+    with phase(stats, "emit", processed.name) as record:
+        if module_name is None:
+            cpp_src = processed.cpp_str
+        else:
+            buf = io.StringIO()
+            write_extension_module(buf, processed, module_name)
+            cpp_src = buf.getvalue()
+        if record is not None:
+            record.output_bytes = len(cpp_src)
     return cpp_src
+
+
+def transpile_to(
+    stream: TextIO,
+    func,
+    arg_types: List[Any] = None,
+    optimize: bool = True,
+    simd: bool = False,
+    stats: Stats = None,
+) -> None:
+    """Transpiles a function and writes the C++ source to a text stream.
+
+    Args:
+        stream (TextIO): A text stream such as a file or io.StringIO
+        func: A Python function to be transpiled
+        arg_types (List[Any], optional): Types of the positional arguments.
+            Defaults to the annotations of the function.
+        optimize (bool, optional): Whether to fold constants. Defaults to True.
+        simd (bool, optional): Whether to add SIMD hints. Defaults to False.
+        stats (Stats, optional): Records the wall time of each phase.
+    """
+    arg_types = _resolve_arg_types(func, arg_types)
+    call_graph = CallGraph(optimize, simd, stats)
+    processed = process_func_def(
+        parse_func(func, stats),
+        arg_types,
+        optimize,
+        simd,
+        stats,
+        call_graph.resolver(func),
+    )
+    with phase(stats, "emit", processed.name):
+        processed.write(stream)
@@ -1,5 +1,25 @@
+import functools
 from enum import Enum
-from typing import List, Type
+from typing import Any, Dict, FrozenSet, List, Set, Tuple, Type
+
+
+class int8(int):
+    """Annotation and conversion for 8-bit signed integers, int8_t in C++.
+
+    In Python it behaves as int, while the value wraps around in C++.
+    """
+
+
+class uint8(int):
+    """Annotation and conversion for 8-bit unsigned integers, uint8_t in C++."""
+
+
+class int64(int):
+    """Annotation and conversion for 64-bit signed integers, int64_t in C++."""
+
+
+class float32(float):
+    """Annotation and conversion for single precision floats, float in C++."""
 
 
 class PyType(Enum):
@@ -8,6 +28,23 @@ class PyType(Enum):
     FLOAT = 2
     LIST_INT = 3
     LIST_FLOAT = 4
+    # numpy.typing.NDArray[numpy.<dtype>]
+    NDARRAY_FLOAT64 = 5
+    NDARRAY_FLOAT32 = 6
+    NDARRAY_INT32 = 7
+    NDARRAY_INT64 = 8
+    NDARRAY_UINT8 = 9
+    INT8 = 10
+    UINT8 = 11
+    INT64 = 12
+    FLOAT32 = 13
+    LIST_INT8 = 14
+    LIST_UINT8 = 15
+    LIST_INT64 = 16
+    LIST_FLOAT32 = 17
+    NDARRAY_INT8 = 18
+    LIST_BOOL = 19
+    NDARRAY_BOOL = 20
 
 
 class CppType(Enum):
@@ -16,31 +53,275 @@ class CppType(Enum):
     DOUBLE = 2
     ARRAY_INT = 3
     ARRAY_DOUBLE = 4
+    ARRAY_FLOAT = 5
+    ARRAY_INT64 = 6
+    ARRAY_UINT8 = 7
+    INT8 = 8
+    UINT8 = 9
+    INT64 = 10
+    FLOAT = 11
+    ARRAY_INT8 = 12
+    ARRAY_BOOL = 13
+
+
+# scalar annotation -> PyType
+SCALAR_ANNOTATIONS: Dict[Type, PyType] = {
+    bool: PyType.BOOL,
+    int: PyType.INT,
+    float: PyType.FLOAT,
+    int8: PyType.INT8,
+    uint8: PyType.UINT8,
+    int64: PyType.INT64,
+    float32: PyType.FLOAT32,
+}
+
+# element annotation -> list PyType
+LIST_TYPES: Dict[Type, PyType] = {
+    bool: PyType.LIST_BOOL,
+    int: PyType.LIST_INT,
+    float: PyType.LIST_FLOAT,
+    int8: PyType.LIST_INT8,
+    uint8: PyType.LIST_UINT8,
+    int64: PyType.LIST_INT64,
+    float32: PyType.LIST_FLOAT32,
+}
+
+# annotation -> PyType, for both typing.List[X] and list[X]
+ANNOTATIONS: Dict[Any, PyType] = {
+    **SCALAR_ANNOTATIONS,
+    **{List[elem]: py_type for elem, py_type in LIST_TYPES.items()},
+    **{list[elem]: py_type for elem, py_type in LIST_TYPES.items()},
+}
+
+# ndarray type -> numpy dtype name
+NDARRAY_DTYPES: Dict[PyType, str] = {
+    PyType.NDARRAY_FLOAT64: "float64",
+    PyType.NDARRAY_FLOAT32: "float32",
+    PyType.NDARRAY_INT32: "int32",
+    PyType.NDARRAY_INT64: "int64",
+    PyType.NDARRAY_UINT8: "uint8",
+    PyType.NDARRAY_INT8: "int8",
+    PyType.NDARRAY_BOOL: "bool",
+}
+
+# numpy scalar type name -> annotation of the same C++ type
+NUMPY_SCALARS: Dict[str, Type] = {
+    "bool_": bool,
+    # an alias of bool_ since numpy 2
+    "bool": bool,
+    "float64": float,
+    "float32": float32,
+    "int32": int,
+    "int64": int64,
+    "uint8": uint8,
+    "int8": int8,
+}
+
+# array type -> annotation of its elements
+ELEMENT_TYPES: Dict[PyType, Type] = {
+    **{py_type: elem for elem, py_type in LIST_TYPES.items()},
+    **{py_type: NUMPY_SCALARS[dtype] for py_type, dtype in NDARRAY_DTYPES.items()},
+}
+
+SCALAR_CPP_TYPES: Dict[PyType, CppType] = {
+    PyType.BOOL: CppType.BOOL,
+    PyType.INT: CppType.INT,
+    PyType.FLOAT: CppType.DOUBLE,
+    PyType.INT8: CppType.INT8,
+    PyType.UINT8: CppType.UINT8,
+    PyType.INT64: CppType.INT64,
+    PyType.FLOAT32: CppType.FLOAT,
+}
+
+# C++ element type -> C++ array type
+ARRAY_CPP_TYPES: Dict[CppType, CppType] = {
+    CppType.BOOL: CppType.ARRAY_BOOL,
+    CppType.INT: CppType.ARRAY_INT,
+    CppType.DOUBLE: CppType.ARRAY_DOUBLE,
+    CppType.INT8: CppType.ARRAY_INT8,
+    CppType.UINT8: CppType.ARRAY_UINT8,
+    CppType.INT64: CppType.ARRAY_INT64,
+    CppType.FLOAT: CppType.ARRAY_FLOAT,
+}
+# C++ array type -> C++ element type
+ELEMENT_CPP_TYPES: Dict[CppType, CppType] = {
+    array: elem for elem, array in ARRAY_CPP_TYPES.items()
+}
+
+PY2CPP: Dict[PyType, CppType] = {
+    **SCALAR_CPP_TYPES,
+    **{
+        py_type: ARRAY_CPP_TYPES[SCALAR_CPP_TYPES[SCALAR_ANNOTATIONS[elem]]]
+        for py_type, elem in ELEMENT_TYPES.items()
+    },
+}
+
+# C++ scalar type -> its canonical annotation
+CPP2TYPING: Dict[CppType, Type] = {
+    SCALAR_CPP_TYPES[py_type]: annotation
+    for annotation, py_type in SCALAR_ANNOTATIONS.items()
+}
+
+# C++ scalar type -> its name in C++
+CPP_NAMES: Dict[CppType, str] = {
+    CppType.BOOL: "bool",
+    CppType.INT8: "int8_t",
+    CppType.UINT8: "uint8_t",
+    CppType.INT: "int",
+    CppType.INT64: "int64_t",
+    CppType.FLOAT: "float",
+    CppType.DOUBLE: "double",
+}
+
+# C++ type -> the standard header declaring it
+TYPE_HEADERS: Dict[CppType, str] = {
+    CppType.INT8: "cstdint",
+    CppType.UINT8: "cstdint",
+    CppType.INT64: "cstdint",
+    CppType.ARRAY_INT8: "cstdint",
+    CppType.ARRAY_UINT8: "cstdint",
+    CppType.ARRAY_INT64: "cstdint",
+}
+
+INTEGER_TYPES: FrozenSet[CppType] = frozenset(
+    {CppType.INT8, CppType.UINT8, CppType.INT, CppType.INT64}
+)
+FLOATING_TYPES: FrozenSet[CppType] = frozenset({CppType.FLOAT, CppType.DOUBLE})
+NUMERIC_TYPES: FrozenSet[CppType] = INTEGER_TYPES | FLOATING_TYPES
+
+
+def _promote(a: CppType, b: CppType) -> CppType:
+    """The usual arithmetic conversions of C++"""
+    if a in FLOATING_TYPES or b in FLOATING_TYPES:
+        if CppType.DOUBLE in (a, b):
+            return CppType.DOUBLE
+        return CppType.FLOAT
+    if CppType.INT64 in (a, b):
+        return CppType.INT64
+    # int8_t and uint8_t are promoted to int
+    return CppType.INT
+
+
+# the promotion lattice: (left, right) -> type of the arithmetic result
+PROMOTIONS: Dict[Tuple[CppType, CppType], CppType] = {
+    (a, b): _promote(a, b) for a in NUMERIC_TYPES for b in NUMERIC_TYPES
+}
+
+# (from, to) converted implicitly with an explicit cast, as the widening
+# primitive conversions of Java
+WIDENINGS: Set[Tuple[CppType, CppType]] = {
+    (CppType.INT8, CppType.INT),
+    (CppType.INT8, CppType.INT64),
+    (CppType.INT8, CppType.FLOAT),
+    (CppType.INT8, CppType.DOUBLE),
+    (CppType.UINT8, CppType.INT),
+    (CppType.UINT8, CppType.INT64),
+    (CppType.UINT8, CppType.FLOAT),
+    (CppType.UINT8, CppType.DOUBLE),
+    (CppType.INT, CppType.INT64),
+    (CppType.INT, CppType.FLOAT),
+    (CppType.INT, CppType.DOUBLE),
+    (CppType.INT64, CppType.FLOAT),
+    (CppType.INT64, CppType.DOUBLE),
+    (CppType.FLOAT, CppType.DOUBLE),
+}
+
+# integer type -> (min, max)
+INTEGER_RANGES: Dict[CppType, Tuple[int, int]] = {
+    CppType.INT8: (-(2**7), 2**7 - 1),
+    CppType.UINT8: (0, 2**8 - 1),
+    CppType.INT: (-(2**31), 2**31 - 1),
+    CppType.INT64: (-(2**63), 2**63 - 1),
+}
+
+
+@functools.lru_cache(maxsize=None)
+def _numpy_annotations() -> Dict[Type, PyType]:
+    """Returns NDArray and numpy scalar types -> PyType, or an empty dict
+    without numpy."""
+    try:
+        import numpy as np
+        import numpy.typing as npt
+    except ImportError:
+        return dict()
+    annotations = {
+        getattr(np, name): SCALAR_ANNOTATIONS[annotation]
+        for name, annotation in NUMPY_SCALARS.items()
+        if hasattr(np, name)
+    }
+    for py_type, dtype in NDARRAY_DTYPES.items():
+        annotations[npt.NDArray[np.dtype(dtype).type]] = py_type
+    return annotations
+
+
+@functools.lru_cache(maxsize=None)
+def _ndarray_types_by_dtype() -> Dict[str, Type]:
+    """Returns numpy dtype name -> NDArray type."""
+    return {
+        NDARRAY_DTYPES[py_type]: annotation
+        for annotation, py_type in _numpy_annotations().items()
+        if py_type in NDARRAY_DTYPES
+    }
+
+
+def type_of_value(value: Any) -> Type:
+    """Infers the type of an argument from its value.
+
+    Args:
+        value (Any): A value passed to a function
+
+    Raises:
+        TypeError: Raised when the type of value is not supported.
+
+    Returns:
+        Type: The type in the same form as type annotations, e.g. List[float]
+    """
+    value_type = type(value)
+    if value_type is int:
+        low, high = INTEGER_RANGES[CppType.INT]
+        # int64_t for values beyond int
+        return int if low <= value <= high else int64
+    if value_type in SCALAR_ANNOTATIONS or value_type in _numpy_annotations():
+        return value_type
+    if isinstance(value, list):
+        if not value:
+            raise TypeError("Type of an empty list cannot be inferred.")
+        if all(type(elem) is bool for elem in value):
+            return List[bool]
+        if all(type(elem) is int for elem in value):
+            return List[int]
+        if all(type(elem) in (int, float) for elem in value):
+            return List[float]
+        raise TypeError("Only lists of bool, int or float are supported.")
+    dtype = getattr(value, "dtype", None)
+    if dtype is not None and hasattr(value, "__array_interface__"):
+        if dtype.name in _ndarray_types_by_dtype():
+            return _ndarray_types_by_dtype()[dtype.name]
+        raise TypeError(f"numpy.ndarray of {dtype.name} is not supported.")
+    raise TypeError(f"Python type {value_type.__name__} is not supported.")
 
 
 def type_typing2py(src: Type) -> PyType:
-    if src == bool:
-        return PyType.BOOL
-    if src == int:
-        return PyType.INT
-    if src == float:
-        return PyType.FLOAT
-    if src == List[int]:
-        return PyType.LIST_INT
-    if src == List[float]:
-        return PyType.LIST_FLOAT
-    raise TypeError(f"Python type {src} is not supported.")
+    py_type = ANNOTATIONS.get(src)
+    if py_type is None:
+        py_type = _numpy_annotations().get(src)
+    if py_type is None:
+        raise TypeError(f"Python type {src} is not supported.")
+    return py_type
 
 
 def type_py2cpp(src: PyType) -> CppType:
-    if src == PyType.BOOL:
-        return CppType.BOOL
-    if src == PyType.INT:
-        return CppType.INT
-    if src == PyType.FLOAT:
-        return CppType.DOUBLE
-    if src == PyType.LIST_INT:
-        return CppType.ARRAY_INT
-    if src == PyType.LIST_FLOAT:
-        return CppType.ARRAY_DOUBLE
-    raise TypeError(f"Python type {src} is not supported.")
+    cpp_type = PY2CPP.get(src)
+    if cpp_type is None:
+        raise TypeError(f"Python type {src} is not supported.")
+    return cpp_type
+
+
+def cpp_type_str(cpp_type: CppType) -> str:
+    """Returns the C++ name of a scalar type, or of a pointer to the elements
+    for an array type."""
+    if cpp_type in CPP_NAMES:
+        return CPP_NAMES[cpp_type]
+    if cpp_type in ELEMENT_CPP_TYPES:
+        return f"{CPP_NAMES[ELEMENT_CPP_TYPES[cpp_type]]} *"
+    raise TypeError(f"C++ type {cpp_type} is not supported.")
@@ -0,0 +1,120 @@
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from py2cpp.cache import DiskCache, fcntl
+
+
+def write_file(name: str, size: int):
+    """Returns a build function writing a file of size bytes."""
+
+    def build(entry_dir: str) -> None:
+        with open(os.path.join(entry_dir, name), "wb") as f:
+            f.write(b"\0" * size)
+
+    return build
+
+
+def set_last_used(cache: DiskCache, key: str, timestamp: float) -> None:
+    os.utime(cache.entry_dir(key), (timestamp, timestamp))
+
+
+def test_builds_once(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    builds = []
+
+    def build(entry_dir: str) -> None:
+        builds.append(entry_dir)
+        write_file("a.txt", 1)(entry_dir)
+
+    with cache.open("key", build) as path:
+        assert os.path.isfile(os.path.join(path, "a.txt"))
+    with cache.open("key", build) as path:
+        assert path == cache.entry_dir("key")
+    assert len(builds) == 1
+
+
+def test_failed_build_leaves_no_entry(tmp_path):
+    cache = DiskCache(str(tmp_path))
+
+    def build(entry_dir: str) -> None:
+        write_file("a.txt", 1)(entry_dir)
+        raise RuntimeError("failed")
+
+    with pytest.raises(RuntimeError):
+        with cache.open("key", build):
+            pass
+    assert not os.path.exists(cache.entry_dir("key"))
+    # no partially built entry is left either
+    assert [name for name in os.listdir(tmp_path) if name != ".locks"] == []
+    with cache.open("key", write_file("a.txt", 1)) as path:
+        assert os.path.isfile(os.path.join(path, "a.txt"))
+
+
+def test_evicts_least_recently_used(tmp_path):
+    cache = DiskCache(str(tmp_path))
+    for i, key in enumerate(["a", "b", "c"]):
+        with cache.open(key, write_file("data", 100)):
+            pass
+        set_last_used(cache, key, 1000 + i)
+    # a is used again
+    set_last_used(cache, "a", 2000)
+    cache.max_bytes = 250
+    cache.evict()
+    assert os.path.isdir(cache.entry_dir("a"))
+    assert not os.path.exists(cache.entry_dir("b"))
+    assert os.path.isdir(cache.entry_dir("c"))
+    assert cache.size() == 200
+
+
+def test_keeps_most_recently_used_entry_larger_than_max_bytes(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=10)
+    with cache.open("small", write_file("data", 5)):
+        pass
+    set_last_used(cache, "small", 1000)
+    with cache.open("large", write_file("data", 100)) as path:
+        assert os.path.isdir(path)
+    assert os.path.isdir(cache.entry_dir("large"))
+    assert not os.path.exists(cache.entry_dir("small"))
+
+
+@pytest.mark.skipif(fcntl is None, reason="no file locks")
+def test_no_eviction_while_entry_is_used(tmp_path):
+    cache = DiskCache(str(tmp_path), max_bytes=0)
+    other = DiskCache(str(tmp_path), max_bytes=0)
+    with cache.open("a", write_file("data", 100)) as path:
+        set_last_used(cache, "a", 1000)
+        with other.open("b", write_file("data", 100)):
+            pass
+        # another cache skips eviction while a is used
+        assert os.path.isdir(path)
+        assert os.path.isdir(other.entry_dir("b"))
+    # a is not the most recently used one
+    assert not os.path.exists(cache.entry_dir("a"))
+    assert os.path.isdir(cache.entry_dir("b"))
+
+
+def _open_slowly(cache_dir: str, log_path: str) -> str:
+    def build(entry_dir: str) -> None:
+        with open(log_path, "a") as f:
+            f.write("built\n")
+        time.sleep(0.2)
+        write_file("data", 1)(entry_dir)
+
+    with DiskCache(cache_dir).open("key", build) as path:
+        with open(os.path.join(path, "data"), "rb") as f:
+            return f.read()
+
+
+@pytest.mark.skipif(fcntl is None, reason="no file locks")
+def test_concurrent_processes_build_once(tmp_path):
+    cache_dir = str(tmp_path / "cache")
+    log_path = str(tmp_path / "log")
+    ctx = multiprocessing.get_context("fork")
+    with ctx.Pool(4) as pool:
+        results = pool.starmap(_open_slowly, [(cache_dir, log_path)] * 4)
+    assert results == [b"\0"] * 4
+    with open(log_path) as f:
+        assert f.read() == "built\n"
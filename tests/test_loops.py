@@ -0,0 +1,107 @@
+from typing import List
+
+import pytest
+
+import py2cpp
+
+
+def body(func, arg_types) -> str:
+    src = py2cpp.transpile(func, arg_types)
+    return src[src.index(f" {func.__name__}(") :]
+
+
+def aug_reductions(x, n: int):
+    s = 0.0
+    p = 1.0
+    for i in py2cpp.prange(n):
+        s += x[i]
+        p *= x[i]
+    return s + p
+
+
+def assign_reductions(x, n: int):
+    s = 0.0
+    d = 0.0
+    p = 1.0
+    for i in py2cpp.prange(n):
+        s = s + x[i]
+        d = d - x[i]
+        p = x[i] * p
+    return s + d + p
+
+
+def private_writes(x, n: int):
+    for i in py2cpp.prange(n):
+        t = x[i] * 2.0
+        t = t + 1.0
+        x[i] = t
+    return n
+
+
+@pytest.mark.parametrize(
+    "func, clauses",
+    [
+        (aug_reductions, " reduction(+:s) reduction(*:p)"),
+        (assign_reductions, " reduction(+:s,d) reduction(*:p)"),
+        (private_writes, ""),
+    ],
+)
+def test_reductions(func, clauses):
+    assert f"#pragma omp parallel for{clauses}\n" in body(func, [List[float], int])
+
+
+def overwrite(x, n: int):
+    s = 0.0
+    for i in py2cpp.prange(n):
+        s = x[i]
+    return s
+
+
+def divide(x, n: int):
+    s = 1.0
+    for i in py2cpp.prange(n):
+        s /= x[i]
+    return s
+
+
+def subtract_from(x, n: int):
+    s = 0.0
+    for i in py2cpp.prange(n):
+        s = x[i] - s
+    return s
+
+
+def read_twice(x, n: int):
+    s = 0.0
+    for i in py2cpp.prange(n):
+        s = s + s * x[i]
+    return s
+
+
+def conditional_overwrite(x, n: int):
+    s = 0.0
+    for i in py2cpp.prange(n):
+        if x[i] > s:
+            s = x[i]
+    return s
+
+
+@pytest.mark.parametrize(
+    "func", [overwrite, divide, subtract_from, read_twice, conditional_overwrite]
+)
+def test_shared_write_is_rejected(func):
+    with pytest.raises(TypeError, match="Variable s is shared by the threads"):
+        py2cpp.transpile(func, [List[float], int])
+
+
+def mixed_operators(x, n: int):
+    s = 0.0
+    for i in py2cpp.prange(n):
+        s += x[i]
+        s *= x[i]
+    return s
+
+
+def test_mixed_operators_are_rejected():
+    with pytest.raises(TypeError, match="reduced with different operators"):
+        py2cpp.transpile(mixed_operators, [List[float], int])
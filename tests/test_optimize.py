@@ -0,0 +1,73 @@
+import pytest
+
+import py2cpp
+
+
+def body(func, arg_types) -> str:
+    src = py2cpp.transpile(func, arg_types)
+    return src[src.index(f" {func.__name__}(") :]
+
+
+def true_div():
+    return 7 / 2
+
+
+def floor_div_negative():
+    return 7 // -2
+
+
+def mod_negative():
+    return -7 % 3
+
+
+def overflow(i: int):
+    return 2147483647 + 1 + i
+
+
+def overflow_assign():
+    x = 2147483647 + 1
+    return x
+
+
+def add_zero(x: float):
+    return x + 0
+
+
+def chained_compare(i: int):
+    return 1 < 2 < i
+
+
+def chained_compare_test(i: int):
+    if 1 < 2 < i:
+        return 1
+    return 0
+
+
+def g(n: int):
+    return n
+
+
+def call_and_false(n: int):
+    return g(n) > 0 and False
+
+
+@pytest.mark.parametrize(
+    "func, arg_types, expected",
+    [
+        # Python semantics, not those of C++
+        (true_div, [], "return 3.5;"),
+        (floor_div_negative, [], "return -4;"),
+        (mod_negative, [], "return 2;"),
+        # int overflows in C++, so it is left to the compiler
+        (overflow, [int], "return ((2147483647 + 1) + i);"),
+        (overflow_assign, [], "int x = (2147483647 + 1);"),
+        # -0.0 + 0 is 0.0
+        (add_zero, [float], "return (x + 0);"),
+        (chained_compare, [int], "return (2 < i);"),
+        (chained_compare_test, [int], "if (2 < i) {"),
+        # the call is evaluated for its side effects
+        (call_and_false, [int], "return ((g(n) > 0) && false);"),
+    ],
+)
+def test_folding(func, arg_types, expected):
+    assert f"\t{expected}\n" in body(func, arg_types)
@@ -0,0 +1,170 @@
+import itertools
+
+import pytest
+
+import py2cpp
+from py2cpp.compiler import find_compiler
+
+try:
+    find_compiler()
+    has_compiler = True
+except RuntimeError:
+    has_compiler = False
+
+requires_compiler = pytest.mark.skipif(not has_compiler, reason="no C++ compiler")
+
+DIVIDENDS = [-(2**31), -(2**31) + 1, -17, -9, -8, -7, -1, 0, 1, 7, 8, 9, 17, 2**31 - 1]
+DIVISORS = [-8, -5, -3, -1, 1, 2, 3, 4, 7, 8]
+
+
+def floordiv(a: int, b: int):
+    return a // b
+
+
+def mod(a: int, b: int):
+    return a % b
+
+
+def aug(a: int, b: int):
+    a //= b
+    a %= 5
+    return a
+
+
+def floordiv_pow2(a: int):
+    return a // 8
+
+
+def mod_pow2(a: int):
+    return a % 8
+
+
+def aug_pow2(a: int):
+    a //= 4
+    a %= 2
+    return a
+
+
+def int8_pow2(a: py2cpp.int8):
+    return a // 64 + a % 128
+
+
+def floordiv_neg(a: int):
+    return a // -4
+
+
+def mod_neg(a: int):
+    return a % -4
+
+
+def nonneg(n: int):
+    s = 0
+    for i in range(n):
+        s += i // 3 + i % 7
+    return s
+
+
+def nonpos(n: int):
+    s = 0
+    for i in range(n):
+        s += (-i) // -3 + (-i) % -5
+    return s
+
+
+def mixed(n: int):
+    s = 0
+    for i in range(n):
+        s += i // -3 + i % -5 + (-i) // 3 + (-i) % 5
+    return s
+
+
+def zero(a: int):
+    return a // 0 + a % 0
+
+
+def maybe_zero(n: int):
+    s = 0
+    for d in range(n):
+        s += n // d + n % d
+    return s
+
+
+def body(func) -> str:
+    """Returns the C++ definition of func without the helpers."""
+    cpp_src = py2cpp.transpile(func)
+    start = cpp_src.index(f" {func.__name__}(")
+    return cpp_src[start:]
+
+
+@pytest.mark.parametrize(
+    "func, expected",
+    [
+        # unknown signs
+        (floordiv, "py2cpp_floordiv(a, b)"),
+        (mod, "py2cpp_mod(a, b)"),
+        (aug, "py2cpp_ifloordiv(a, b);"),
+        # constant powers of two for any sign
+        (floordiv_pow2, "(a >> 3)"),
+        (mod_pow2, "(a & 7)"),
+        (aug_pow2, "a >>= 2;"),
+        (aug_pow2, "a &= 1;"),
+        (int8_pow2, "((a >> 6) + (a & 127))"),
+        # negative divisors
+        (floordiv_neg, "py2cpp_floordiv(a, -4)"),
+        (mod_neg, "py2cpp_mod(a, -4)"),
+        # dividends of the signs of the divisors
+        (nonneg, "((i / 3) + (i % 7))"),
+        (nonpos, "(((-i) / -3) + ((-i) % -5))"),
+        # dividends of the other signs
+        (mixed, "py2cpp_floordiv(i, -3)"),
+        (mixed, "py2cpp_mod(i, -5)"),
+        (mixed, "py2cpp_floordiv((-i), 3)"),
+        (mixed, "py2cpp_mod((-i), 5)"),
+        # divisors which may be zero are neither lowered nor folded
+        (zero, "(py2cpp_floordiv(a, 0) + py2cpp_mod(a, 0))"),
+        (maybe_zero, "(py2cpp_floordiv(n, d) + py2cpp_mod(n, d))"),
+    ],
+)
+def test_lowering(func, expected):
+    assert expected in body(func)
+
+
+def test_no_lowering_without_optimize():
+    cpp_src = py2cpp.transpile(floordiv_pow2, optimize=False)
+    assert "py2cpp_floordiv(a, 8)" in cpp_src
+
+
+@requires_compiler
+@pytest.mark.parametrize("func", [floordiv, mod, aug])
+def test_helpers_match_python(func):
+    compiled = py2cpp.jit(func)
+    for a, b in itertools.product(DIVIDENDS, DIVISORS):
+        if a == -(2**31) and b == -1:
+            # overflows int
+            continue
+        assert compiled(a, b) == func(a, b), (a, b)
+
+
+@requires_compiler
+@pytest.mark.parametrize(
+    "func", [floordiv_pow2, mod_pow2, aug_pow2, floordiv_neg, mod_neg]
+)
+def test_constant_divisors_match_python(func):
+    compiled = py2cpp.jit(func)
+    for a in DIVIDENDS:
+        assert compiled(a) == func(a), a
+
+
+@requires_compiler
+def test_int8_match_python():
+    compiled = py2cpp.jit(int8_pow2)
+    for a in range(-128, 128):
+        assert compiled(py2cpp.int8(a)) == int8_pow2(a), a
+
+
+@requires_compiler
+@pytest.mark.parametrize("func", [nonneg, nonpos, mixed])
+def test_loops_match_python(func):
+    compiled = py2cpp.jit(func)
+    for n in range(0, 40):
+        assert compiled(n) == func(n), n
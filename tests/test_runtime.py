@@ -0,0 +1,56 @@
+import pytest
+
+import py2cpp
+from py2cpp.compiler import find_compiler
+from py2cpp.type_system import int64
+
+try:
+    find_compiler()
+    has_compiler = True
+except RuntimeError:
+    has_compiler = False
+
+requires_compiler = pytest.mark.skipif(not has_compiler, reason="no C++ compiler")
+
+
+def alloc(n: int64):
+    a = [1.0] * n
+    return a
+
+
+def alloc_sum(n: int64):
+    a = [2] * n
+    s = 0
+    for i in range(len(a)):
+        s += a[i]
+    return s
+
+
+def test_buffer_checks_allocation():
+    src = py2cpp.transpile(alloc, [int64])
+    assert '"MemoryError: ' in src
+    assert "if (py2cpp_error != nullptr) { return {}; }" in src
+
+
+@requires_compiler
+@pytest.mark.parametrize(
+    "func, n",
+    [
+        (alloc, 2**59),
+        # n * sizeof(T) overflows
+        (alloc, 2**62),
+        (alloc_sum, 2**61),
+    ],
+)
+def test_failed_allocation_raises_memory_error(func, n):
+    jitted = py2cpp.jit([int64])(func)
+    with pytest.raises(MemoryError, match=r"\[x\] \* n"):
+        jitted(n)
+
+
+@requires_compiler
+def test_failed_allocation_is_not_raised_again():
+    jitted = py2cpp.jit([int64])(alloc_sum)
+    with pytest.raises(MemoryError):
+        jitted(2**61)
+    assert jitted(3) == 6
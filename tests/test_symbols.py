@@ -0,0 +1,117 @@
+import pytest
+
+import py2cpp
+from py2cpp.compiler import find_compiler
+from py2cpp.symbols import SymbolTable
+
+try:
+    find_compiler()
+    has_compiler = True
+except RuntimeError:
+    has_compiler = False
+
+requires_compiler = pytest.mark.skipif(not has_compiler, reason="no C++ compiler")
+
+
+def test_inner_scope_is_not_visible_after_block():
+    table = SymbolTable()
+    outer = table.define("x", int)
+    with table.scope():
+        inner = table.define("x", float)
+        table.define("y", int)
+        # shadows the outer variable
+        assert table["x"] is inner
+    assert table["x"] is outer
+    assert "y" not in table
+    with pytest.raises(KeyError):
+        table["y"]
+
+
+def test_inner_scope_sees_outer_variables():
+    table = SymbolTable()
+    outer = table.define("x", int)
+    with table.scope():
+        with table.scope():
+            assert table.get("x") is outer
+
+
+def test_scope_is_closed_on_error():
+    table = SymbolTable()
+    with pytest.raises(RuntimeError):
+        with table.scope():
+            table.define("x", int)
+            raise RuntimeError
+    assert table.get("x") is None
+
+
+def body(func) -> str:
+    src = py2cpp.transpile(func, [int])
+    return src[src.index(f" {func.__name__}(") :]
+
+
+def defined_in_if(n: int):
+    if n > 0:
+        y = 1
+    return y
+
+
+def defined_in_loop(n: int):
+    for i in range(n):
+        y = i
+    return y
+
+
+@pytest.mark.parametrize("func", [defined_in_if, defined_in_loop])
+def test_variable_defined_in_block_is_not_visible(func):
+    with pytest.raises(ValueError, match="Variable y must be defined"):
+        py2cpp.transpile(func, [int])
+
+
+def defined_before_if(n: int):
+    y = 0
+    if n > 0:
+        y = 1
+    return y
+
+
+def test_variable_defined_before_block():
+    assert "\tint y = 0;\n\tif (n > 0) {\n\t\ty = 1;\n\t}\n" in body(defined_before_if)
+
+
+def reuse_loop_variable(n: int):
+    s = 0
+    for i in range(n):
+        s += i
+    for i in range(2 * n):
+        s += 1
+    return s
+
+
+def read_loop_variable(n: int):
+    s = 0
+    for i in range(n):
+        s += i
+    for i in range(n):
+        s += i
+    return s + i
+
+
+def test_loop_variable_reused_across_loops():
+    # each loop defines its own counter
+    assert body(reuse_loop_variable).count("for (int i = 0;") == 2
+
+
+def test_loop_variable_read_after_loops():
+    src = body(read_loop_variable)
+    # declared once before the loops, and assigned by both of them
+    assert src.count("int i = 0;") == 1
+    assert src.count("\t\ti = py2cpp_loop_i;\n") == 2
+    assert "return (s + i);" in src
+
+
+@requires_compiler
+@pytest.mark.parametrize("func", [reuse_loop_variable, read_loop_variable])
+def test_loop_variables_run_as_in_python(func):
+    jitted = py2cpp.jit([int])(func)
+    for n in (1, 5):
+        assert jitted(n) == func(n)
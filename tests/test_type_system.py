@@ -0,0 +1,190 @@
+import pytest
+
+import py2cpp
+from py2cpp.expression import BinOp, Cast, Constant, VarCtxt, Variable, coerce
+from py2cpp.ops import Operator, OpType
+from py2cpp.symbols import Symbol
+from py2cpp.type_system import (
+    NUMERIC_TYPES,
+    PROMOTIONS,
+    WIDENINGS,
+    CppType,
+    float32,
+    int8,
+    int64,
+    uint8,
+)
+
+TYPES_BY_CPP_TYPE = {
+    CppType.INT8: int8,
+    CppType.UINT8: uint8,
+    CppType.INT: int,
+    CppType.INT64: int64,
+    CppType.FLOAT: float32,
+    CppType.DOUBLE: float,
+}
+
+
+def var(cpp_type: CppType, id: str = "x") -> Variable:
+    return Variable(Symbol(id, TYPES_BY_CPP_TYPE[cpp_type]), VarCtxt.REUSE)
+
+
+@pytest.mark.parametrize(
+    "left, right, expected",
+    [
+        # int8_t and uint8_t are promoted to int as in C++
+        (CppType.INT8, CppType.INT8, CppType.INT),
+        (CppType.UINT8, CppType.UINT8, CppType.INT),
+        (CppType.INT8, CppType.UINT8, CppType.INT),
+        (CppType.UINT8, CppType.INT, CppType.INT),
+        (CppType.INT8, CppType.INT64, CppType.INT64),
+        (CppType.INT, CppType.INT64, CppType.INT64),
+        (CppType.INT64, CppType.FLOAT, CppType.FLOAT),
+        (CppType.UINT8, CppType.FLOAT, CppType.FLOAT),
+        (CppType.FLOAT, CppType.DOUBLE, CppType.DOUBLE),
+        (CppType.INT, CppType.DOUBLE, CppType.DOUBLE),
+    ],
+)
+def test_promotions(left, right, expected):
+    assert PROMOTIONS[(left, right)] == expected
+    assert PROMOTIONS[(right, left)] == expected
+
+
+def test_promotions_cover_numeric_types():
+    assert set(PROMOTIONS) == {(a, b) for a in NUMERIC_TYPES for b in NUMERIC_TYPES}
+    assert (CppType.BOOL, CppType.INT) not in PROMOTIONS
+
+
+def test_widenings_are_not_narrowing():
+    for source, target in WIDENINGS:
+        assert source != target
+        assert PROMOTIONS[(source, target)] == target
+        # no conversion back
+        assert (target, source) not in WIDENINGS
+
+
+@pytest.mark.parametrize(
+    "source, target", sorted(WIDENINGS, key=lambda pair: (pair[0].name, pair[1].name))
+)
+def test_coerce_widens_with_cast(source, target):
+    coerced = coerce(var(source), target)
+    assert isinstance(coerced, Cast)
+    assert coerced.cpp_type == target
+
+
+@pytest.mark.parametrize(
+    "source, target",
+    [
+        (CppType.INT, CppType.INT8),
+        (CppType.INT, CppType.UINT8),
+        (CppType.INT8, CppType.UINT8),
+        (CppType.INT64, CppType.INT),
+        (CppType.DOUBLE, CppType.FLOAT),
+        (CppType.FLOAT, CppType.INT),
+        (CppType.DOUBLE, CppType.INT64),
+    ],
+)
+def test_coerce_rejects_narrowing(source, target):
+    with pytest.raises(TypeError, match="Implicit cast"):
+        coerce(var(source), target)
+
+
+@pytest.mark.parametrize(
+    "source, target",
+    [
+        (CppType.INT, CppType.INT8),
+        (CppType.INT64, CppType.UINT8),
+        (CppType.DOUBLE, CppType.FLOAT),
+    ],
+)
+def test_coerce_same_kind_allows_narrowing(source, target):
+    assert coerce(var(source), target, same_kind=True).cpp_type == target
+
+
+def test_coerce_same_kind_rejects_other_kinds():
+    with pytest.raises(TypeError):
+        coerce(var(CppType.DOUBLE), CppType.INT, same_kind=True)
+
+
+@pytest.mark.parametrize(
+    "value, target, fits",
+    [
+        (127, CppType.INT8, True),
+        (128, CppType.INT8, False),
+        (-1, CppType.UINT8, False),
+        (255, CppType.UINT8, True),
+        (-129, CppType.INT8, False),
+        (1.5, CppType.FLOAT, True),
+        (True, CppType.INT, False),
+    ],
+)
+def test_coerce_literals(value, target, fits):
+    if fits:
+        assert coerce(Constant(value), target).cpp_type == target
+    else:
+        with pytest.raises(TypeError):
+            coerce(Constant(value), target)
+
+
+def test_coerce_keeps_same_type():
+    x = var(CppType.INT8)
+    assert coerce(x, CppType.INT8) is x
+
+
+@pytest.mark.parametrize(
+    "make_left, make_right, expected",
+    [
+        # a float literal does not widen float32 to double
+        (lambda: var(CppType.FLOAT), lambda: Constant(2.0), CppType.FLOAT),
+        (lambda: Constant(2.0), lambda: var(CppType.FLOAT), CppType.FLOAT),
+        # an int literal is converted to float
+        (lambda: var(CppType.FLOAT), lambda: Constant(2), CppType.FLOAT),
+        # other doubles do
+        (lambda: var(CppType.FLOAT), lambda: var(CppType.DOUBLE), CppType.DOUBLE),
+        (lambda: var(CppType.INT8), lambda: Constant(1), CppType.INT),
+    ],
+)
+def test_binop_types(make_left, make_right, expected):
+    assert BinOp(make_left(), Operator(OpType.MULT), make_right()).cpp_type == expected
+
+
+def test_binop_casts_float_literal_to_float32():
+    expr = BinOp(var(CppType.FLOAT), Operator(OpType.ADD), Constant(0.1))
+    assert isinstance(expr.right, Cast)
+    assert expr.right.cpp_type == CppType.FLOAT
+
+
+def test_binop_rejects_bool():
+    with pytest.raises(TypeError, match="Invalid operand types"):
+        BinOp(Constant(True), Operator(OpType.ADD), Constant(1))
+
+
+def add_int8(a: int8, b: int8):
+    return a + b
+
+
+def scale_float32(x: float32):
+    return x * 0.5
+
+
+def widen_to_double(x: float32, y: float):
+    return x + y
+
+
+def store_int(a: int8, n: int):
+    y = n
+    y = a
+    return y
+
+
+@pytest.mark.parametrize(
+    "func, arg_types, expected",
+    [
+        (add_int8, [int8, int8], "int add_int8(int8_t a, int8_t b) {"),
+        (scale_float32, [float32], "return (x * (float)0.5);"),
+        (widen_to_double, [float32, float], "double widen_to_double("),
+        (store_int, [int8, int], "y = (int)a;"),
+    ],
+)
+def test_emitted_code(func, arg_types, expected):
+    assert expected in py2cpp.transpile(func, arg_types)